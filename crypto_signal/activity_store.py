@@ -0,0 +1,952 @@
+"""
+Storage Backends for the User Activity Log
+SQLite (WAL mode, indexed by user and action) is the default; the original CSV
+file remains available as a backend and as the streamed export format. Includes
+a one-shot migration of an existing CSV log into SQLite, and per-user stats that
+are maintained incrementally instead of being recomputed from the whole log.
+
+Usage:
+    python activity_store.py migrate [--csv user_activity_log.csv] [--db user_activity.db] [--force]
+    python activity_store.py rebuild-stats [--store sqlite|csv] [--csv ...] [--db ...]
+    python activity_store.py compact [--csv user_activity_log.csv] [--days 30] [--rotate]
+"""
+
+import argparse
+import atexit
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import queue
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within one process
+    fcntl = None
+
+import numpy as np
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ['timestamp', 'username', 'action', 'symbol',
+          'timeframe', 'details', 'ip_address', 'session_id']
+
+STORE_KIND = os.getenv('ACTIVITY_STORE', 'sqlite')  # 'sqlite' or 'csv'
+DEFAULT_CSV_PATH = 'user_activity_log.csv'
+DEFAULT_DB_PATH = os.getenv('ACTIVITY_DB', 'user_activity.db')
+# The background writer flushes after this many records or this many seconds
+FLUSH_ROWS = int(os.getenv('ACTIVITY_FLUSH_ROWS', '100'))
+FLUSH_SECONDS = float(os.getenv('ACTIVITY_FLUSH_SECONDS', '1'))
+MAX_PENDING = 10000  # records held while the store is unavailable before new ones are dropped
+# How often the per-user stats are saved next to the log
+SNAPSHOT_SECONDS = float(os.getenv('ACTIVITY_SNAPSHOT_SECONDS', '60'))
+TAIL_CHUNK_BYTES = 1 << 20
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+# CSV log rotation: size, age of the oldest record, and when segments get a columnar summary
+ROTATE_BYTES = int(os.getenv('ACTIVITY_ROTATE_BYTES', str(16 * 1024 * 1024)))
+ROTATE_SECONDS = float(os.getenv('ACTIVITY_ROTATE_SECONDS', str(24 * 3600)))
+COMPACT_DAYS = float(os.getenv('ACTIVITY_COMPACT_DAYS', '30'))
+SUMMARY_COLUMNS = ('username', 'action', 'symbol', 'timeframe')
+# Seconds a worker waits for another one's CSV import before giving up
+MIGRATION_TIMEOUT = 600
+
+
+def new_stats():
+    return {
+        'total_sessions': 0,
+        'total_analyses': 0,
+        'favorite_symbols': {},
+        'favorite_timeframes': {},
+        'last_activity': None,
+        'first_activity': None
+    }
+
+
+def add_to_stats(stats, row):
+    """Fold one activity row into a user's stats"""
+    if row['action'] == 'LOGIN':
+        stats['total_sessions'] += 1
+    elif row['action'] == 'ANALYZE':
+        stats['total_analyses'] += 1
+
+        # Track favorite symbols and timeframes
+        symbol = row['symbol']
+        if symbol:
+            stats['favorite_symbols'][symbol] = stats['favorite_symbols'].get(symbol, 0) + 1
+        timeframe = row['timeframe']
+        if timeframe:
+            stats['favorite_timeframes'][timeframe] = stats['favorite_timeframes'].get(timeframe, 0) + 1
+
+    # Track activity dates
+    if not stats['first_activity']:
+        stats['first_activity'] = row['timestamp']
+    stats['last_activity'] = row['timestamp']
+    return stats
+
+
+def csv_chunks(rows, batch_size=500):
+    """Stream rows as CSV text (header first), a batch of rows per chunk"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=FIELDS, extrasaction='ignore')
+    writer.writeheader()
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def time_bound(value, upper=False):
+    """Parse an ISO date or datetime query bound into the log's timestamp format
+
+    A bare date as the upper bound covers that whole day. Raises ValueError.
+    """
+    if not value:
+        return None
+    moment = datetime.fromisoformat(value)
+    if upper and len(value) <= 10:
+        moment += timedelta(days=1)
+    return moment.strftime(TIMESTAMP_FORMAT)
+
+
+def in_range(timestamp, start=None, end=None):
+    """Whether a timestamp falls in [start, end) (timestamps compare as strings)"""
+    return (start is None or timestamp >= start) and (end is None or timestamp < end)
+
+
+def reverse_lines(file, block_size=64 * 1024):
+    """Yield the lines of a binary file from last to first, reading backwards in blocks"""
+    file.seek(0, os.SEEK_END)
+    position = file.tell()
+    partial = b''
+    while position > 0:
+        size = min(block_size, position)
+        position -= size
+        file.seek(position)
+        lines = (file.read(size) + partial).split(b'\n')
+        partial = lines.pop(0)  # may continue in the previous block
+        for line in reversed(lines):
+            yield line
+    yield partial
+
+
+def reverse_records(file):
+    """Yield CSV records (as value lists) from last to first, header included last
+
+    A record whose quoted fields span lines has an odd number of quotes on its
+    last line, so lines are joined until the quotes balance.
+    """
+    pending = []
+    quotes = 0
+    for line in reverse_lines(file):
+        if not pending:
+            line = line.rstrip(b'\r')  # Record terminator; fields keep their own
+            if not line:
+                continue
+        pending.append(line)
+        quotes += line.count(b'"')
+        if quotes % 2 == 0:
+            text = b'\n'.join(reversed(pending)).decode('utf-8')
+            pending = []
+            quotes = 0
+            yield next(csv.reader([text]))
+
+
+def filter_rows(rows, key=None, start=None, end=None):
+    """Rows of one lower-cased username (any if None) logged in [start, end)"""
+    for row in rows:
+        if ((key is None or row['username'].lower() == key) and
+                in_range(row['timestamp'], start, end)):
+            yield row
+
+
+def tail_batches(file, generation, offset=0):
+    """Yield ([generation, position], rows) for the CSV records of a binary file
+    after offset (0 skips the header), a chunk at a time"""
+    if offset:
+        file.seek(offset)
+    else:
+        file.readline()
+    position = file.tell()
+    pending = b''
+    while True:
+        chunk = file.read(TAIL_CHUNK_BYTES)
+        if not chunk:
+            return
+        pending += chunk
+        # Cut after the last complete record: a newline outside quoted fields
+        end = pending.rfind(b'\n') + 1
+        while end and pending.count(b'"', 0, end) % 2:
+            end = pending.rfind(b'\n', 0, end - 1) + 1
+        if not end:
+            continue
+        text = pending[:end].decode('utf-8')
+        position += end
+        pending = pending[end:]
+        rows = [dict(zip(FIELDS, values))
+                for values in csv.reader(io.StringIO(text, newline='')) if values]
+        yield [generation, position], rows
+
+
+def encode_columns(rows):
+    """Columnar, dictionary-encoded form of activity rows: epoch seconds plus, for
+    each of username, action, symbol and timeframe, integer codes into a values array"""
+    columns = {'time': np.array([row['timestamp'] for row in rows],
+                                dtype='datetime64[s]').astype('int64')}
+    for name in SUMMARY_COLUMNS:
+        values, codes = np.unique(np.array([row[name] for row in rows], dtype=str),
+                                  return_inverse=True)
+        columns[f'{name}_values'] = values
+        columns[f'{name}_codes'] = codes.astype('int32')
+    return columns
+
+
+class CsvActivityStore:
+    """Append-only CSV file, rotated into compressed segments
+
+    Once the active file passes rotate_bytes, or its first record is older than
+    rotate_seconds, it is moved into a dated .csv.gz segment. manifest.json in
+    the segment directory records each segment's time range and usernames, so
+    readers open only the segments that can hold matching rows. Segments older
+    than compact_days also get a dictionary-encoded columnar summary (.npz) for
+    analytics. Positions used by batches_after are [generation, byte offset];
+    every rotation starts a new generation.
+    """
+
+    def __init__(self, path=DEFAULT_CSV_PATH, rotate_bytes=ROTATE_BYTES,
+                 rotate_seconds=ROTATE_SECONDS, compact_days=COMPACT_DAYS):
+        self.path = path
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.compact_days = compact_days
+        self.segment_dir = f'{os.path.splitext(path)[0]}_segments'
+        self.manifest_path = os.path.join(self.segment_dir, 'manifest.json')
+        self.lock_path = f'{path}.lock'
+        self._lock = threading.Lock()
+        if not os.path.exists(self.path):
+            with open(self.path, 'w', newline='', encoding='utf-8') as file:
+                csv.writer(file).writerow(FIELDS)
+            logger.info(f"Created new log file: {self.path}")
+
+    @contextmanager
+    def _locked(self, shared=False):
+        """Lock the log against rotation (shared) or for writing (exclusive),
+        across threads and worker processes. The lock lives in its own file
+        because the active file is replaced on rotation."""
+        with (nullcontext() if shared else self._lock), open(self.lock_path, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def manifest(self):
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {'generation': 0, 'segments': []}
+
+    def _write_manifest(self, manifest):
+        os.makedirs(self.segment_dir, exist_ok=True)
+        temp_path = f'{self.manifest_path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(manifest, file, indent=1)
+        os.replace(temp_path, self.manifest_path)
+
+    def _snapshot(self):
+        """The manifest plus an open handle on the active file, taken together so
+        a concurrent rotation cannot make rows appear twice or not at all"""
+        with self._locked(shared=True):
+            return self.manifest(), open(self.path, 'rb')
+
+    def _segment_path(self, segment, key='file'):
+        return os.path.join(self.segment_dir, segment[key])
+
+    def _segments(self, manifest, username=None, start=None, end=None):
+        """Segments that can hold rows for this user and time range"""
+        key = username.lower() if username is not None else None
+        for segment in manifest['segments']:
+            if key is not None and key not in segment['usernames']:
+                continue
+            if not in_range(segment['end'], start) or not in_range(segment['start'], None, end):
+                continue
+            yield segment
+
+    def append(self, record):
+        self.append_many([record])
+
+    def append_many(self, records):
+        """Append records in one write under an exclusive lock, so batches from
+        different threads or worker processes never interleave"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for record in records:
+            writer.writerow([record.get(field) or '' for field in FIELDS])
+
+        with self._locked():
+            rotated = self._rotate_if_due()
+            with open(self.path, 'a', newline='', encoding='utf-8') as file:
+                file.write(buffer.getvalue())
+                file.flush()
+        if rotated:
+            try:
+                self.compact()
+            except Exception as e:  # The records are written; summaries can wait
+                logger.error(f"Failed to compact activity segments: {e}")
+
+    def _rotate_if_due(self):
+        """Rotate the active file if it is too big or too old (lock held)"""
+        with open(self.path, 'r', newline='', encoding='utf-8') as file:
+            first = next(csv.DictReader(file), None)
+        if first is None:
+            return False
+        try:
+            age = datetime.now() - datetime.strptime(first['timestamp'], TIMESTAMP_FORMAT)
+        except ValueError:
+            age = timedelta(0)
+        if (os.path.getsize(self.path) < self.rotate_bytes and
+                age.total_seconds() < self.rotate_seconds):
+            return False
+        self.rotate()
+        return True
+
+    def rotate(self):
+        """Move the active file into a compressed segment (caller holds the exclusive lock)"""
+        timestamps, usernames = [], set()
+        with open(self.path, 'r', newline='', encoding='utf-8') as file:
+            for row in csv.DictReader(file):
+                timestamps.append(row['timestamp'])
+                usernames.add(row['username'].lower())
+        if not timestamps:
+            return None
+
+        manifest = self.manifest()
+        generation = manifest['generation']
+        stem = os.path.basename(os.path.splitext(self.path)[0])
+        dated = min(timestamps).replace('-', '').replace(':', '').replace(' ', 'T')
+        segment = {
+            'file': f'{stem}-{dated}-{generation:05d}.csv.gz',
+            'generation': generation,
+            'start': min(timestamps),
+            'end': max(timestamps),
+            'rows': len(timestamps),
+            'usernames': sorted(usernames),
+            'summary': None
+        }
+
+        os.makedirs(self.segment_dir, exist_ok=True)
+        temp_path = f'{self._segment_path(segment)}.tmp'
+        with open(self.path, 'rb') as source, gzip.open(temp_path, 'wb') as target:
+            shutil.copyfileobj(source, target)
+        os.replace(temp_path, self._segment_path(segment))
+
+        manifest['segments'].append(segment)
+        manifest['generation'] = generation + 1
+        self._write_manifest(manifest)
+
+        # Readers holding the old file keep reading it; new ones get a fresh log
+        temp_path = f'{self.path}.tmp'
+        with open(temp_path, 'w', newline='', encoding='utf-8') as file:
+            csv.writer(file).writerow(FIELDS)
+        os.replace(temp_path, self.path)
+        logger.info(f"Rotated {len(timestamps)} activity rows into {segment['file']}")
+        return segment
+
+    def compact(self, older_than_days=None):
+        """Write columnar summaries for segments that ended more than older_than_days
+        ago; returns the number of segments summarized"""
+        days = self.compact_days if older_than_days is None else older_than_days
+        cutoff = (datetime.now() - timedelta(days=days)).strftime(TIMESTAMP_FORMAT)
+        done = {}
+        for segment in self.manifest()['segments']:
+            if segment['summary'] or segment['end'] >= cutoff:
+                continue
+            with gzip.open(self._segment_path(segment), 'rt', newline='', encoding='utf-8') as file:
+                columns = encode_columns(list(csv.DictReader(file)))
+            summary = segment['file'].replace('.csv.gz', '.npz')
+            temp_path = os.path.join(self.segment_dir, f'{summary}.{os.getpid()}.tmp')
+            with open(temp_path, 'wb') as file:
+                np.savez_compressed(file, **columns)
+            os.replace(temp_path, os.path.join(self.segment_dir, summary))
+            done[segment['file']] = summary
+
+        if done:
+            with self._locked():
+                manifest = self.manifest()
+                for segment in manifest['segments']:
+                    segment['summary'] = done.get(segment['file'], segment['summary'])
+                self._write_manifest(manifest)
+            logger.info(f"Compacted {len(done)} activity segments into columnar summaries")
+        return len(done)
+
+    def iter_rows(self, username=None, start=None, end=None):
+        """Rows in log order, optionally only those of one user (case-insensitive)
+        logged in [start, end)"""
+        manifest, active = self._snapshot()
+        key = username.lower() if username is not None else None
+        with active:
+            for segment in self._segments(manifest, username, start, end):
+                with gzip.open(self._segment_path(segment), 'rt', newline='', encoding='utf-8') as file:
+                    yield from filter_rows(csv.DictReader(file), key, start, end)
+            text = io.TextIOWrapper(active, encoding='utf-8', newline='')
+            yield from filter_rows(csv.DictReader(text), key, start, end)
+
+    def has_position(self, position):
+        """Whether a batches_after position belongs to this log"""
+        if not (isinstance(position, list) and len(position) == 2):
+            return False
+        generation, offset = position
+        current = self.manifest()['generation']
+        return generation < current or (generation == current and
+                                        offset <= os.path.getsize(self.path))
+
+    def batches_after(self, position=None):
+        """Yield (position, rows) for every record written after position, reading
+        only the tail of the log; position None starts from the beginning"""
+        manifest, active = self._snapshot()
+        generation, offset = position or (0, 0)
+        with active:
+            for segment in manifest['segments']:
+                if segment['generation'] < generation:
+                    continue
+                with gzip.open(self._segment_path(segment), 'rb') as file:
+                    yield from tail_batches(file, segment['generation'],
+                                            offset if segment['generation'] == generation else 0)
+                # Finished with this segment: continue from the next generation
+                yield [segment['generation'] + 1, 0], []
+            yield from tail_batches(active, manifest['generation'],
+                                    offset if manifest['generation'] == generation else 0)
+
+    def column_batches_after(self, position=None):
+        """Like batches_after, but yields encode_columns() batches; whole segments
+        that have a columnar summary are loaded from it instead of parsed"""
+        generation, offset = position or (0, 0)
+        for segment in self.manifest()['segments']:
+            if segment['generation'] != generation or offset or not segment['summary']:
+                break
+            with np.load(self._segment_path(segment, 'summary')) as summary:
+                columns = {name: summary[name] for name in summary.files}
+            generation += 1
+            yield [generation, 0], columns
+
+        for position, rows in self.batches_after([generation, offset]):
+            yield position, encode_columns(rows)
+
+    def recent(self, username, limit=20):
+        """A user's latest rows, most recent first, read backwards from the end of
+        the log so the cost depends on how far back they are, not the log size"""
+        rows = []
+        if limit <= 0:
+            return rows
+        manifest, active = self._snapshot()
+        key = username.lower()
+        with active:
+            records = reverse_records(active)
+            for values in records:
+                if values == FIELDS:
+                    break  # Reached the header
+                row = dict(zip(FIELDS, values))
+                if row['username'].lower() == key:
+                    rows.append(row)
+                    if len(rows) == limit:
+                        return rows
+            records.close()
+
+        for segment in reversed(list(self._segments(manifest, username))):
+            with gzip.open(self._segment_path(segment), 'rt', newline='', encoding='utf-8') as file:
+                matches = list(filter_rows(csv.DictReader(file), key))
+            rows.extend(reversed(matches[-(limit - len(rows)):]))
+            if len(rows) == limit:
+                break
+        return rows
+
+    def top_pairs(self, action, limit):
+        """The most frequent (symbol, timeframe) pairs for an action"""
+        counts = {}
+        for row in self.iter_rows():
+            if row['action'] == action and row['symbol'] and row['timeframe']:
+                pair = (row['symbol'], row['timeframe'])
+                counts[pair] = counts.get(pair, 0) + 1
+        return sorted(counts, key=counts.get, reverse=True)[:limit]
+
+    def export_csv(self, username, start=None, end=None):
+        return csv_chunks(self.iter_rows(username, start, end))
+
+
+def batched(iterable, size):
+    """Lists of up to size items from an iterable"""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class SqliteActivityStore:
+    """SQLite database in WAL mode with indexes on (user, timestamp) and action
+
+    Usernames are matched case-insensitively through a lower-cased key column.
+    Each thread uses its own connection.
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS activity (
+            id INTEGER PRIMARY KEY,
+            timestamp TEXT NOT NULL,
+            username TEXT NOT NULL,
+            username_key TEXT NOT NULL,
+            action TEXT NOT NULL,
+            symbol TEXT NOT NULL DEFAULT '',
+            timeframe TEXT NOT NULL DEFAULT '',
+            details TEXT NOT NULL DEFAULT '',
+            ip_address TEXT NOT NULL DEFAULT '',
+            session_id TEXT NOT NULL DEFAULT ''
+        );
+        CREATE INDEX IF NOT EXISTS idx_activity_user_time ON activity (username_key, timestamp);
+        CREATE INDEX IF NOT EXISTS idx_activity_action ON activity (action);
+        CREATE TABLE IF NOT EXISTS migrations (
+            source TEXT PRIMARY KEY,
+            rows INTEGER NOT NULL,
+            migrated_at TEXT NOT NULL
+        );
+    '''
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self.connection().executescript(self.SCHEMA)
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def append(self, record):
+        self.append_many([record])
+
+    INSERT = ('INSERT INTO activity (timestamp, username, username_key, action, symbol, '
+              'timeframe, details, ip_address, session_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)')
+
+    @staticmethod
+    def _row(record):
+        return (record['timestamp'], record['username'], record['username'].lower(),
+                record['action'], record.get('symbol') or '', record.get('timeframe') or '',
+                record.get('details') or '', record.get('ip_address') or '',
+                record.get('session_id') or '')
+
+    def append_many(self, records):
+        rows = [self._row(record) for record in records]
+        with self.connection() as conn:
+            conn.executemany(self.INSERT, rows)
+
+    def iter_rows(self, username=None, start=None, end=None):
+        """Rows in log order, optionally only those of one user (case-insensitive)
+        logged in [start, end)"""
+        conditions, params = [], []
+        if username is not None:
+            conditions.append('username_key = ?')
+            params.append(username.lower())
+        if start is not None:
+            conditions.append('timestamp >= ?')
+            params.append(start)
+        if end is not None:
+            conditions.append('timestamp < ?')
+            params.append(end)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        # Per-user queries walk the (username_key, timestamp) index
+        order = 'timestamp, id' if username is not None else 'id'
+        cursor = self.connection().execute(
+            f"SELECT {', '.join(FIELDS)} FROM activity {where} ORDER BY {order}", params)
+        for row in cursor:
+            yield dict(row)
+
+    def has_position(self, position):
+        """Whether a batches_after position (a row id) belongs to this database"""
+        return isinstance(position, int) and position <= self.connection().execute(
+            'SELECT COALESCE(MAX(id), 0) FROM activity').fetchone()[0]
+
+    def batches_after(self, position=None, batch_size=1000):
+        """Yield (position, rows) for every record written after position"""
+        cursor = self.connection().execute(
+            f"SELECT id, {', '.join(FIELDS)} FROM activity WHERE id > ? ORDER BY id",
+            (position or 0,))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield rows[-1]['id'], [dict(row) for row in rows]
+
+    def column_batches_after(self, position=None):
+        """Like batches_after, but yields encode_columns() batches"""
+        for position, rows in self.batches_after(position):
+            yield position, encode_columns(rows)
+
+    def recent(self, username, limit=20):
+        """A user's latest rows, most recent first"""
+        cursor = self.connection().execute(
+            f"SELECT {', '.join(FIELDS)} FROM activity WHERE username_key = ? "
+            "ORDER BY timestamp DESC, id DESC LIMIT ?", (username.lower(), limit))
+        return [dict(row) for row in cursor]
+
+    def top_pairs(self, action, limit):
+        """The most frequent (symbol, timeframe) pairs for an action"""
+        cursor = self.connection().execute(
+            "SELECT symbol, timeframe FROM activity WHERE action = ? AND symbol != '' "
+            "AND timeframe != '' GROUP BY symbol, timeframe ORDER BY COUNT(*) DESC LIMIT ?",
+            (action, limit))
+        return [(row['symbol'], row['timeframe']) for row in cursor]
+
+    def export_csv(self, username, start=None, end=None):
+        return csv_chunks(self.iter_rows(username, start, end))
+
+    def is_migrated(self, source):
+        row = self.connection().execute(
+            'SELECT rows FROM migrations WHERE source = ?', (source,)).fetchone()
+        return row is not None
+
+    def mark_migrated(self, source, rows):
+        with self.connection() as conn:
+            conn.execute('INSERT OR REPLACE INTO migrations (source, rows, migrated_at) VALUES (?, ?, ?)',
+                         (source, rows, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+
+    def migrate(self, source, records, force=False, batch_size=1000):
+        """Import records from source once; returns the rows copied, or None if source
+        was already imported
+
+        The check, the copy and the mark are one IMMEDIATE transaction, so of several
+        processes starting at once one imports and the others wait, then skip.
+        """
+        conn = sqlite3.connect(self.path, timeout=MIGRATION_TIMEOUT, isolation_level=None)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                done = conn.execute(
+                    'SELECT 1 FROM migrations WHERE source = ?', (source,)).fetchone()
+                if done is not None and not force:
+                    conn.execute('ROLLBACK')
+                    return None
+                copied = 0
+                for batch in batched(records, batch_size):
+                    conn.executemany(self.INSERT, [self._row(record) for record in batch])
+                    copied += len(batch)
+                conn.execute('INSERT OR REPLACE INTO migrations (source, rows, migrated_at) '
+                             'VALUES (?, ?, ?)',
+                             (source, copied, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+                conn.execute('COMMIT')
+                return copied
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+
+
+class ActivityWriter:
+    """Moves activity records to a store from a background thread
+
+    append() only queues the record, so requests never wait on disk. The thread
+    writes a batch once flush_rows records are waiting or flush_seconds have
+    passed, and whatever is left is flushed at interpreter exit. Batches go
+    through store.append_many, which is safe across worker processes (SQLite
+    locking, or an exclusive lock on the CSV file). on_flush runs after every
+    batch and, when there was nothing to write, once per flush_seconds anyway,
+    so readers of the store also pick up records other processes wrote.
+    pending() lists the records not yet covered by an on_flush call.
+    """
+
+    def __init__(self, store, flush_rows=FLUSH_ROWS, flush_seconds=FLUSH_SECONDS,
+                 max_pending=MAX_PENDING, on_flush=None):
+        self.store = store
+        self.on_flush = on_flush  # called after each batch is written
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._retry = []  # batch whose write failed, tried again first
+        self._writing = []  # batch being written, pending until on_flush has seen it
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def start(self):
+        # Threads do not survive fork, so a forked worker starts its own
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='activity-writer', daemon=True)
+            self._thread.start()
+
+    def append(self, record):
+        """Queue a record; returns False if it had to be dropped"""
+        self.start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            metrics.activity_records.inc(outcome='dropped')
+            logger.error("Activity log queue is full, dropping record")
+            return False
+        if self._queue.qsize() >= self.flush_rows:
+            self._wake.set()
+        return True
+
+    def pending(self, writing=True):
+        """Records queued or being written that on_flush has not seen yet, oldest first
+
+        writing=False leaves out the batch being written, so every record returned
+        is certainly not in the store yet.
+        """
+        with self._queue.mutex:
+            return self._retry + (self._writing if writing else []) + list(self._queue.queue)
+
+    def flush(self):
+        """Write every queued record now (in the calling thread); returns whether any were"""
+        with self._flush_lock:
+            batch = self._retry
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return False
+            with self._queue.mutex:
+                self._retry, self._writing = [], batch
+            try:
+                self.store.append_many(batch)
+                metrics.activity_records.inc(len(batch), outcome='written')
+            except Exception as e:
+                metrics.activity_records.inc(len(batch), outcome='failed')
+                logger.error(f"Failed to write {len(batch)} activity records: {e}")
+                with self._queue.mutex:
+                    self._retry, self._writing = batch[-self._queue.maxsize:], []
+                return False
+            self._notify()
+            with self._queue.mutex:
+                self._writing = []
+            return True
+
+    def _notify(self):
+        if self.on_flush is not None:
+            try:
+                self.on_flush()
+            except Exception as e:
+                logger.error(f"Activity flush callback failed: {e}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            if not self.flush():
+                self._notify()
+
+    def close(self):
+        """Stop the thread and flush what is left"""
+        self._stop.set()
+        self._wake.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            thread.join(timeout=5)
+        self.flush()
+
+
+class UserStatsIndex:
+    """Per-user stats kept in memory and brought up to date from the log tail
+
+    Every refresh folds in only the records written since the last one (by any
+    process), so a lookup costs the same however long the log is. The stats and
+    log position are saved to a JSON snapshot every snapshot_seconds and at
+    exit, so a restart only has to read what was logged since.
+    """
+
+    def __init__(self, store, snapshot_path=None, snapshot_seconds=SNAPSHOT_SECONDS):
+        self.store = store
+        self.snapshot_path = snapshot_path or f'{store.path}.stats.json'
+        self.snapshot_seconds = snapshot_seconds
+        self.users = {}  # lower-cased username -> stats
+        self.position = None
+        self._saved_position = None
+        self._saved_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._load_snapshot()
+        atexit.register(self.save_snapshot)
+
+    def _load_snapshot(self):
+        try:
+            with open(self.snapshot_path, 'r', encoding='utf-8') as file:
+                snapshot = json.load(file)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.error(f"Ignoring unreadable stats snapshot {self.snapshot_path}: {e}")
+            return
+
+        if (snapshot.get('source') != os.path.abspath(self.store.path) or
+                not self.store.has_position(snapshot.get('position'))):
+            logger.info(f"Stats snapshot {self.snapshot_path} does not match the log, rebuilding")
+            return
+        self.users = snapshot['users']
+        self.position = self._saved_position = snapshot['position']
+
+    def refresh(self):
+        """Fold in records logged since the last refresh"""
+        with self._lock:
+            for position, rows in self.store.batches_after(self.position):
+                for row in rows:
+                    key = row['username'].lower()
+                    stats = self.users.get(key)
+                    if stats is None:
+                        stats = self.users[key] = new_stats()
+                    add_to_stats(stats, row)
+                self.position = position
+
+            if time.monotonic() - self._saved_at >= self.snapshot_seconds:
+                self._save()
+
+    def get(self, username, pending=()):
+        """Stats for one user (a copy) as of the last refresh, plus the given records
+        not written yet; reads nothing from the store"""
+        key = username.lower()
+        with self._lock:
+            stats = self.users.get(key)
+            stats = new_stats() if stats is None else {
+                **stats,
+                'favorite_symbols': dict(stats['favorite_symbols']),
+                'favorite_timeframes': dict(stats['favorite_timeframes'])}
+        for record in pending:
+            if record['username'].lower() == key:
+                add_to_stats(stats, record)
+        return stats
+
+    def rebuild(self):
+        """Recompute every user's stats from the raw log in one streaming pass"""
+        with self._lock:
+            self.users = {}
+            self.position = None
+        self.refresh()
+        self.save_snapshot()
+        return len(self.users)
+
+    def save_snapshot(self):
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        self._saved_at = time.monotonic()
+        if self.position is None or self.position == self._saved_position:
+            return
+        try:
+            temp_path = f'{self.snapshot_path}.{os.getpid()}.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump({'source': os.path.abspath(self.store.path),
+                           'position': self.position,
+                           'users': self.users}, file)
+            # Atomic, so workers saving at the same time never leave a torn file
+            os.replace(temp_path, self.snapshot_path)
+            self._saved_position = self.position
+        except Exception as e:
+            logger.error(f"Failed to save stats snapshot {self.snapshot_path}: {e}")
+
+
+def migrate_csv(csv_path, store, force=False, batch_size=1000):
+    """Copy a CSV activity log into a SQLite store once; returns the number of rows copied"""
+    source = os.path.abspath(csv_path)
+    if not os.path.exists(csv_path) or (store.is_migrated(source) and not force):
+        return 0  # Checked again under the write lock by store.migrate
+
+    copied = store.migrate(source, CsvActivityStore(csv_path).iter_rows(), force, batch_size)
+    if copied is None:
+        return 0  # Another worker imported it first
+    logger.info(f"Migrated {copied} activity rows from {csv_path} to {store.path}")
+    return copied
+
+
+def open_store(kind=STORE_KIND, csv_path=DEFAULT_CSV_PATH, db_path=DEFAULT_DB_PATH):
+    """Open the configured store; a new SQLite store imports the existing CSV log once"""
+    if kind == 'csv':
+        return CsvActivityStore(csv_path)
+    if kind != 'sqlite':
+        raise ValueError(f'Unknown activity store: {kind}')
+
+    store = SqliteActivityStore(db_path)
+    migrate_csv(csv_path, store)
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the user activity store')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    migrate = subcommands.add_parser('migrate', help='Import a CSV activity log into SQLite')
+    migrate.add_argument('--csv', default=DEFAULT_CSV_PATH, help='CSV log to import')
+    migrate.add_argument('--db', default=DEFAULT_DB_PATH, help='SQLite database to write')
+    migrate.add_argument('--force', action='store_true',
+                         help='Import again even if this CSV was already migrated')
+    rebuild = subcommands.add_parser('rebuild-stats',
+                                     help='Recompute the per-user stats snapshot from the log')
+    rebuild.add_argument('--store', choices=('sqlite', 'csv'), default=STORE_KIND,
+                         help='Store holding the log')
+    rebuild.add_argument('--csv', default=DEFAULT_CSV_PATH, help='CSV log (csv store)')
+    rebuild.add_argument('--db', default=DEFAULT_DB_PATH, help='SQLite database (sqlite store)')
+    compact = subcommands.add_parser(
+        'compact', help='Write columnar summaries for old segments of the CSV log')
+    compact.add_argument('--csv', default=DEFAULT_CSV_PATH, help='CSV log')
+    compact.add_argument('--days', type=float, default=COMPACT_DAYS,
+                         help='Summarize segments that ended more than this many days ago')
+    compact.add_argument('--rotate', action='store_true',
+                         help='Rotate the active file into a segment first')
+    args = parser.parse_args()
+
+    if args.command == 'compact':
+        store = CsvActivityStore(args.csv)
+        if args.rotate:
+            with store._locked():
+                segment = store.rotate()
+            if segment:
+                print(f"✅ Rotated {segment['rows']} rows into {segment['file']}")
+        summarized = store.compact(args.days)
+        print(f"✅ Summarized {summarized} segments in {store.segment_dir}")
+    elif args.command == 'rebuild-stats':
+        store = open_store(args.store, csv_path=args.csv, db_path=args.db)
+        index = UserStatsIndex(store)
+        users = index.rebuild()
+        print(f"✅ Rebuilt stats for {users} users into {index.snapshot_path}")
+    elif args.command == 'migrate':
+        store = SqliteActivityStore(args.db)
+        copied = migrate_csv(args.csv, store, force=args.force)
+        if copied:
+            print(f"✅ Migrated {copied} rows from {args.csv} into {args.db}")
+        else:
+            print(f"ℹ️  Nothing to migrate ({args.csv} missing or already imported; use --force)")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
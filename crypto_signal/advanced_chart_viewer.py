@@ -5,10 +5,10 @@ This creates professional-looking charts similar to TradingView with precise tre
 """
 
 from app import OrderBlockDetector
+import render_cache
 import sys
 import os
 import webbrowser
-import tempfile
 import numpy as np
 import pandas as pd
 from datetime import datetime
@@ -21,8 +21,17 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 # Import from your app
 
 
+PLOTLY_CDN = "https://cdn.plot.ly/plotly-latest.min.js"
+# Lines x candles scored per step, bounds the temporary arrays
+CHUNK_ELEMENTS = 1 << 20
+
+
 class AdvancedTrendLineDetector:
-    """Enhanced trend line detection using multiple algorithms"""
+    """Enhanced trend line detection using multiple algorithms
+
+    Candidate lines are scored against every candle with NumPy broadcasting, in
+    chunks of lines so memory stays bounded for long lookbacks.
+    """
 
     def __init__(self):
         self.min_touches = 2
@@ -49,198 +58,128 @@ class AdvancedTrendLineDetector:
 
     def _detect_support_lines(self, df):
         """Detect support trend lines connecting significant lows"""
-        support_lines = []
-
-        # Find local minima (significant lows)
-        lows = self._find_significant_lows(df)
-
-        # Try all combinations of lows to form trend lines
-        for i in range(len(lows)):
-            for j in range(i + 1, len(lows)):
-                point1 = lows[i]
-                point2 = lows[j]
-
-                # Calculate line parameters
-                x1, y1 = point1['index'], point1['price']
-                x2, y2 = point2['index'], point2['price']
-
-                if x2 == x1:  # Avoid division by zero
-                    continue
-
-                slope = (y2 - y1) / (x2 - x1)
-                intercept = y1 - slope * x1
-
-                # Check if slope angle is reasonable
-                angle = np.degrees(np.arctan(slope))
-                if abs(angle) > self.max_slope_angle:
-                    continue
-
-                # Count touches and validate line
-                touches = self._count_line_touches(df, slope, intercept, 'low')
-                if touches >= self.min_touches:
-                    support_lines.append({
-                        'type': 'support',
-                        'slope': slope,
-                        'intercept': intercept,
-                        'start_index': x1,
-                        'end_index': len(df) - 1,
-                        'touches': touches,
-                        'strength': self._calculate_line_strength(df, slope, intercept, 'support'),
-                        'touch_points': self._get_touch_indices(df, slope, intercept, 'low')
-                    })
-
-        return support_lines
+        return self._detect_lines(df, self._find_significant_lows(df), 'support')
 
     def _detect_resistance_lines(self, df):
         """Detect resistance trend lines connecting significant highs"""
-        resistance_lines = []
-
-        # Find local maxima (significant highs)
-        highs = self._find_significant_highs(df)
-
-        # Try all combinations of highs to form trend lines
-        for i in range(len(highs)):
-            for j in range(i + 1, len(highs)):
-                point1 = highs[i]
-                point2 = highs[j]
-
-                # Calculate line parameters
-                x1, y1 = point1['index'], point1['price']
-                x2, y2 = point2['index'], point2['price']
-
-                if x2 == x1:  # Avoid division by zero
-                    continue
-
-                slope = (y2 - y1) / (x2 - x1)
-                intercept = y1 - slope * x1
-
-                # Check if slope angle is reasonable
-                angle = np.degrees(np.arctan(slope))
-                if abs(angle) > self.max_slope_angle:
-                    continue
-
-                # Count touches and validate line
-                touches = self._count_line_touches(
-                    df, slope, intercept, 'high')
-                if touches >= self.min_touches:
-                    resistance_lines.append({
-                        'type': 'resistance',
-                        'slope': slope,
-                        'intercept': intercept,
-                        'start_index': x1,
-                        'end_index': len(df) - 1,
-                        'touches': touches,
-                        'strength': self._calculate_line_strength(df, slope, intercept, 'resistance'),
-                        'touch_points': self._get_touch_indices(df, slope, intercept, 'high')
-                    })
-
-        return resistance_lines
+        return self._detect_lines(df, self._find_significant_highs(df), 'resistance')
+
+    def _detect_lines(self, df, points, line_type):
+        """Score the lines through every pair of points, in pair order"""
+        if len(points) < 2:
+            return []
+
+        index = np.array([point['index'] for point in points], dtype=np.int64)
+        price = np.array([point['price'] for point in points], dtype=np.float64)
+        first, second = np.triu_indices(len(points), k=1)
+        distinct = index[second] != index[first]  # Avoid division by zero
+        first, second = first[distinct], second[distinct]
+
+        x1, x2 = index[first], index[second]
+        slopes = (price[second] - price[first]) / (x2 - x1)
+        intercepts = price[first] - slopes * x1
+
+        # Check if slope angle is reasonable
+        reasonable = np.abs(np.degrees(np.arctan(slopes))) <= self.max_slope_angle
+        x1, slopes, intercepts = x1[reasonable], slopes[reasonable], intercepts[reasonable]
+
+        price_type = 'low' if line_type == 'support' else 'high'
+        prices = df[price_type].to_numpy(dtype=np.float64)
+        lines = []
+        step = max(1, CHUNK_ELEMENTS // max(len(prices), 1))
+        for start in range(0, len(slopes), step):
+            chunk = slice(start, start + step)
+            touching = self._touch_mask(prices, slopes[chunk], intercepts[chunk])
+            touches = touching.sum(axis=1)
+            strengths = self._line_strengths(df, slopes[chunk], intercepts[chunk], line_type,
+                                             touches)
+
+            for n in np.flatnonzero(touches >= self.min_touches):
+                lines.append({
+                    'type': line_type,
+                    'slope': float(slopes[chunk][n]),
+                    'intercept': float(intercepts[chunk][n]),
+                    'start_index': int(x1[chunk][n]),
+                    'end_index': len(df) - 1,
+                    'touches': int(touches[n]),
+                    'strength': float(strengths[n]),
+                    'touch_points': np.flatnonzero(touching[n]).tolist()
+                })
+
+        return lines
 
     def _find_significant_lows(self, df, window=5):
         """Find significant low points in the data"""
-        lows = []
-
-        for i in range(window, len(df) - window):
-            current_low = df.iloc[i]['low']
-
-            # Check if this is a local minimum
-            is_local_min = True
-            for j in range(i - window, i + window + 1):
-                if j != i and df.iloc[j]['low'] <= current_low:
-                    is_local_min = False
-                    break
-
-            if is_local_min:
-                lows.append({
-                    'index': i,
-                    'price': current_low,
-                    'timestamp': df.iloc[i]['timestamp']
-                })
-
-        return lows
+        return self._find_extremes(df, 'low', window)
 
     def _find_significant_highs(self, df, window=5):
         """Find significant high points in the data"""
-        highs = []
-
-        for i in range(window, len(df) - window):
-            current_high = df.iloc[i]['high']
+        return self._find_extremes(df, 'high', window)
+
+    def _find_extremes(self, df, price_type, window):
+        """Candles strictly below (lows) or above (highs) every other candle within window"""
+        prices = df[price_type].to_numpy(dtype=np.float64)
+        if len(prices) < 2 * window + 1:
+            return []
+
+        windows = np.lib.stride_tricks.sliding_window_view(prices, 2 * window + 1)
+        centers = windows[:, window]
+        others = np.delete(windows, window, axis=1)
+        if price_type == 'low':
+            extreme = (others > centers[:, None]).all(axis=1)
+        else:
+            extreme = (others < centers[:, None]).all(axis=1)
 
-            # Check if this is a local maximum
-            is_local_max = True
-            for j in range(i - window, i + window + 1):
-                if j != i and df.iloc[j]['high'] >= current_high:
-                    is_local_max = False
-                    break
+        timestamps = df['timestamp']
+        return [{
+            'index': int(i),
+            'price': float(prices[i]),
+            'timestamp': timestamps.iloc[i]
+        } for i in np.flatnonzero(extreme) + window]
 
-            if is_local_max:
-                highs.append({
-                    'index': i,
-                    'price': current_high,
-                    'timestamp': df.iloc[i]['timestamp']
-                })
+    def _touch_mask(self, prices, slopes, intercepts):
+        """Lines x candles: whether each candle's price is within tolerance of each line"""
+        tolerance = self.tolerance_percentage / 100
+        line_prices = slopes[:, None] * np.arange(len(prices))[None, :] + intercepts[:, None]
 
-        return highs
+        # Calculate percentage difference
+        with np.errstate(divide='ignore', invalid='ignore'):
+            diff_percentage = np.abs(prices[None, :] - line_prices) / line_prices
+        return (line_prices > 0) & (diff_percentage <= tolerance)
 
     def _count_line_touches(self, df, slope, intercept, price_type):
         """Count how many times price touches the trend line"""
-        touches = 0
-        tolerance = self.tolerance_percentage / 100
-
-        for i in range(len(df)):
-            line_price = slope * i + intercept
-            actual_price = df.iloc[i][price_type]
-
-            # Calculate percentage difference
-            if line_price > 0:
-                diff_percentage = abs(actual_price - line_price) / line_price
-                if diff_percentage <= tolerance:
-                    touches += 1
-
-        return touches
+        return int(self._touch_mask(df[price_type].to_numpy(dtype=np.float64),
+                                    np.array([slope]), np.array([intercept]))[0].sum())
 
     def _get_touch_indices(self, df, slope, intercept, price_type):
         """Get indices where price touches the trend line"""
-        touch_indices = []
-        tolerance = self.tolerance_percentage / 100
+        return np.flatnonzero(self._touch_mask(df[price_type].to_numpy(dtype=np.float64),
+                                               np.array([slope]), np.array([intercept]))[0]).tolist()
 
-        for i in range(len(df)):
-            line_price = slope * i + intercept
-            actual_price = df.iloc[i][price_type]
+    def _line_strengths(self, df, slopes, intercepts, line_type, touches):
+        """Strength/quality of each line given its touch count"""
+        # Factor in number of touches and line length
+        line_length = len(df)
+        strengths = touches * 0.4 + (line_length / 100) * 0.3
 
-            # Calculate percentage difference
-            if line_price > 0:
-                diff_percentage = abs(actual_price - line_price) / line_price
-                if diff_percentage <= tolerance:
-                    touch_indices.append(i)
+        # Bonus for lines that haven't been broken in the last 20 candles
+        recent_data = df.tail(20)
+        positions = len(df) - 20 + np.arange(len(recent_data))
+        line_prices = slopes[:, None] * positions[None, :] + intercepts[:, None]
+        if line_type == 'support':
+            broken = (recent_data['low'].to_numpy()[None, :] < line_prices * 0.99).any(axis=1)
+        else:
+            broken = (recent_data['high'].to_numpy()[None, :] > line_prices * 1.01).any(axis=1)
 
-        return touch_indices
+        return np.where(broken, strengths, strengths + 0.5)
 
     def _calculate_line_strength(self, df, slope, intercept, line_type):
         """Calculate the strength/quality of a trend line"""
         touches = self._count_line_touches(
             df, slope, intercept, 'low' if line_type == 'support' else 'high')
-
-        # Factor in number of touches and line length
-        line_length = len(df)
-        strength = touches * 0.4 + (line_length / 100) * 0.3
-
-        # Bonus for lines that haven't been broken recently
-        recent_data = df.tail(20)
-        broken = False
-        for i in range(len(recent_data)):
-            line_price = slope * (len(df) - 20 + i) + intercept
-            if line_type == 'support' and recent_data.iloc[i]['low'] < line_price * 0.99:
-                broken = True
-                break
-            elif line_type == 'resistance' and recent_data.iloc[i]['high'] > line_price * 1.01:
-                broken = True
-                break
-
-        if not broken:
-            strength += 0.5
-
-        return strength
+        return float(self._line_strengths(df, np.array([slope]), np.array([intercept]),
+                                          line_type, np.array([touches]))[0])
 
     def _filter_best_lines(self, trend_lines, max_lines=8):
         """Filter and return the best trend lines"""
@@ -267,8 +206,12 @@ class AdvancedTrendLineDetector:
         return filtered_lines
 
 
-def create_advanced_chart(symbol="BTC/USDT", timeframe="1h"):
-    """Create an advanced chart with precise trend lines"""
+def create_advanced_chart(symbol="BTC/USDT", timeframe="1h", cache=None):
+    """Create an advanced chart with precise trend lines
+
+    Pages live in the render cache (render_cache.py), so unchanged candles reuse
+    the page rendered last time.
+    """
 
     print(f"Creating advanced chart for {symbol} ({timeframe})...")
 
@@ -290,6 +233,14 @@ def create_advanced_chart(symbol="BTC/USDT", timeframe="1h"):
 
     print(f"Got {len(df)} candles")
 
+    cache = cache or render_cache.RenderCache()
+    key = render_cache.render_key(df, view='advanced', symbol=symbol, timeframe=timeframe,
+                                  theme='dark', plotly_src=PLOTLY_CDN)
+    cached = cache.get(key, 'page.html')
+    if cached:
+        print("Data unchanged, reusing the rendered chart")
+        return cached
+
     # Detect swing points and order blocks
     print("Detecting swing points and order blocks...")
     df = detector.find_swing_highs_lows(df)
@@ -301,6 +252,16 @@ def create_advanced_chart(symbol="BTC/USDT", timeframe="1h"):
 
     print(f"Found {len(trend_lines)} high-quality trend lines")
 
+    chart_html = build_advanced_chart_html(detector, df, trend_lines, symbol, timeframe)
+
+    if df.attrs.get('sample_data'):
+        # Generated candles are not market data, keep them out of the cache
+        return render_cache.write_uncached(chart_html)
+    return cache.put(key, 'page.html', chart_html)
+
+
+def create_advanced_figure(detector, df, trend_lines, symbol):
+    """The app's chart with the advanced trend lines and their touch points added"""
     # Create the chart with enhanced trend lines
     fig = detector.create_chart(df, symbol)
 
@@ -372,13 +333,25 @@ def create_advanced_chart(symbol="BTC/USDT", timeframe="1h"):
                     row=1, col=1
                 )
 
-    # Create HTML file
-    chart_html = f"""
+    return fig
+
+
+def build_advanced_chart_html(detector, df, trend_lines, symbol, timeframe,
+                              plotly_src=PLOTLY_CDN, fig=None):
+    """Advanced chart page for analyzed candles and AdvancedTrendLineDetector lines
+
+    plotly_src is the Plotly.js script the page loads; batch_charts.py points every
+    page at one shared local copy. fig is the chart, built here if not given.
+    """
+    if fig is None:
+        fig = create_advanced_figure(detector, df, trend_lines, symbol)
+
+    return f"""
 <!DOCTYPE html>
 <html>
 <head>
     <title>{symbol} - Advanced Chart Analysis</title>
-    <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
+    <script src="{plotly_src}"></script>
     <style>
         body {{
             font-family: Arial, sans-serif;
@@ -471,14 +444,6 @@ def create_advanced_chart(symbol="BTC/USDT", timeframe="1h"):
 </html>
 """
 
-    # Save to file
-    temp_file = tempfile.NamedTemporaryFile(
-        mode='w', suffix='.html', delete=False, encoding='utf-8')
-    temp_file.write(chart_html)
-    temp_file.close()
-
-    return temp_file.name
-
 
 def main():
     """Main function"""
@@ -1,19 +1,33 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import ccxt
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-import plotly
-import json
 from datetime import datetime, timedelta
 import os
+import threading
+import time
 from dotenv import load_dotenv
-import csv
+from concurrent.futures import ThreadPoolExecutor
 import logging
 from scipy import stats
 from sklearn.linear_model import LinearRegression
+import activity_store
+import downsample
+import exchange_replay
+import executor
+import hough_lines
+import http_cache
+import live_feed
+import metrics
+import ohlcv_codec
+import precompute
+import trendline_cache
+import usage
+from metrics import timed_stage
+from serialization import JSON_MIMETYPE, dumps, dumps_str, json_response
 
 load_dotenv()
 
@@ -21,13 +35,35 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Binance returns at most 1000 candles per request; longer histories are paged
+EXCHANGE_PAGE_LIMIT = 1000
+MAX_CANDLES = 5000
+# Upper bound on points sent for one chart view (about one per horizontal pixel)
+MAX_CHART_POINTS = 4000
+# Requested chart widths are rounded up to one of these, so nearby viewport sizes share
+# cache entries and every width of a default 500-candle chart gets the precomputed variant
+CHART_POINT_BUCKETS = (500, 1000, 2000, MAX_CHART_POINTS)
+# /api/analyze/batch: pairs per request and concurrent exchange fetches
+MAX_BATCH_ITEMS = 20
+BATCH_FETCH_CONCURRENCY = 8
+
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['Server-Timing', 'ETag'])
+metrics.init_app(app)
+
+
+def signal_status(signal_type, entry_zone_high, entry_zone_low, price):
+    """ACTIVE while price can still retest a signal's Order Block, MISSED once it ran away"""
+    if signal_type == 'LONG':
+        return 'ACTIVE' if price <= entry_zone_high * 1.02 else 'MISSED'
+    return 'ACTIVE' if price >= entry_zone_low * 0.98 else 'MISSED'
 
 
 class OrderBlockDetector:
     def __init__(self):
         self.exchange = None
+        self.trend_cache = trendline_cache.TrendLineCache()
+        self._calls = threading.local()
         self.init_exchange()
 
     def init_exchange(self):
@@ -42,9 +78,10 @@ class OrderBlockDetector:
                     'defaultType': 'spot'  # Use spot market
                 }
             })
+            exchange_replay.configure(self.exchange)
 
             # Test connection
-            self.exchange.load_markets()
+            self._timed_exchange_call('load_markets', self.exchange.load_markets)
             logger.info("Binance exchange initialized successfully")
 
         except Exception as e:
@@ -60,13 +97,59 @@ class OrderBlockDetector:
                         'defaultType': 'spot'
                     }
                 })
+                exchange_replay.configure(self.exchange)
                 logger.info(
                     "Binance exchange initialized with fallback settings")
             except Exception as e2:
                 logger.error(f"Fallback exchange initialization failed: {e2}")
                 self.exchange = None
 
-    def fetch_ohlcv_data(self, symbol, timeframe='1h', limit=500):
+    def exchange_calls(self):
+        """Exchange requests made so far by the calling thread (retries and pages included)"""
+        return getattr(self._calls, 'count', 0)
+
+    def _timed_exchange_call(self, method, func, *args, **kwargs):
+        """Call the exchange and record latency and outcome metrics"""
+        self._calls.count = self.exchange_calls() + 1
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            metrics.exchange_requests.inc(method=method, outcome='error')
+            raise
+        finally:
+            metrics.exchange_request_seconds.observe(
+                time.perf_counter() - start, method=method)
+        metrics.exchange_requests.inc(method=method, outcome='ok')
+        return result
+
+    def _fetch_ohlcv_pages(self, symbol, timeframe, limit, since=None):
+        """Fetch up to limit candles, paging past the exchange's per-request maximum"""
+        if since is None and limit <= EXCHANGE_PAGE_LIMIT:
+            return self._timed_exchange_call(
+                'fetch_ohlcv', self.exchange.fetch_ohlcv, symbol, timeframe, limit=limit)
+
+        timeframe_ms = self.exchange.parse_timeframe(timeframe) * 1000
+        if since is None:
+            since = self.exchange.milliseconds() - limit * timeframe_ms
+
+        ohlcv = []
+        while len(ohlcv) < limit:
+            page_limit = min(EXCHANGE_PAGE_LIMIT, limit - len(ohlcv))
+            page = self._timed_exchange_call(
+                'fetch_ohlcv', self.exchange.fetch_ohlcv, symbol, timeframe,
+                since=since, limit=page_limit)
+            if not page:
+                break
+
+            ohlcv.extend(page)
+            since = page[-1][0] + timeframe_ms
+            if len(page) < page_limit:  # Reached the most recent candle
+                break
+
+        return ohlcv
+
+    def fetch_ohlcv_data(self, symbol, timeframe='1h', limit=500, since=None):
         """Fetch OHLCV data from Binance with improved error handling"""
         max_retries = 3
         retry_count = 0
@@ -80,14 +163,17 @@ class OrderBlockDetector:
                         raise Exception("Exchange initialization failed")
 
                 # Ensure markets are loaded
-                if not hasattr(self.exchange, 'markets') or not self.exchange.markets:
-                    self.exchange.load_markets()
+                markets_loaded = bool(getattr(self.exchange, 'markets', None))
+                metrics.record_cache_lookup('markets', markets_loaded)
+                if not markets_loaded:
+                    self._timed_exchange_call(
+                        'load_markets', self.exchange.load_markets)
 
                 # Fetch OHLCV data
                 logger.info(
                     f"Fetching {symbol} data for {timeframe} timeframe")
-                ohlcv = self.exchange.fetch_ohlcv(
-                    symbol, timeframe, limit=limit)
+                ohlcv = self._fetch_ohlcv_pages(
+                    symbol, timeframe, limit, since)
 
                 if not ohlcv or len(ohlcv) == 0:
                     raise Exception("No data received from exchange")
@@ -108,10 +194,10 @@ class OrderBlockDetector:
                 if retry_count < max_retries:
                     logger.info("Retrying with fresh exchange connection...")
                     self.exchange = None  # Force reinitialize
-                    import time
                     time.sleep(2)  # Wait before retry
                 else:
                     logger.error(f"All retry attempts failed for {symbol}")
+                    metrics.sample_data_fallbacks.inc()
                     return self.generate_sample_data(symbol)
 
         return None
@@ -152,6 +238,7 @@ class OrderBlockDetector:
 
             df = pd.DataFrame(
                 data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+            df.attrs['sample_data'] = True
             logger.info(f"Generated {len(df)} sample candles for {symbol}")
             return df
 
@@ -176,28 +263,97 @@ class OrderBlockDetector:
 
         return df
 
-    def detect_trend_lines(self, df, min_touches=3):
-        """Detect trend lines based on swing highs and lows"""
+    def detect_trend_lines(self, df, min_touches=3, series=None, engine='pairs'):
+        """Detect trend lines based on swing highs and lows
+
+        engine 'pairs' tries every pair of swing points; candidate lines are cached
+        per series (e.g. symbol and timeframe), so a repeat analysis of the same
+        chart only evaluates lines through swing points that were not there last
+        time. engine 'hough' votes for lines in an accumulator over the most recent
+        swing points (hough_lines.py), which costs the same at any history length.
+        """
         trend_lines = []
 
-        # Get swing points
-        swing_highs = df[df['swing_high']].copy()
-        swing_lows = df[df['swing_low']].copy()
+        # Resistance lines connect swing highs, support lines connect swing lows
+        for swing_col, price_col, line_type in (('swing_high', 'high', 'resistance'),
+                                                ('swing_low', 'low', 'support')):
+            swing_points = df[df[swing_col]]
+            if len(swing_points) < min_touches:
+                continue
+            if engine == 'hough':
+                found = hough_lines.find_lines(
+                    swing_points.index.to_numpy(dtype=np.float64),
+                    swing_points[price_col].to_numpy(dtype=np.float64), min_touches)
+                trend_lines.extend(self._trend_line_records(swing_points, line_type, found))
+            else:
+                trend_lines.extend(self._cached_trend_lines(
+                    swing_points, price_col, line_type, min_touches, series))
 
-        # Detect resistance lines (connecting swing highs)
-        if len(swing_highs) >= min_touches:
-            trend_lines.extend(self._find_trend_line_combinations(
-                swing_highs, 'high', 'resistance', min_touches))
+        return trend_lines
 
-        # Detect support lines (connecting swing lows)
-        if len(swing_lows) >= min_touches:
-            trend_lines.extend(self._find_trend_line_combinations(
-                swing_lows, 'low', 'support', min_touches))
+    def _cached_trend_lines(self, swing_points, price_col, line_type, min_touches, series,
+                            tolerance=0.005):
+        """Same lines as _find_trend_line_combinations, from the trend line cache"""
+        timestamps = swing_points['timestamp'].to_numpy(dtype='datetime64[ns]').astype(np.int64)
+        if np.any(np.diff(timestamps) <= 0):
+            # Points are matched by timestamp; fall back for unordered data
+            return self._find_trend_line_combinations(
+                swing_points, price_col, line_type, min_touches)
+
+        found = self.trend_cache.candidates(
+            (series, line_type), timestamps, swing_points.index.to_numpy(dtype=np.float64),
+            swing_points[price_col].to_numpy(dtype=np.float64), tolerance, min_touches)
+        return self._trend_line_records(swing_points, line_type, found)
+
+    def _trend_line_records(self, swing_points, line_type, found):
+        """Filter the lines of a candidates dict and build the trend line records"""
+        slope = (found['y2'] - found['y1']) / (found['x2'] - found['x1'])
+        intercept = found['y1'] - slope * found['x1']
+        strength = found['touches'] * (found['x2'] - found['x1']) / len(swing_points)
+
+        # Filter on the arrays, then build records for the few lines that are kept
+        trend_lines = []
+        point_timestamps = swing_points['timestamp']
+        for n in self._best_trend_line_indices(slope, intercept, found['y1'], strength):
+            first, second = found['first'][n], found['second'][n]
+            start, end = point_timestamps.iloc[first], point_timestamps.iloc[second]
+            trend_lines.append({
+                'type': line_type,
+                'slope': float(slope[n]),
+                'intercept': float(intercept[n]),
+                'start_index': int(found['x1'][n]),
+                'end_index': int(found['x2'][n]),
+                'start_timestamp': start.isoformat() if hasattr(start, 'isoformat') else str(start),
+                'end_timestamp': end.isoformat() if hasattr(end, 'isoformat') else str(end),
+                'start_price': float(found['y1'][n]),
+                'end_price': float(found['y2'][n]),
+                'touches': int(found['touches'][n]),
+                'strength': float(strength[n]),
+                'touch_points': [int(tp) for tp in trendline_cache.touch_positions(found, n)]
+            })
 
         return trend_lines
 
+    def _best_trend_line_indices(self, slope, intercept, start_price, strength, max_lines=5):
+        """_filter_best_trend_lines for lines of one type given as arrays; returns
+        the indices of the lines kept, strongest first
+        """
+        kept = []
+        # Stable like list.sort, so equally strong lines keep their pair order
+        for n in np.argsort(-strength, kind='stable'):
+            if len(kept) >= max_lines:
+                break
+            if not any(abs(slope[n] - slope[k]) < 0.0001 and
+                       abs(intercept[n] - intercept[k]) < start_price[n] * 0.01
+                       for k in kept):
+                kept.append(n)
+        return kept
+
     def _find_trend_line_combinations(self, swing_points, price_col, line_type, min_touches):
-        """Find all possible trend line combinations"""
+        """Find all possible trend line combinations
+
+        Reference implementation of what detect_trend_lines returns from the cache.
+        """
         trend_lines = []
         points = swing_points.reset_index()
 
@@ -453,7 +609,7 @@ class OrderBlockDetector:
                     'reward_percentage': float(round(reward_percentage, 2)),
                     'rr_ratio': '1:2',
                     'timestamp': ob['timestamp'].isoformat() if hasattr(ob['timestamp'], 'isoformat') else str(ob['timestamp']),
-                    'status': 'ACTIVE' if current_price <= entry_zone_high * 1.02 else 'MISSED',
+                    'status': signal_status('LONG', entry_zone_high, entry_zone_low, current_price),
                     'description': f'Long từ Bullish OB tại {float(round(entry_price, 2))}'
                 }
                 signals.append(signal)
@@ -491,14 +647,14 @@ class OrderBlockDetector:
                     'reward_percentage': float(round(reward_percentage, 2)),
                     'rr_ratio': '1:2',
                     'timestamp': ob['timestamp'].isoformat() if hasattr(ob['timestamp'], 'isoformat') else str(ob['timestamp']),
-                    'status': 'ACTIVE' if current_price >= entry_zone_low * 0.98 else 'MISSED',
+                    'status': signal_status('SHORT', entry_zone_high, entry_zone_low, current_price),
                     'description': f'Short từ Bearish OB tại {float(round(entry_price, 2))}'
                 }
                 signals.append(signal)
 
         return signals
 
-    def create_chart(self, df, symbol, theme='dark'):
+    def create_chart(self, df, symbol, theme='dark', trend_lines=None):
         """Create interactive Plotly chart with Order Blocks and Trend Lines"""
         fig = make_subplots(
             rows=2, cols=1,
@@ -529,107 +685,114 @@ class OrderBlockDetector:
             row=1, col=1
         )
 
-        # Detect and add trend lines
-        trend_lines = self.detect_trend_lines(df)
-        for trend_line in trend_lines:
-            # Calculate start and end points for the line
-            start_idx = int(trend_line['start_index'])
-            # Extend line forward
-            end_idx = min(int(trend_line['end_index']) + 50, len(df) - 1)
-
-            start_price = trend_line['slope'] * \
-                start_idx + trend_line['intercept']
-            end_price = trend_line['slope'] * end_idx + trend_line['intercept']
-
-            start_timestamp = df.iloc[start_idx]['timestamp']
-            end_timestamp = df.iloc[end_idx]['timestamp']
+        # Detect trend lines unless the caller already has them
+        if trend_lines is None:
+            trend_lines = self.detect_trend_lines(df)
+
+        # All lines of one type go into a single trace, separated by None gaps,
+        # with per-point touches/strength in customdata for the hover text
+        timestamps = df['timestamp'].values
+        last_idx = len(df) - 1
+        for line_type in ('resistance', 'support'):
+            typed_lines = [tl for tl in trend_lines if tl['type'] == line_type]
+            if not typed_lines:
+                continue
 
-            # Choose color based on trend line type
             # Gold for resistance, Deep Sky Blue for support
-            line_color = '#FFD700' if trend_line['type'] == 'resistance' else '#00BFFF'
+            line_color = '#FFD700' if line_type == 'resistance' else '#00BFFF'
+            line_x, line_y, line_info = [], [], []
+            touch_x, touch_y = [], []
+
+            for trend_line in typed_lines:
+                start_idx = int(trend_line['start_index'])
+                # Extend line forward
+                end_idx = min(int(trend_line['end_index']) + 50, last_idx)
+                info = [trend_line['touches'], trend_line['strength']]
+
+                line_x.extend([timestamps[start_idx], timestamps[end_idx], None])
+                line_y.extend([
+                    trend_line['slope'] * start_idx + trend_line['intercept'],
+                    trend_line['slope'] * end_idx + trend_line['intercept'],
+                    None])
+                line_info.extend([info, info, [None, None]])
+
+                # Show max 5 touch points per line
+                for idx in trend_line['touch_points'][:5]:
+                    if idx < len(df):
+                        touch_x.append(timestamps[idx])
+                        touch_y.append(
+                            trend_line['slope'] * idx + trend_line['intercept'])
 
             fig.add_trace(
                 go.Scatter(
-                    x=[start_timestamp, end_timestamp],
-                    y=[start_price, end_price],
+                    x=line_x,
+                    y=line_y,
+                    customdata=line_info,
                     mode='lines',
+                    connectgaps=False,
                     line=dict(
                         color=line_color,
                         width=2,
                         dash='dash'  # Make dashed so candlesticks are more visible
                     ),
                     opacity=0.8,  # Slightly transparent so candlesticks show through
-                    name=f"{trend_line['type'].title()} Line ({trend_line['touches']} touches)",
+                    name=f"{line_type.title()} Lines ({len(typed_lines)})",
                     showlegend=True,
-                    hovertemplate=f"<b>{trend_line['type'].title()} Line</b><br>" +
-                    f"Touches: {trend_line['touches']}<br>" +
-                    f"Strength: {trend_line['strength']:.2f}<br>" +
-                    f"Price: $%{{y:.2f}}<extra></extra>"
+                    hovertemplate=f"<b>{line_type.title()} Line</b><br>" +
+                    "Touches: %{customdata[0]}<br>" +
+                    "Strength: %{customdata[1]:.2f}<br>" +
+                    "Price: $%{y:.2f}<extra></extra>"
                 ),
                 row=1, col=1
             )
 
             # Add touch points markers
-            # Show max 5 touch points
-            touch_indices = trend_line['touch_points'][:5]
-            if touch_indices:
-                touch_timestamps = [df.iloc[idx]['timestamp']
-                                    for idx in touch_indices if idx < len(df)]
-                touch_prices = [trend_line['slope'] * idx + trend_line['intercept']
-                                for idx in touch_indices if idx < len(df)]
-
-                if touch_timestamps and touch_prices:
-                    fig.add_trace(
-                        go.Scatter(
-                            x=touch_timestamps,
-                            y=touch_prices,
-                            mode='markers',
-                            marker=dict(
-                                color=line_color,
-                                size=8,
-                                symbol='circle',
-                                line=dict(color='white', width=1)
-                            ),
-                            name=f"{trend_line['type'].title()} Touch Points",
-                            showlegend=False,
-                            hovertemplate=f"<b>Touch Point</b><br>Price: $%{{y:.2f}}<extra></extra>"
+            if touch_x:
+                fig.add_trace(
+                    go.Scatter(
+                        x=touch_x,
+                        y=touch_y,
+                        mode='markers',
+                        marker=dict(
+                            color=line_color,
+                            size=8,
+                            symbol='circle',
+                            line=dict(color='white', width=1)
                         ),
-                        row=1, col=1
-                    )
-
-        # Add Order Blocks
-        bullish_obs = df[df['bullish_ob']]
-        bearish_obs = df[df['bearish_ob']]
-
-        # Bullish Order Blocks (green rectangles) - behind candlesticks
-        for idx, ob in bullish_obs.iterrows():
-            fig.add_shape(
-                type="rect",
-                x0=ob['timestamp'],
-                y0=ob['ob_low'],
-                # Extend 20 candles forward
-                x1=df.iloc[min(idx + 20, len(df) - 1)]['timestamp'],
-                y1=ob['ob_high'],
-                line=dict(color="rgba(0, 255, 0, 0.4)", width=1),
-                fillcolor="rgba(0, 255, 0, 0.15)",
-                layer="below",  # Draw behind candlesticks
-                row=1, col=1
-            )
-
-        # Bearish Order Blocks (red rectangles) - behind candlesticks
-        for idx, ob in bearish_obs.iterrows():
-            fig.add_shape(
-                type="rect",
-                x0=ob['timestamp'],
-                y0=ob['ob_low'],
-                # Extend 20 candles forward
-                x1=df.iloc[min(idx + 20, len(df) - 1)]['timestamp'],
-                y1=ob['ob_high'],
-                line=dict(color="rgba(255, 0, 0, 0.4)", width=1),
-                fillcolor="rgba(255, 0, 0, 0.15)",
-                layer="below",  # Draw behind candlesticks
-                row=1, col=1
-            )
+                        name=f"{line_type.title()} Touch Points",
+                        showlegend=False,
+                        hovertemplate=f"<b>Touch Point</b><br>Price: $%{{y:.2f}}<extra></extra>"
+                    ),
+                    row=1, col=1
+                )
+
+        # Add Order Blocks as one layout shapes list instead of one add_shape call each
+        # (green for bullish, red for bearish), drawn behind the candlesticks
+        shapes = []
+        for ob_type, line_color, fill_color in (
+                ('bullish', "rgba(0, 255, 0, 0.4)", "rgba(0, 255, 0, 0.15)"),
+                ('bearish', "rgba(255, 0, 0, 0.4)", "rgba(255, 0, 0, 0.15)")):
+            ob_indices = np.flatnonzero(df[f'{ob_type}_ob'].values)
+            # Extend 20 candles forward
+            end_indices = np.minimum(ob_indices + 20, last_idx)
+            ob_lows = df['ob_low'].values[ob_indices]
+            ob_highs = df['ob_high'].values[ob_indices]
+
+            for idx, end_idx, ob_low, ob_high in zip(ob_indices, end_indices, ob_lows, ob_highs):
+                shapes.append(dict(
+                    type="rect",
+                    xref="x", yref="y",
+                    x0=timestamps[idx],
+                    y0=ob_low,
+                    x1=timestamps[end_idx],
+                    y1=ob_high,
+                    line=dict(color=line_color, width=1),
+                    fillcolor=fill_color,
+                    layer="below"  # Draw behind candlesticks
+                ))
+
+        if shapes:
+            fig.update_layout(shapes=shapes)
 
         # Add BOS markers
         bullish_bos = df[df['bullish_bos']]
@@ -670,23 +833,14 @@ class OrderBlockDetector:
             row=2, col=1
         )
 
-<<<<<<< HEAD
-<<<<<<< HEAD
         # Apply theme
         template = 'plotly_dark' if theme == 'dark' else 'plotly_white'
 
-=======
-        # Enhanced chart layout with free scrolling/zooming
->>>>>>> 2fae4d85f3ae6e749160bb59b550d1ee529e7b16
-=======
->>>>>>> parent of 2fae4d8 (update UI)
         fig.update_layout(
             title=f'{symbol} - Price Chart with Order Blocks & Trend Lines',
             xaxis_rangeslider_visible=False,
             height=800,
             showlegend=True,
-<<<<<<< HEAD
-<<<<<<< HEAD
             template=template,
             # Add crosshair cursor for price measurement
             hovermode='x unified',
@@ -737,81 +891,126 @@ class OrderBlockDetector:
             spikemode="across",
             spikethickness=1,
             row=1, col=1
-=======
-            template='plotly_dark',
-            # Enable free drag mode for panning
-            dragmode='pan',
-            # Better selection options
-            selectdirection='any',
-            # Configure additional interaction settings
-            hovermode='closest',
-            # Add margin for better viewing
-            margin=dict(l=50, r=50, t=80, b=50)
         )
 
-        # Configure X-axis for better interaction
-        fig.update_xaxes(
-            rangeslider_visible=False,
-            # Enable zooming and panning
-            showspikes=True,
-            spikemode='across',
-            spikesnap='cursor',
-            spikedash='solid',
-            spikecolor='#999999',
-            spikethickness=1
-        )
+        return fig
 
-        # Configure Y-axis for better interaction
-        fig.update_yaxes(
-            showspikes=True,
-            spikemode='across',
-            spikesnap='cursor',
-            spikedash='solid',
-            spikecolor='#999999',
-            spikethickness=1
->>>>>>> 2fae4d85f3ae6e749160bb59b550d1ee529e7b16
-=======
-            template='plotly_dark'
->>>>>>> parent of 2fae4d8 (update UI)
-        )
+    def build_chart_data(self, df, trend_lines=None, max_points=None):
+        """Build compact, data-only chart payload for the browser to render
+
+        Candles are sent as parallel arrays (timestamps in epoch milliseconds) and the
+        Order Blocks, BOS markers and trend lines as small records using the same
+        geometry as create_chart. With max_points, candles are aggregated into at most
+        that many OHLC buckets while the markers keep their exact positions.
+        """
+        if trend_lines is None:
+            trend_lines = self.detect_trend_lines(df)
+
+        timestamps = df['timestamp'].values.astype(
+            'datetime64[ms]').astype('int64')
+        last_idx = len(df) - 1
+
+        bucketed = downsample.aggregate_ohlcv(
+            timestamps, df['open'].values, df['high'].values, df['low'].values,
+            df['close'].values, df['volume'].values,
+            max_points or len(df))
+        candles = {column: values.tolist()
+                   for column, values in bucketed.items()}
+
+        # Order Blocks extend 20 candles forward, like the chart rectangles
+        order_blocks = []
+        for ob_type in ('bullish', 'bearish'):
+            for idx in np.flatnonzero(df[f'{ob_type}_ob'].values):
+                order_blocks.append({
+                    'type': ob_type,
+                    'index': int(idx),
+                    'x0': int(timestamps[idx]),
+                    'x1': int(timestamps[min(idx + 20, last_idx)]),
+                    'low': float(df['ob_low'].iat[idx]),
+                    'high': float(df['ob_high'].iat[idx])
+                })
 
-        return fig
+        # BOS markers sit on the candle high (bullish) or low (bearish)
+        bos = []
+        for bos_type, price_col in (('bullish', 'high'), ('bearish', 'low')):
+            for idx in np.flatnonzero(df[f'{bos_type}_bos'].values):
+                bos.append({
+                    'type': bos_type,
+                    'index': int(idx),
+                    'x': int(timestamps[idx]),
+                    'price': float(df[price_col].iat[idx])
+                })
+
+        # Trend lines extend 50 candles past their last anchor point
+        lines = []
+        for trend_line in trend_lines:
+            start_idx = int(trend_line['start_index'])
+            end_idx = min(int(trend_line['end_index']) + 50, last_idx)
+            touch_indices = [idx for idx in trend_line['touch_points'][:5]
+                             if idx < len(df)]
+
+            lines.append({
+                'type': trend_line['type'],
+                'touches': int(trend_line['touches']),
+                'strength': float(trend_line['strength']),
+                'x0': int(timestamps[start_idx]),
+                'x1': int(timestamps[end_idx]),
+                'y0': float(trend_line['slope'] * start_idx + trend_line['intercept']),
+                'y1': float(trend_line['slope'] * end_idx + trend_line['intercept']),
+                'touch_x': [int(timestamps[idx]) for idx in touch_indices],
+                'touch_y': [float(trend_line['slope'] * idx + trend_line['intercept'])
+                            for idx in touch_indices]
+            })
+
+        return {
+            'encoding': ohlcv_codec.ENCODING_LISTS,
+            'source_candles': int(len(df)),
+            'candles': candles,
+            'order_blocks': order_blocks,
+            'bos': bos,
+            'trend_lines': lines
+        }
 
 
 detector = OrderBlockDetector()
 
 
 class UserLogger:
-    def __init__(self, log_file='user_activity_log.csv'):
-        self.log_file = log_file
-        self.init_log_file()
+    """Records user activity in the configured activity store (SQLite by default)"""
 
-    def init_log_file(self):
-        """Initialize CSV log file with headers if it doesn't exist"""
-        try:
-            if not os.path.exists(self.log_file):
-                with open(self.log_file, 'w', newline='', encoding='utf-8') as file:
-                    writer = csv.writer(file)
-                    writer.writerow([
-                        'timestamp', 'username', 'action', 'symbol',
-                        'timeframe', 'details', 'ip_address', 'session_id'
-                    ])
-                logger.info(f"Created new log file: {self.log_file}")
-        except Exception as e:
-            logger.error(f"Error initializing log file: {e}")
+    def __init__(self, log_file='user_activity_log.csv', store=None):
+        # log_file is the CSV log: the store itself with ACTIVITY_STORE=csv, otherwise
+        # imported into the database once
+        self.log_file = log_file
+        self.store = store or activity_store.open_store(csv_path=log_file)
+        # Per-user stats and hourly usage rollups, updated from each written batch
+        # rather than rescanned
+        self.stats = activity_store.UserStatsIndex(self.store)
+        self.usage = usage.UsageRollups(self.store)
+        # Records are written in batches by a background thread, which also keeps the
+        # stats and rollups up to date with what other processes write
+        self.writer = activity_store.ActivityWriter(self.store, on_flush=self._on_flush)
+        self._on_flush()
+
+    def _on_flush(self):
+        self.stats.refresh()
+        self.usage.refresh()
 
     def log_activity(self, username, action, symbol=None, timeframe=None,
                      details=None, ip_address=None, session_id=None):
-        """Log user activity to CSV file"""
+        """Queue one activity record for the store (does not touch disk)"""
         try:
-            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-            with open(self.log_file, 'a', newline='', encoding='utf-8') as file:
-                writer = csv.writer(file)
-                writer.writerow([
-                    timestamp, username, action, symbol or '',
-                    timeframe or '', details or '', ip_address or '', session_id or ''
-                ])
+            if not self.writer.append({
+                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'username': username,
+                'action': action,
+                'symbol': symbol,
+                'timeframe': timeframe,
+                'details': details,
+                'ip_address': ip_address,
+                'session_id': session_id
+            }):
+                return False
 
             logger.info(f"Logged activity: {username} - {action}")
             return True
@@ -820,56 +1019,50 @@ class UserLogger:
             return False
 
     def get_user_stats(self, username):
-        """Get usage statistics for a specific user"""
+        """Get usage statistics for a specific user (from memory, without a disk write)"""
         try:
-            stats = {
-                'total_sessions': 0,
-                'total_analyses': 0,
-                'favorite_symbols': {},
-                'favorite_timeframes': {},
-                'last_activity': None,
-                'first_activity': None
-            }
-
-            if not os.path.exists(self.log_file):
-                return stats
-
-            with open(self.log_file, 'r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    if row['username'].lower() == username.lower():
-                        # Count activities
-                        if row['action'] == 'LOGIN':
-                            stats['total_sessions'] += 1
-                        elif row['action'] == 'ANALYZE':
-                            stats['total_analyses'] += 1
-
-                            # Track favorite symbols
-                            symbol = row['symbol']
-                            if symbol:
-                                stats['favorite_symbols'][symbol] = stats['favorite_symbols'].get(
-                                    symbol, 0) + 1
-
-                            # Track favorite timeframes
-                            timeframe = row['timeframe']
-                            if timeframe:
-                                stats['favorite_timeframes'][timeframe] = stats['favorite_timeframes'].get(
-                                    timeframe, 0) + 1
-
-                        # Track activity dates
-                        activity_date = row['timestamp']
-                        if not stats['first_activity']:
-                            stats['first_activity'] = activity_date
-                        stats['last_activity'] = activity_date
-
-            return stats
+            self.writer.start()  # Keeps the index refreshed in this process
+            # Include records still waiting in this process's queue
+            return self.stats.get(username, self.writer.pending())
         except Exception as e:
             logger.error(f"Error getting user stats: {e}")
             return {}
 
+    def recent_activity(self, username, limit=20):
+        """A user's latest activity records, most recent first"""
+        key = username.lower()
+        queued = [{field: record.get(field) or '' for field in activity_store.FIELDS}
+                  for record in reversed(self.writer.pending(writing=False))
+                  if record['username'].lower() == key][:limit]
+        return queued + self.store.recent(username, limit - len(queued))
+
+    def export_csv(self, username, start=None, end=None):
+        """A user's history in [start, end) as a stream of CSV text chunks"""
+        # An export is a durable copy, so it includes everything logged so far
+        self.writer.flush()
+        return self.store.export_csv(username, start, end)
+
+    def usage_report(self, start, end, bucket='hour', top=5):
+        """Site-wide usage in [start, end) from the hourly rollups (at most flush_seconds old)"""
+        self.writer.start()
+        return self.usage.query(start, end, bucket, top)
+
 
 user_logger = UserLogger()
 
+# Response formats accepted by /api/analyze
+RESPONSE_FORMATS = ('data', 'plotly')
+# Trend line engines (see OrderBlockDetector.detect_trend_lines)
+TREND_ENGINES = ('pairs', 'hough')
+
+# Finished /api/analyze and /api/symbols bodies, kept precompressed until they go stale
+response_cache = http_cache.ResponseCache(max_entries=128)
+SYMBOLS_TTL = 3600  # seconds; fallback symbols are retried sooner
+FALLBACK_SYMBOLS_TTL = 60
+
+# One shared poller per symbol/timeframe behind /api/stream
+live_feeds = live_feed.LiveFeedHub(detector)
+
 
 @app.route('/')
 def index():
@@ -917,119 +1110,637 @@ def get_user_stats(username):
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/analyze', methods=['POST'])
-def analyze():
-    try:
-        data = request.get_json()
-        symbol = data.get('symbol', 'BTC/USDT')
-        timeframe = data.get('timeframe', '1h')
-        username = data.get('username', 'Anonymous')
-        theme = data.get('theme', 'dark')  # Add theme parameter
+def fetch_candles(symbol, timeframe='1h', limit=500):
+    """Fetch the candles to analyze; None if no data could be fetched or generated"""
+    with timed_stage('fetch'):
+        df = detector.fetch_ohlcv_data(symbol, timeframe, limit=limit)
+    forming_candles.record(symbol, timeframe, df)
+    return df
 
-        # Log analysis activity
-        user_logger.log_activity(
-            username=username,
-            action='ANALYZE',
-            symbol=symbol,
-            timeframe=timeframe,
-            details=f'Analyzed {symbol} on {timeframe} timeframe with {theme} theme',
-            ip_address=request.remote_addr
-        )
 
-        # Fetch data
-        df = detector.fetch_ohlcv_data(symbol, timeframe)
-        if df is None:
-            return jsonify({'error': 'Failed to fetch data and generate sample data'}), 500
+# Current price of each analyzed pair for responses served from the analysis cache
+forming_candles = precompute.FormingCandles(
+    lambda symbol, timeframe, limit: detector.fetch_ohlcv_data(symbol, timeframe, limit=limit))
 
-        # Check if we used sample data (sample data will have predictable patterns)
-        using_sample_data = len(
-            df) == 500 and df['timestamp'].iloc[-1] > datetime.now() - timedelta(hours=1)
 
-        # Process data
+def bar_seconds(df):
+    """Candle spacing of a frame, which tells timeframes of one symbol apart"""
+    if len(df) < 2:
+        return 0
+    return int((df['timestamp'].iloc[1] - df['timestamp'].iloc[0]).total_seconds())
+
+
+def analyze_candles(df, symbol, theme='dark', response_format='data', max_points=None,
+                    trend_engine='pairs'):
+    """Run detection on fetched candles and build the /api/analyze payload
+
+    Pure CPU work with picklable inputs and output, so it can also run in a worker
+    process (see executor.py). response_format None skips chart building.
+    """
+    using_sample_data = bool(df.attrs.get('sample_data'))
+
+    # Process data
+    with timed_stage('swing_points'):
         df = detector.find_swing_highs_lows(df)
+    with timed_stage('break_of_structure'):
         df = detector.detect_break_of_structure(df)
+    with timed_stage('order_blocks'):
         df = detector.detect_order_blocks(df)
 
-        # Detect trend lines
-        trend_lines = detector.detect_trend_lines(df)
+    # Detect trend lines
+    with timed_stage('trend_lines'):
+        trend_lines = detector.detect_trend_lines(
+            df, series=(symbol, bar_seconds(df)), engine=trend_engine)
 
-        # Generate trading signals
+    # Generate trading signals
+    with timed_stage('signals'):
         trading_signals = detector.generate_trading_signals(df)
 
-        # Create chart with theme
-        fig = detector.create_chart(df, symbol, theme)
+    # Get statistics
+    bullish_obs = len(df[df['bullish_ob']])
+    bearish_obs = len(df[df['bearish_ob']])
+    bullish_bos = len(df[df['bullish_bos']])
+    bearish_bos = len(df[df['bearish_bos']])
+
+    # Current price info
+    current_price = df['close'].iloc[-1]
+    price_change = (
+        (current_price - df['open'].iloc[0]) / df['open'].iloc[0]) * 100
+
+    # NumPy/pandas values are left as-is: the response serializer converts them in one pass
+    payload = {
+        'format': response_format,
+        'stats': {
+            'bullish_obs': int(bullish_obs),
+            'bearish_obs': int(bearish_obs),
+            'bullish_bos': int(bullish_bos),
+            'bearish_bos': int(bearish_bos),
+            'total_candles': int(len(df)),
+            'current_price': float(round(current_price, 2)),
+            'price_change': float(round(price_change, 2)),
+            'trend_lines': int(len(trend_lines)),
+            'support_lines': int(len([tl for tl in trend_lines if tl['type'] == 'support'])),
+            'resistance_lines': int(len([tl for tl in trend_lines if tl['type'] == 'resistance']))
+        },
+        'trading_signals': trading_signals,
+        'trend_lines': trend_lines,
+        'trend_engine': trend_engine,
+        'using_sample_data': using_sample_data
+    }
+
+    if response_format == 'plotly':
+        # Legacy mode: full Plotly figure as a JSON string inside the response
+        with timed_stage('chart'):
+            fig = detector.create_chart(df, symbol, theme, trend_lines)
+        with timed_stage('serialize'):
+            payload['chart'] = dumps_str(fig.to_plotly_json())
+    elif response_format == 'data':
+        with timed_stage('chart'):
+            payload['chart_data'] = detector.build_chart_data(
+                df, trend_lines, max_points)
+
+    return payload
+
+
+# Warm process pool for analyze_candles; started on first use
+detection_executor = executor.DetectionExecutor(analyze_candles)
+
+
+def overloaded_response(error):
+    """503 with Retry-After when the detection queue is full"""
+    response = jsonify({'error': str(error)})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+
+def candle_period(timeframe, now=None):
+    """Open time (epoch ms) of the candle that is forming now"""
+    timeframe_ms = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+    now_ms = int((time.time() if now is None else now) * 1000)
+    return now_ms - now_ms % timeframe_ms
+
+
+def analysis_cache_key(symbol, timeframe, period, response_format, limit,
+                       max_points, theme, trend_engine='pairs'):
+    """Cache key of an /api/analyze analysis
+
+    period is the open time of the forming candle: the closed candles before it
+    only change when it closes, so the analysis is computed once per candle period.
+    Responses patch in the forming candle (see CachedAnalysis).
+    """
+    return ('analyze', symbol, timeframe, period, response_format, limit,
+            max_points, theme if response_format == 'plotly' else '', trend_engine)
+
+
+class CachedAnalysis:
+    """An analysis payload, valid until the candle that was forming closes
+
+    forming is the forming candle the analysis ran with (precompute.forming_candle);
+    patched() carries a newer one into the fields that follow the live price.
+    """
+
+    def __init__(self, payload, forming, first_open, expires_at):
+        self.payload = payload
+        self.forming = forming
+        self.first_open = first_open
+        self.expires_at = expires_at
+
+    def expired(self, now=None):
+        return (time.time() if now is None else now) >= self.expires_at
+
+    def patched(self, forming):
+        """The payload with current price, price change and signal status for forming"""
+        if forming == self.forming:
+            return self.payload
+        price = forming[4]
+        stats = dict(self.payload['stats'],
+                     current_price=float(round(price, 2)),
+                     price_change=float(round((price - self.first_open) / self.first_open * 100, 2)))
+        signals = [dict(signal, status=signal_status(signal['type'], signal['entry_zone_high'],
+                                                     signal['entry_zone_low'], price))
+                   for signal in self.payload['trading_signals']]
+        return dict(self.payload, stats=stats, trading_signals=signals)
+
+
+def encode_analysis(payload, encoding):
+    """Response body and mimetype of an analysis payload in the negotiated encoding"""
+    with timed_stage('encode'):
+        if encoding == ohlcv_codec.ARROW_MEDIA_TYPE:
+            return ohlcv_codec.encode_arrow_stream(payload), ohlcv_codec.ARROW_MEDIA_TYPE
+        if encoding == ohlcv_codec.TYPED_ARRAY_MEDIA_TYPE:
+            payload = ohlcv_codec.apply_typed_arrays(payload)
+        return dumps(payload), JSON_MIMETYPE
+
+
+def analysis_etag(cache_key, encoding, forming):
+    return http_cache.make_etag(*cache_key, encoding, *forming)
+
+
+def cache_analysis(cache_key, entry, encoding, forming):
+    """Encode an analysis for a forming candle, compress it once and store it in the
+    response cache (one entry per encoding, replaced when the forming candle moves)"""
+    body, mimetype = encode_analysis(entry.patched(forming), encoding)
+
+    # Every later request while the price is unchanged reuses the compressed bytes
+    with timed_stage('compress'):
+        cached = http_cache.CachedResponse(
+            body, mimetype, analysis_etag(cache_key, encoding, forming),
+            expires_at=entry.expires_at, version=forming)
+    response_cache.put(cache_key + (encoding,), cached)
+    return cached
 
-        # Convert to JSON
-        chart_json = json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
 
-        # Get statistics
-        bullish_obs = len(df[df['bullish_ob']])
-        bearish_obs = len(df[df['bearish_ob']])
-        bullish_bos = len(df[df['bullish_bos']])
-        bearish_bos = len(df[df['bearish_bos']])
+def analysis_response(cache_key, entry, encoding, forming):
+    """CachedResponse of an analysis for the latest forming candle, built if needed"""
+    cached = response_cache.get(cache_key + (encoding,))
+    if cached is None or cached.version != forming:
+        cached = cache_analysis(cache_key, entry, encoding, forming)
+    return cached
 
-        # Current price info
-        current_price = df['close'].iloc[-1]
-        price_change = (
-            (current_price - df['open'].iloc[0]) / df['open'].iloc[0]) * 100
-
-        # Convert numpy/pandas types to Python native types for JSON serialization
-        def convert_to_python_types(obj):
-            """Convert numpy/pandas types to Python native types"""
-            if hasattr(obj, 'item'):  # numpy scalar
-                return obj.item()
-            elif hasattr(obj, 'tolist'):  # numpy array
-                return obj.tolist()
-            elif isinstance(obj, dict):
-                return {k: convert_to_python_types(v) for k, v in obj.items()}
-            elif isinstance(obj, list):
-                return [convert_to_python_types(item) for item in obj]
-            else:
-                return obj
 
-        # Convert trend lines to JSON-serializable format
-        serializable_trend_lines = convert_to_python_types(trend_lines)
+# Variants the page requests by default (500 candles, compact chart data), kept warm
+# for popular pairs by the precompute worker
+PRECOMPUTED_ENCODINGS = (ohlcv_codec.JSON_MEDIA_TYPE, ohlcv_codec.TYPED_ARRAY_MEDIA_TYPE)
 
-        return jsonify({
-            'chart': chart_json,
-            'stats': {
-                'bullish_obs': int(bullish_obs),
-                'bearish_obs': int(bearish_obs),
-                'bullish_bos': int(bullish_bos),
-                'bearish_bos': int(bearish_bos),
-                'total_candles': int(len(df)),
-                'current_price': float(round(current_price, 2)),
-                'price_change': float(round(price_change, 2)),
-                'trend_lines': int(len(trend_lines)),
-                'support_lines': int(len([tl for tl in trend_lines if tl['type'] == 'support'])),
-                'resistance_lines': int(len([tl for tl in trend_lines if tl['type'] == 'resistance']))
-            },
-            'trading_signals': trading_signals,
-            'trend_lines': serializable_trend_lines,
-            'using_sample_data': using_sample_data
+
+def candles_expiry(df, timeframe):
+    """When the last candle of a frame closes, after which a fetch returns new candles"""
+    timeframe_ms = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+    return (df['timestamp'].iloc[-1].value // 1_000_000 + timeframe_ms) / 1000
+
+
+def store_analysis(cache_key, payload, df, timeframe):
+    """Cache the analysis of a fetched frame; returns its CachedAnalysis"""
+    entry = CachedAnalysis(payload, precompute.forming_candle(df), float(df['open'].iloc[0]),
+                           candles_expiry(df, timeframe))
+    response_cache.put(cache_key, entry)
+    return entry
+
+
+def precompute_analysis(symbol, timeframe):
+    """Run the analysis for a pair and cache its default /api/analyze responses
+
+    Does nothing (and fetches nothing) if this candle period is already cached.
+    """
+    key = analysis_cache_key(symbol, timeframe, candle_period(timeframe), 'data', 500,
+                             None, '')
+    if response_cache.get(key) is not None:
+        return  # Already answered on request for these candles
+
+    df = fetch_candles(symbol, timeframe)
+    if df is None:
+        raise RuntimeError(f'No data for {symbol} {timeframe}')
+    if df.attrs.get('sample_data'):
+        raise RuntimeError(f'Exchange unavailable for {symbol} {timeframe}')
+
+    key = analysis_cache_key(symbol, timeframe, precompute.forming_candle(df)[0], 'data', 500,
+                             None, '')
+    payload = detection_executor.run(df, symbol, 'dark', 'data', None, 'pairs')
+    entry = store_analysis(key, payload, df, timeframe)
+    for encoding in PRECOMPUTED_ENCODINGS:
+        cache_analysis(key, entry, encoding, entry.forming)
+
+
+# Keeps the most analyzed pairs precomputed; starts with the first request
+precompute_scheduler = precompute.PrecomputeScheduler(
+    precompute_analysis, lambda top_n: user_logger.store.top_pairs('ANALYZE', top_n),
+    count_requests=detector.exchange_calls)
+precompute.init_app(app, precompute_scheduler)
+
+
+def bounded_int(value, name, low, high):
+    """A request field as an integer in [low, high]; ValueError otherwise"""
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be an integer') from None
+    if not low <= number <= high:
+        raise ValueError(f'{name} must be between {low} and {high}')
+    return number
+
+
+def parse_analyze_request():
+    """Read the /api/analyze fields of the current request and locate its cache entry
+
+    GET takes the fields as query parameters, so browsers can revalidate with ETags;
+    POST takes them as a JSON body. Raises ValueError for invalid fields.
+    """
+    data = request.get_json() if request.method == 'POST' else request.args
+    params = {
+        'symbol': data.get('symbol', 'BTC/USDT'),
+        'timeframe': data.get('timeframe', '1h'),
+        'username': data.get('username', 'Anonymous'),
+        'theme': data.get('theme', 'dark'),
+        # 'data' (compact chart data) or 'plotly' (legacy full figure JSON)
+        'format': data.get('format', 'data'),
+        'limit': bounded_int(data.get('limit', 500), 'limit', 1, MAX_CANDLES),
+        'trend_engine': data.get('trend_engine', 'pairs'),
+        'ip_address': request.remote_addr
+    }
+    if params['format'] not in RESPONSE_FORMATS:
+        raise ValueError(f"Unsupported format: {params['format']}")
+    if params['trend_engine'] not in TREND_ENGINES:
+        raise ValueError(f"Unsupported trend_engine: {params['trend_engine']}")
+
+    # Chart width in pixels; candles beyond it are aggregated into buckets
+    max_points = data.get('max_points')
+    if max_points is not None and max_points != '':
+        max_points = bounded_int(max_points, 'max_points', 2, MAX_CHART_POINTS)
+        max_points = next(bucket for bucket in CHART_POINT_BUCKETS if bucket >= max_points)
+    else:
+        max_points = None
+    if max_points and max_points >= params['limit']:
+        max_points = None  # Nothing to aggregate
+    params['max_points'] = max_points
+
+    # Candle arrays can be sent as JSON lists, base64 Float64 blobs or an Arrow stream
+    params['encoding'] = ohlcv_codec.JSON_MEDIA_TYPE
+    if params['format'] == 'data':
+        params['encoding'] = ohlcv_codec.negotiate_encoding(request.accept_mimetypes)
+
+    if ccxt.Exchange.parse_timeframe(params['timeframe']) <= 0:  # ValueError for unknown units
+        raise ValueError(f"Unsupported timeframe: {params['timeframe']}")
+    params['cache_key'] = request_cache_key(params, candle_period(params['timeframe']))
+    return params
+
+
+def request_cache_key(params, period):
+    return analysis_cache_key(
+        params['symbol'], params['timeframe'], period, params['format'], params['limit'],
+        params['max_points'], params['theme'], params['trend_engine'])
+
+
+def locate_analysis(params, df):
+    """Key a request by the candles fetched for it
+
+    Normally the same key as before the fetch; it differs if the exchange's newest
+    candle is not the one the clock expects. Sample-data fallbacks are random, so
+    they get no cache entry and no ETag.
+    """
+    forming_candles.record(params['symbol'], params['timeframe'], df)
+    if df.attrs.get('sample_data'):
+        params['cache_key'] = None
+        return
+    params['forming'] = precompute.forming_candle(df)
+    params['cache_key'] = request_cache_key(params, params['forming'][0])
+
+
+def log_analyze_request(params):
+    """Record an ANALYZE entry in the user activity log"""
+    user_logger.log_activity(
+        username=params['username'],
+        action='ANALYZE',
+        symbol=params['symbol'],
+        timeframe=params['timeframe'],
+        details=f"Analyzed {params['symbol']} on {params['timeframe']} timeframe with {params['theme']} theme",
+        ip_address=params['ip_address']
+    )
+
+
+def cached_analysis_response(params):
+    """The response (or 304) for the current request from the analysis cache, with
+    the latest known forming candle patched in; None on a miss
+
+    Needs no exchange request: the forming candle is refreshed in the background.
+    """
+    entry = response_cache.get(params['cache_key'])
+    metrics.record_cache_lookup('analysis', entry is not None)
+    if entry is None:
+        return None
+    forming = forming_candles.get(params['symbol'], params['timeframe'])
+    if forming is None or forming[0] != entry.forming[0]:
+        forming = entry.forming  # Nothing newer known for this candle period
+    return analysis_response(params['cache_key'], entry, params['encoding'],
+                             forming).to_response(request)
+
+
+def revalidated_analysis_response(params):
+    """304 if the client already has the response for the fetched candles, else None"""
+    if params['cache_key'] is None:
+        return None
+    etag = analysis_etag(params['cache_key'], params['encoding'], params['forming'])
+    if http_cache.is_not_modified(request, etag):
+        return http_cache.not_modified_response(etag)
+    return None
+
+
+def store_analysis_response(params, payload, df):
+    """Cache a freshly computed payload and build the response for the current request"""
+    if params['cache_key'] is None:
+        body, mimetype = encode_analysis(payload, params['encoding'])
+        response = Response(body, mimetype=mimetype)
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    entry = store_analysis(params['cache_key'], payload, df, params['timeframe'])
+    return cache_analysis(params['cache_key'], entry, params['encoding'],
+                          entry.forming).to_response(request)
+
+
+@app.route('/api/analyze', methods=['GET', 'POST'])
+def analyze():
+    try:
+        try:
+            params = parse_analyze_request()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Log analysis activity
+        log_analyze_request(params)
+
+        # Analyzed already in this candle period (on request or by the precompute worker)
+        response = cached_analysis_response(params)
+        if response is None:
+            df = fetch_candles(params['symbol'], params['timeframe'], params['limit'])
+            if df is None:
+                return jsonify({'error': 'Failed to fetch data and generate sample data'}), 500
+            locate_analysis(params, df)
+            response = revalidated_analysis_response(params)
+        if response is None:
+            # Detection runs in the worker process pool (or inline with DETECTION_PROCESSES=0)
+            payload = detection_executor.run(df, params['symbol'], params['theme'],
+                                             params['format'], params['max_points'],
+                                             params['trend_engine'])
+            response = store_analysis_response(params, payload, df)
+
+        response.vary.add('Accept')
+        return response
+
+    except executor.Overloaded as e:
+        return overloaded_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def fetch_and_submit(symbol, timeframe, limit, response_format, trend_engine='pairs'):
+    """Fetch one batch item's candles and queue its detection; returns the detection future"""
+    df = fetch_candles(symbol, timeframe, limit)
+    if df is None:
+        raise RuntimeError('Failed to fetch data and generate sample data')
+    return detection_executor.submit(df, symbol, 'dark', response_format, None, trend_engine)
+
+
+@app.route('/api/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """Analyze a watchlist of (symbol, timeframe) pairs in one request
+
+    Body: {"items": [{"symbol": ..., "timeframe": ...}], "username", "limit",
+    "include_chart", "trend_engine"}. Candles are fetched concurrently and detection runs in
+    parallel; each result carries stats and trading_signals (plus chart_data with
+    include_chart) or its own error, so one failing pair does not fail the batch.
+    """
+    try:
+        data = request.get_json() or {}
+        items = data.get('items')
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'items must be a non-empty list of {symbol, timeframe}'}), 400
+        if len(items) > MAX_BATCH_ITEMS:
+            return jsonify({'error': f'At most {MAX_BATCH_ITEMS} items per batch'}), 400
+
+        pairs = []
+        for item in items:
+            if not isinstance(item, dict) or not item.get('symbol'):
+                return jsonify({'error': 'Each item needs a symbol'}), 400
+            pairs.append((item['symbol'], item.get('timeframe', '1h')))
+
+        try:
+            limit = bounded_int(data.get('limit', 500), 'limit', 1, MAX_CANDLES)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        response_format = 'data' if data.get('include_chart') else None
+        trend_engine = data.get('trend_engine', 'pairs')
+        if trend_engine not in TREND_ENGINES:
+            return jsonify({'error': f'Unsupported trend_engine: {trend_engine}'}), 400
+        username = data.get('username', 'Anonymous')
+
+        # One ANALYZE entry per pair, so watchlists count towards favorites, usage and
+        # precompute ranking like single analyses
+        for symbol, timeframe in pairs:
+            log_analyze_request({'username': username, 'symbol': symbol, 'timeframe': timeframe,
+                                 'theme': 'dark', 'ip_address': request.remote_addr})
+
+        with ThreadPoolExecutor(max_workers=min(len(pairs), BATCH_FETCH_CONCURRENCY)) as pool:
+            submitted = [pool.submit(fetch_and_submit, symbol, timeframe, limit, response_format,
+                                     trend_engine)
+                         for symbol, timeframe in pairs]
+
+            results = []
+            for (symbol, timeframe), fetch in zip(pairs, submitted):
+                result = {'symbol': symbol, 'timeframe': timeframe}
+                try:
+                    detection = fetch.result()
+                    payload = detection.result()
+                    metrics.record_stage_timings(getattr(detection, 'stage_timings', []))
+                    result.update({
+                        'stats': payload['stats'],
+                        'trading_signals': payload['trading_signals'],
+                        'using_sample_data': payload['using_sample_data']
+                    })
+                    if 'chart_data' in payload:
+                        result['chart_data'] = payload['chart_data']
+                except executor.Overloaded as e:
+                    result.update({'error': str(e), 'retry_after': e.retry_after})
+                except Exception as e:
+                    logger.error(f"Batch item {symbol} {timeframe} failed: {e}")
+                    result['error'] = str(e)
+                results.append(result)
+
+        failed = sum(1 for result in results if 'error' in result)
+        return json_response({
+            'results': results,
+            'succeeded': len(results) - failed,
+            'failed': failed
         })
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/candles')
+def get_candles():
+    """Serve candles for a time window, downsampled to the chart width
+
+    Query parameters: symbol, timeframe, from/to (epoch milliseconds), width (points)
+    and style ('ohlc' for bucketed candles, 'line' for an LTTB-downsampled close line).
+    """
+    try:
+        symbol = request.args.get('symbol', 'BTC/USDT')
+        timeframe = request.args.get('timeframe', '1h')
+        start = request.args.get('from', type=int)
+        end = request.args.get('to', type=int)
+        width = max(min(request.args.get('width', 1000, type=int), MAX_CHART_POINTS), 3)
+        style = request.args.get('style', 'ohlc')
+
+        if start is None or end is None or end <= start:
+            return jsonify({'error': 'Valid from and to timestamps are required'}), 400
+        if style not in ('ohlc', 'line'):
+            return jsonify({'error': f'Unsupported style: {style}'}), 400
+
+        timeframe_ms = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+        limit = int(min(MAX_CANDLES, (end - start) // timeframe_ms + 1))
+
+        with timed_stage('fetch'):
+            df = detector.fetch_ohlcv_data(
+                symbol, timeframe, limit=limit, since=start)
+        if df is None:
+            return jsonify({'error': 'Failed to fetch data and generate sample data'}), 500
+
+        timestamps = df['timestamp'].values.astype(
+            'datetime64[ms]').astype('int64')
+        in_window = (timestamps >= start) & (timestamps <= end)
+        window = df[in_window]
+        timestamps = timestamps[in_window]
+
+        with timed_stage('downsample'):
+            if style == 'line':
+                indices = downsample.lttb(
+                    timestamps, window['close'].values, width)
+                candles = {
+                    'timestamp': timestamps[indices].tolist(),
+                    'close': window['close'].values[indices].astype(float).tolist()
+                }
+            else:
+                bucketed = downsample.aggregate_ohlcv(
+                    timestamps, window['open'].values, window['high'].values,
+                    window['low'].values, window['close'].values,
+                    window['volume'].values, width)
+                candles = {column: values.tolist()
+                           for column, values in bucketed.items()}
+
+        payload = {
+            'symbol': symbol,
+            'timeframe': timeframe,
+            'style': style,
+            'source_candles': int(len(window)),
+            'encoding': ohlcv_codec.ENCODING_LISTS,
+            'candles': candles
+        }
+
+        encoding = ohlcv_codec.negotiate_encoding(request.accept_mimetypes)
+        if encoding == ohlcv_codec.TYPED_ARRAY_MEDIA_TYPE:
+            payload['candles'] = ohlcv_codec.encode_candles_f64(candles)
+            payload['encoding'] = ohlcv_codec.ENCODING_F64_BASE64
+
+        response = json_response(payload)
+        response.vary.add('Accept')
+        return response
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+STREAM_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no'  # Keep reverse proxies from buffering events
+}
+
+
+def parse_stream_request():
+    """Symbol and timeframe of a live stream request; raises ValueError when invalid"""
+    symbol = request.args.get('symbol', 'BTC/USDT')
+    timeframe = request.args.get('timeframe', '1h')
+    try:
+        ccxt.Exchange.parse_timeframe(timeframe)
+    except Exception:
+        raise ValueError(f'Unsupported timeframe: {timeframe}')
+    return symbol, timeframe
+
+
+@app.route('/api/stream')
+def stream_updates():
+    """Stream live chart updates for a symbol/timeframe as Server-Sent Events
+
+    Events: candle (forming or newly closed candle), order_block, bos, signal
+    (current trading signals), status (live or sample data) and resync (reload
+    the full analysis).
+    """
+    try:
+        symbol, timeframe = parse_stream_request()
+        subscription = live_feeds.subscribe(symbol, timeframe)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except live_feed.StreamLimitReached as e:
+        return overloaded_response(e)
+
+    # Not wrapped in stream_with_context: werkzeug closes the subscription when
+    # the client goes away, even before the first message was sent
+    response = Response(subscription, mimetype='text/event-stream')
+    response.headers.update(STREAM_HEADERS)
+    return response
+
+
+def symbols_response(symbols, ttl):
+    """Cache a symbols list for ttl seconds and serve it with a content-derived ETag"""
+    body = dumps({'symbols': symbols})
+    cached = http_cache.CachedResponse(
+        body, JSON_MIMETYPE, http_cache.make_etag(*symbols), expires_at=time.time() + ttl)
+    response_cache.put(('symbols',), cached)
+    return cached.to_response(request)
+
+
 @app.route('/api/symbols')
 def get_symbols():
     """Get available trading symbols"""
     try:
+        cached = response_cache.get(('symbols',))
+        metrics.record_cache_lookup('symbols', cached is not None)
+        if cached is not None:
+            return cached.to_response(request)
+
         # Try to get symbols from exchange
         if detector.exchange is None:
             detector.init_exchange()
 
         if detector.exchange is not None:
             try:
-                markets = detector.exchange.load_markets()
+                markets = detector._timed_exchange_call(
+                    'load_markets', detector.exchange.load_markets)
                 symbols = [symbol for symbol in markets.keys()
                            if '/USDT' in symbol]
                 # Limit to top 50 for performance
                 symbols = sorted(symbols[:50])
                 logger.info(f"Loaded {len(symbols)} symbols from exchange")
-                return jsonify({'symbols': symbols})
+                return symbols_response(symbols, SYMBOLS_TTL)
             except Exception as e:
                 logger.error(f"Failed to load symbols from exchange: {e}")
 
@@ -1041,7 +1752,7 @@ def get_symbols():
             'ATOM/USDT', 'FTM/USDT', 'NEAR/USDT', 'ALGO/USDT', 'VET/USDT'
         ]
         logger.info(f"Using fallback symbols: {len(fallback_symbols)} symbols")
-        return jsonify({'symbols': fallback_symbols})
+        return symbols_response(fallback_symbols, FALLBACK_SYMBOLS_TTL)
 
     except Exception as e:
         logger.error(f"Symbols endpoint error: {e}")
@@ -1052,19 +1763,10 @@ def get_symbols():
 def get_user_logs(username):
     """Get recent logs for a specific user"""
     try:
-        logs = []
         limit = request.args.get('limit', 20, type=int)
 
-        if os.path.exists(user_logger.log_file):
-            with open(user_logger.log_file, 'r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    if row['username'].lower() == username.lower():
-                        logs.append(row)
-
-        # Return most recent logs first
-        logs = logs[-limit:] if len(logs) > limit else logs
-        logs.reverse()
+        # Most recent logs first
+        logs = user_logger.recent_activity(username, limit)
 
         return jsonify({'logs': logs})
     except Exception as e:
@@ -1073,35 +1775,71 @@ def get_user_logs(username):
 
 @app.route('/api/logs/download/<username>')
 def download_user_logs(username):
-    """Download user logs as CSV file"""
+    """Download user logs as CSV file (streamed from the activity store)
+
+    Optional query parameters from and to (ISO dates or datetimes) limit the range;
+    a date as to includes that whole day.
+    """
     try:
-        from flask import send_file
-        import tempfile
+        start = activity_store.time_bound(request.args.get('from'))
+        end = activity_store.time_bound(request.args.get('to'), upper=True)
+    except ValueError:
+        return jsonify({'error': 'from and to must be ISO dates (YYYY-MM-DD) or datetimes'}), 400
 
-        # Create temporary file with user-specific logs
-        temp_file = tempfile.NamedTemporaryFile(
-            mode='w', delete=False, suffix='.csv', encoding='utf-8')
+    try:
+        chunks = user_logger.export_csv(username, start, end)
+        # Start the query now so errors still turn into a JSON 500
+        first = next(chunks)
+
+        def generate():
+            yield first
+            yield from chunks
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype='text/csv',
+            headers={'Content-Disposition': f'attachment; filename={username}_activity_log.csv'}
+        )
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        with open(user_logger.log_file, 'r', encoding='utf-8') as source_file:
-            reader = csv.DictReader(source_file)
-            writer = csv.DictWriter(temp_file, fieldnames=reader.fieldnames)
-            writer.writeheader()
 
-            for row in reader:
-                if row['username'].lower() == username.lower():
-                    writer.writerow(row)
+@app.route('/api/usage')
+def get_usage():
+    """Usage dashboard data: analyze volume, active users and top symbols/timeframes per bucket
 
-        temp_file.close()
+    Query parameters: from/to (ISO dates or datetimes; default the last 24 hours),
+    bucket (hour or day) and top (entries per top list, default 5).
+    """
+    try:
+        end = activity_store.time_bound(request.args.get('to'), upper=True)
+        start = activity_store.time_bound(request.args.get('from'))
+    except ValueError:
+        return jsonify({'error': 'from and to must be ISO dates (YYYY-MM-DD) or datetimes'}), 400
+    bucket = request.args.get('bucket', 'hour')
+    if bucket not in usage.BUCKETS:
+        return jsonify({'error': f"bucket must be one of: {', '.join(usage.BUCKETS)}"}), 400
+    top = max(1, min(50, request.args.get('top', 5, type=int)))
+
+    if end is None:
+        # The current hour is included
+        end = (datetime.now().replace(minute=0, second=0, microsecond=0) +
+               timedelta(hours=1)).strftime(activity_store.TIMESTAMP_FORMAT)
+    if start is None:
+        start = (datetime.strptime(end, activity_store.TIMESTAMP_FORMAT) -
+                 timedelta(days=1)).strftime(activity_store.TIMESTAMP_FORMAT)
 
-        return send_file(
-            temp_file.name,
-            as_attachment=True,
-            download_name=f'{username}_activity_log.csv',
-            mimetype='text/csv'
-        )
+    try:
+        return json_response(user_logger.usage_report(start, end, bucket, top))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/metrics')
+def get_metrics():
+    """Expose application metrics in Prometheus text format"""
+    return Response(metrics.registry.render(), content_type=metrics.PROMETHEUS_CONTENT_TYPE)
+
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
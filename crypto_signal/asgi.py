@@ -0,0 +1,341 @@
+"""
+ASGI Entry Point for the Crypto Analysis App
+Serves /api/analyze natively on an event loop: exchange I/O is awaited with
+ccxt's async client and detection runs in a process pool, so a few workers can
+hold hundreds of concurrent chart requests. Live streams (/api/stream) are also
+served on the loop, without holding a thread per client. Every other route is
+handed to the Flask app unchanged, and responses keep the same JSON contracts.
+
+Run with:
+    uvicorn asgi:application --host 0.0.0.0 --port 5000 --workers 2
+"""
+
+import asyncio
+import contextvars
+import io
+import logging
+import os
+import sys
+import time
+
+import ccxt.async_support as ccxt_async
+import pandas as pd
+from asgiref.wsgi import WsgiToAsgi
+from flask import jsonify
+
+import app as flask_module
+import exchange_replay
+import executor
+import live_feed
+import metrics
+from metrics import timed_stage
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRIES = 3
+RETRY_DELAY = 2  # seconds
+# Streams hold no thread here, so a worker can keep many more open than under Gunicorn
+MAX_STREAMS = int(os.getenv('LIVE_MAX_STREAMS', '1000'))
+
+
+def build_environ(scope, body):
+    """Build a WSGI environ from an ASGI HTTP scope so Flask can parse the request"""
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('ascii'),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'SERVER_NAME': scope.get('server', ('localhost', 80))[0],
+        'SERVER_PORT': str(scope.get('server', ('localhost', 80))[1]),
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin1')
+        value = value.decode('latin1')
+        if name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        elif name == 'content-type':
+            key = 'CONTENT_TYPE'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+def response_headers(response):
+    return [(name.lower().encode('latin1'), value.encode('latin1'))
+            for name, value in response.headers.items()]
+
+
+async def send_response(send, response):
+    """Send a finished Flask/werkzeug response over ASGI"""
+    await send({'type': 'http.response.start', 'status': response.status_code,
+                'headers': response_headers(response)})
+    await send({'type': 'http.response.body', 'body': response.get_data()})
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+class AnalysisASGI:
+    """ASGI application: async /api/analyze and /api/stream, everything else through Flask"""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.exchange = None
+        self.detection = flask_module.detection_executor
+        self.live_feeds = flask_module.live_feeds
+        self.live_feeds.max_streams = MAX_STREAMS
+        self._inflight = {}  # cache key -> future, so concurrent misses compute once
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif (scope['type'] == 'http' and scope['path'] == '/api/analyze' and
+              scope['method'] in ('GET', 'POST')):
+            await self.analyze(scope, receive, send)
+        elif (scope['type'] == 'http' and scope['path'] == '/api/stream' and
+              scope['method'] == 'GET'):
+            await self.stream(scope, receive, send)
+        else:
+            await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.startup()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def startup(self):
+        self.detection.start()
+        if self.exchange is None:
+            self.exchange = ccxt_async.binance({
+                'timeout': 20000,
+                'enableRateLimit': True,
+                'options': {
+                    'defaultType': 'spot'
+                }
+            })
+            exchange_replay.configure(self.exchange)
+
+    async def shutdown(self):
+        if self.exchange is not None:
+            await self.exchange.close()
+            self.exchange = None
+        self.detection.shutdown()
+
+    async def run_blocking(self, func, *args):
+        """Run CPU-bound or blocking work in the loop's thread pool, keeping the
+        request context (metrics and request hooks still see the current request)
+        """
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(None, context.run, func, *args)
+
+    async def _timed_exchange_call(self, method, func, *args, **kwargs):
+        """Await an exchange call and record latency and outcome metrics"""
+        start = time.perf_counter()
+        try:
+            result = await func(*args, **kwargs)
+        except Exception:
+            metrics.exchange_requests.inc(method=method, outcome='error')
+            raise
+        finally:
+            metrics.exchange_request_seconds.observe(
+                time.perf_counter() - start, method=method)
+        metrics.exchange_requests.inc(method=method, outcome='ok')
+        return result
+
+    async def _fetch_ohlcv_pages(self, symbol, timeframe, limit):
+        """Fetch up to limit candles, paging past the exchange's per-request maximum"""
+        if limit <= flask_module.EXCHANGE_PAGE_LIMIT:
+            return await self._timed_exchange_call(
+                'fetch_ohlcv', self.exchange.fetch_ohlcv, symbol, timeframe, limit=limit)
+
+        timeframe_ms = self.exchange.parse_timeframe(timeframe) * 1000
+        since = self.exchange.milliseconds() - limit * timeframe_ms
+        ohlcv = []
+        while len(ohlcv) < limit:
+            page_limit = min(flask_module.EXCHANGE_PAGE_LIMIT, limit - len(ohlcv))
+            page = await self._timed_exchange_call(
+                'fetch_ohlcv', self.exchange.fetch_ohlcv, symbol, timeframe,
+                since=since, limit=page_limit)
+            if not page:
+                break
+            ohlcv.extend(page)
+            since = page[-1][0] + timeframe_ms
+            if len(page) < page_limit:  # Reached the most recent candle
+                break
+        return ohlcv
+
+    async def fetch_ohlcv_data(self, symbol, timeframe, limit):
+        """Async counterpart of OrderBlockDetector.fetch_ohlcv_data (same retries and fallback)"""
+        for attempt in range(1, MAX_RETRIES + 1):
+            try:
+                markets_loaded = bool(self.exchange.markets)
+                metrics.record_cache_lookup('markets', markets_loaded)
+                if not markets_loaded:
+                    await self._timed_exchange_call('load_markets', self.exchange.load_markets)
+
+                ohlcv = await self._fetch_ohlcv_pages(symbol, timeframe, limit)
+                if not ohlcv:
+                    raise Exception("No data received from exchange")
+
+                df = pd.DataFrame(
+                    ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+                df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+                return df
+
+            except Exception as e:
+                logger.error(f"Attempt {attempt}/{MAX_RETRIES} failed: {e}")
+                if attempt < MAX_RETRIES:
+                    await asyncio.sleep(RETRY_DELAY)
+
+        logger.error(f"All retry attempts failed for {symbol}")
+        metrics.sample_data_fallbacks.inc()
+        return await self.run_blocking(flask_module.detector.generate_sample_data, symbol)
+
+    async def compute_payload(self, params, df):
+        """Run detection on fetched candles in the shared detection pool"""
+        args = (df, params['symbol'], params['theme'], params['format'],
+                params['max_points'], params['trend_engine'])
+        if not self.detection.enabled:
+            # Inline detection (DETECTION_PROCESSES=0) would block the loop
+            return await self.run_blocking(self.detection.run, *args)
+        future = self.detection.submit(*args)
+        payload = await asyncio.wrap_future(future)
+        metrics.record_stage_timings(getattr(future, 'stage_timings', []))
+        return payload
+
+    async def analyze(self, scope, receive, send):
+        if self.exchange is None:  # Server without lifespan support
+            self.startup()
+
+        environ = build_environ(scope, await read_body(receive))
+        # The request context travels with this task across awaits, so request hooks,
+        # metrics and Server-Timing work as they do under Flask
+        with self.flask_app.request_context(environ):
+            response = self.flask_app.preprocess_request()
+            if response is None:
+                response = await self._analyze_response()
+            response = self.flask_app.process_response(
+                self.flask_app.make_response(response))
+        await send_response(send, response)
+
+    async def stream(self, scope, receive, send):
+        """Live chart updates as Server-Sent Events, pumped from the feed's queue
+        until the client disconnects
+        """
+        environ = build_environ(scope, b'')
+        subscription = None
+        with self.flask_app.request_context(environ):
+            response = self.flask_app.preprocess_request()
+            if response is None:
+                try:
+                    symbol, timeframe = flask_module.parse_stream_request()
+                    subscription = self.live_feeds.subscribe(
+                        symbol, timeframe, live_feed.LoopQueue(asyncio.get_running_loop()))
+                    response = flask_module.Response(mimetype='text/event-stream')
+                    response.headers.update(flask_module.STREAM_HEADERS)
+                except ValueError as e:
+                    response = jsonify({'error': str(e)}), 400
+                except live_feed.StreamLimitReached as e:
+                    response = flask_module.overloaded_response(e)
+            response = self.flask_app.process_response(
+                self.flask_app.make_response(response))
+
+        if subscription is None:
+            await send_response(send, response)
+            return
+
+        async def pump():
+            async for message in subscription.messages():
+                await send({'type': 'http.response.body', 'body': message.encode('utf-8'),
+                            'more_body': True})
+
+        try:
+            await send({'type': 'http.response.start', 'status': response.status_code,
+                        'headers': response_headers(response)})
+            pumping = asyncio.ensure_future(pump())
+            disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+            await asyncio.wait([pumping, disconnected], return_when=asyncio.FIRST_COMPLETED)
+            for task in (pumping, disconnected):
+                task.cancel()
+            if pumping.done() and not pumping.cancelled() and pumping.exception():
+                logger.warning(f"Live stream ended: {pumping.exception()}")
+        finally:
+            subscription.close()
+
+    async def _analyze_response(self):
+        try:
+            try:
+                params = flask_module.parse_analyze_request()
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+
+            flask_module.log_analyze_request(params)
+
+            # Analyzed already in this candle period; patching in the forming candle
+            # may need an encode, so it runs off the loop
+            response = await self.run_blocking(flask_module.cached_analysis_response, params)
+            if response is None:
+                with timed_stage('fetch'):
+                    df = await self.fetch_ohlcv_data(
+                        params['symbol'], params['timeframe'], params['limit'])
+                if df is None:
+                    return jsonify({'error': 'Failed to fetch data and generate sample data'}), 500
+                flask_module.locate_analysis(params, df)
+                response = flask_module.revalidated_analysis_response(params)
+            if response is None:
+                key = params['cache_key']
+                future = self._inflight.get(key) if key is not None else None
+                if future is None:
+                    future = asyncio.ensure_future(self.compute_payload(params, df))
+                    if key is not None:
+                        self._inflight[key] = future
+                        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+                payload = await asyncio.shield(future)
+                # Encoding and compressing a large payload takes a while
+                response = await self.run_blocking(
+                    flask_module.store_analysis_response, params, payload, df)
+
+            response.vary.add('Accept')
+            return response
+
+        except executor.Overloaded as e:
+            return flask_module.overloaded_response(e)
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+
+application = AnalysisASGI(flask_module.app)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(application, host='0.0.0.0', port=int(os.getenv('PORT', '5000')))
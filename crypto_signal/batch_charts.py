@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Batch Chart Generation
+Builds standalone chart pages for many symbols in one run (e.g. a morning
+report): candles are fetched concurrently through the app's one exchange
+client, charts are rendered in the detection process pool, and an index page
+links the per-symbol pages, which all load one local copy of Plotly.js.
+Pages whose candles have not changed since an earlier run are copied from the
+render cache (render_cache.py) without running detection again.
+
+Usage:
+    python batch_charts.py BTC/USDT ETH/USDT SOL/USDT
+    python batch_charts.py --symbols-file watchlist.txt --timeframe 4h --output report
+    python batch_charts.py BTC/USDT ETH/USDT --style advanced --open
+    python batch_charts.py --symbols-file watchlist.txt --closed-candles --png
+"""
+
+import argparse
+import html
+import logging
+import os
+import shutil
+import sys
+import time
+import webbrowser
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import ccxt
+import plotly.offline
+
+# Add current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import executor  # noqa: E402
+import render_cache  # noqa: E402
+from advanced_chart_viewer import (AdvancedTrendLineDetector, build_advanced_chart_html,  # noqa: E402
+                                   create_advanced_figure)
+from app import detector  # noqa: E402
+from chart_viewer import build_chart_html  # noqa: E402
+
+PLOTLY_BUNDLE = 'plotly.min.js'
+STYLES = ('standard', 'advanced')
+FETCH_CONCURRENCY = 8
+PNG_SIZE = (1200, 800)
+
+logger = logging.getLogger(__name__)
+
+
+def chart_filename(symbol, timeframe):
+    """Page name for a symbol, e.g. BTC-USDT_1h.html"""
+    return f"{symbol.replace('/', '-').replace(':', '-')}_{timeframe}.html"
+
+
+def write_plotly_bundle(output_dir):
+    """Write the Plotly.js bundle shipped with the plotly package next to the pages"""
+    path = os.path.join(output_dir, PLOTLY_BUNDLE)
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(plotly.offline.get_plotlyjs())
+    return path
+
+
+def render_chart(df, symbol, timeframe, style, output_dir, key, cache_dir, cache_bytes,
+                 png=False):
+    """Detection plus page (and PNG) for one symbol; runs in a pool worker
+
+    The outputs are stored in the render cache under key and copied to
+    output_dir; pages of sample data are written to output_dir only. Returns
+    the summary shown on the index page.
+    """
+    start = time.perf_counter()
+    df = detector.find_swing_highs_lows(df)
+    df = detector.detect_order_blocks(df)
+
+    if style == 'advanced':
+        trend_lines = AdvancedTrendLineDetector().detect_precise_trend_lines(df)
+        fig = create_advanced_figure(detector, df, trend_lines, symbol)
+        chart_html = build_advanced_chart_html(detector, df, trend_lines, symbol, timeframe,
+                                               plotly_src=PLOTLY_BUNDLE, fig=fig)
+    else:
+        fig = detector.create_chart(df, symbol)
+        chart_html = build_chart_html(detector, df, symbol, timeframe, plotly_src=PLOTLY_BUNDLE,
+                                      fig=fig)
+
+    image = None
+    if png:
+        try:
+            # Needs the optional kaleido package
+            image = fig.to_image(format='png', width=PNG_SIZE[0], height=PNG_SIZE[1])
+        except Exception as e:
+            logger.warning(f"PNG export failed for {symbol}: {e}")
+
+    close = df['close']
+    summary = {
+        'candles': int(len(df)),
+        'bullish_obs': int(df['bullish_ob'].sum()),
+        'bearish_obs': int(df['bearish_ob'].sum()),
+        'price': float(close.iloc[-1]),
+        'change': float((close.iloc[-1] / df['open'].iloc[0] - 1) * 100),
+        'sample_data': bool(df.attrs.get('sample_data')),
+        'render_seconds': round(time.perf_counter() - start, 3)
+    }
+    if summary['sample_data']:
+        return dict(write_outputs(chart_html, image, symbol, timeframe, output_dir), **summary)
+
+    cache = render_cache.RenderCache(cache_dir, cache_bytes)
+    cache.put(key, 'page.html', chart_html)
+    if image is not None:
+        cache.put(key, 'chart.png', image)
+    cache.put_json(key, summary)
+    outputs = copy_outputs(cache, key, symbol, timeframe, output_dir, png)
+    if outputs is None:
+        # Evicted by another worker between the put and the copy
+        outputs = write_outputs(chart_html, image, symbol, timeframe, output_dir)
+    return dict(outputs, **summary)
+
+
+def write_outputs(chart_html, image, symbol, timeframe, output_dir):
+    """Write a page (and PNG) straight into the report, bypassing the render cache"""
+    filename = chart_filename(symbol, timeframe)
+    outputs = {'file': filename}
+    with open(os.path.join(output_dir, filename), 'w', encoding='utf-8') as file:
+        file.write(chart_html)
+    if image is not None:
+        outputs['png'] = filename[:-len('.html')] + '.png'
+        with open(os.path.join(output_dir, outputs['png']), 'wb') as file:
+            file.write(image)
+    return outputs
+
+
+def copy_outputs(cache, key, symbol, timeframe, output_dir, png=False):
+    """Copy a cache entry's page (and PNG) into the report; returns their file names,
+    or None if the entry is incomplete"""
+    page = cache.get(key, 'page.html')
+    image = cache.get(key, 'chart.png') if png else None
+    if page is None:
+        return None
+
+    filename = chart_filename(symbol, timeframe)
+    outputs = {'file': filename}
+    shutil.copyfile(page, os.path.join(output_dir, filename))
+    if image:
+        outputs['png'] = filename[:-len('.html')] + '.png'
+        shutil.copyfile(image, os.path.join(output_dir, outputs['png']))
+    return outputs
+
+
+def cached_chart(cache, key, symbol, timeframe, output_dir, png=False):
+    """Result for a symbol whose page is already in the render cache, or None"""
+    summary = cache.get_json(key)
+    if summary is None or (png and cache.get(key, 'chart.png') is None):
+        return None
+    outputs = copy_outputs(cache, key, symbol, timeframe, output_dir, png)
+    if outputs is None:
+        return None
+    return dict(summary, cached=True, **outputs)
+
+
+def fetch_candles(symbol, timeframe, limit, closed_only=False):
+    """Candles for one symbol through the shared detector (sample data if the exchange fails)
+
+    closed_only drops the candle that is still forming, so the page (and its
+    render cache entry) only changes when a candle closes.
+    """
+    df = detector.fetch_ohlcv_data(symbol, timeframe, limit=limit)
+    if df is None or len(df) == 0:
+        raise RuntimeError('Failed to fetch data and generate sample data')
+    if closed_only:
+        timeframe_ms = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+        last_open = int(df['timestamp'].iloc[-1].value // 1_000_000)
+        if last_open + timeframe_ms > time.time() * 1000:
+            attrs = df.attrs
+            df = df.iloc[:-1]
+            df.attrs = attrs
+    return df
+
+
+def generate_charts(symbols, timeframe='1h', limit=500, output_dir='charts', style='standard',
+                    fetch_workers=FETCH_CONCURRENCY, render_workers=None, cache=None,
+                    png=False, closed_only=False):
+    """Fetch and render every symbol; returns one result dict per symbol, in order
+
+    Rendering starts as soon as a symbol's candles arrive, so fetching and
+    rendering overlap; symbols whose candles match a render cache entry are
+    copied from it instead. render_workers 0 renders in this process.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    write_plotly_bundle(output_dir)
+    cache = cache or render_cache.RenderCache()
+
+    processes = executor.DETECTION_PROCESSES if render_workers is None else render_workers
+    pool = executor.DetectionExecutor(render_chart, processes=processes,
+                                      queue_size=len(symbols))
+    results = {symbol: {'symbol': symbol, 'timeframe': timeframe} for symbol in symbols}
+    try:
+        renders = {}
+        with ThreadPoolExecutor(max_workers=max(1, min(len(symbols), fetch_workers))) as fetches:
+            submitted = {fetches.submit(fetch_candles, symbol, timeframe, limit, closed_only): symbol
+                         for symbol in symbols}
+            for fetch in as_completed(submitted):
+                symbol = submitted[fetch]
+                try:
+                    df = fetch.result()
+                    key = render_cache.render_key(df, view=style, symbol=symbol,
+                                                  timeframe=timeframe, theme='dark',
+                                                  plotly_src=PLOTLY_BUNDLE)
+                    cached = cached_chart(cache, key, symbol, timeframe, output_dir, png)
+                    if cached is not None:
+                        results[symbol].update(cached)
+                        continue
+                    renders[symbol] = pool.submit(df, symbol, timeframe, style, output_dir, key,
+                                                  cache.directory, cache.max_bytes, png)
+                except Exception as e:
+                    results[symbol]['error'] = str(e)
+
+        for symbol, render in renders.items():
+            try:
+                results[symbol].update(render.result())
+            except Exception as e:
+                results[symbol]['error'] = str(e)
+    finally:
+        pool.shutdown()
+
+    return [results[symbol] for symbol in symbols]
+
+
+def build_index_html(results, timeframe, style):
+    """Index page linking every chart, with failures listed last"""
+    rows = []
+    for result in results:
+        symbol = html.escape(result['symbol'])
+        if 'error' in result:
+            rows.append(f'<tr class="failed"><td>{symbol}</td>'
+                        f'<td colspan="6">{html.escape(result["error"])}</td></tr>')
+            continue
+        change_class = 'up' if result['change'] >= 0 else 'down'
+        render = 'cached' if result.get('cached') else f"{result['render_seconds']:.2f}s"
+        sample = ' <span class="sample">sample data</span>' if result['sample_data'] else ''
+        rows.append(
+            f'<tr><td><a href="{html.escape(result["file"])}">{symbol}</a>{sample}</td>'
+            f'<td>{result["price"]:,.2f}</td>'
+            f'<td class="{change_class}">{result["change"]:+.2f}%</td>'
+            f'<td>{result["candles"]}</td>'
+            f'<td>{result["bullish_obs"]}</td>'
+            f'<td>{result["bearish_obs"]}</td>'
+            f'<td>{render}</td></tr>')
+    rows.sort(key=lambda row: row.startswith('<tr class="failed"'))
+
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+    <title>Chart Report - {timeframe}</title>
+    <style>
+        body {{ font-family: Arial, sans-serif; margin: 0; padding: 20px;
+               background-color: #1a1a1a; color: white; }}
+        h1 {{ text-align: center; }}
+        table {{ margin: 0 auto; border-collapse: collapse; min-width: 60%; }}
+        th, td {{ padding: 8px 14px; border-bottom: 1px solid rgba(255,255,255,0.15);
+                  text-align: right; }}
+        th:first-child, td:first-child {{ text-align: left; }}
+        a {{ color: #4fc3f7; }}
+        .up {{ color: #26a69a; }}
+        .down {{ color: #ef5350; }}
+        .failed td {{ color: #ef5350; text-align: left; }}
+        .sample {{ font-size: 0.8em; color: #ffb74d; }}
+    </style>
+</head>
+<body>
+    <h1>Chart Report</h1>
+    <p style="text-align: center;">Timeframe: {timeframe} | Style: {style} |
+        Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
+    <table>
+        <tr><th>Symbol</th><th>Price</th><th>Change</th><th>Candles</th>
+            <th>Bullish OBs</th><th>Bearish OBs</th><th>Render</th></tr>
+        {''.join(rows)}
+    </table>
+</body>
+</html>
+"""
+
+
+def read_symbols(args):
+    """Symbols from the command line and/or a file with one symbol per line"""
+    symbols = list(args.symbols)
+    if args.symbols_file:
+        with open(args.symbols_file, 'r', encoding='utf-8') as file:
+            symbols.extend(line.strip() for line in file
+                           if line.strip() and not line.startswith('#'))
+    return list(dict.fromkeys(symbols))  # Drop duplicates, keep order
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(
+        description='Generate standalone charts for many symbols and an index page')
+    parser.add_argument('symbols', nargs='*', help='Symbols such as BTC/USDT')
+    parser.add_argument('--symbols-file', help='File with one symbol per line')
+    parser.add_argument('--timeframe', default='1h')
+    parser.add_argument('--limit', type=int, default=500, help='Candles per chart')
+    parser.add_argument('--style', choices=STYLES, default='standard',
+                        help='standard (chart_viewer) or advanced (advanced_chart_viewer) pages')
+    parser.add_argument('--output', default='charts', help='Output directory')
+    parser.add_argument('--fetch-workers', type=int, default=FETCH_CONCURRENCY,
+                        help='Concurrent exchange fetches')
+    parser.add_argument('--render-workers', type=int,
+                        help='Render processes (DETECTION_PROCESSES by default, 0 = in process)')
+    parser.add_argument('--png', action='store_true',
+                        help='Also export a PNG per chart (needs the kaleido package)')
+    parser.add_argument('--closed-candles', action='store_true',
+                        help='Leave out the forming candle so unchanged charts come from the cache')
+    parser.add_argument('--open', action='store_true', help='Open the index page in a browser')
+    args = parser.parse_args()
+
+    symbols = read_symbols(args)
+    if not symbols:
+        parser.error('no symbols given')
+
+    print("=" * 60)
+    print(f"📈 BATCH CHARTS: {len(symbols)} symbols ({args.timeframe}, {args.style})")
+    print("=" * 60)
+
+    start = time.perf_counter()
+    results = generate_charts(symbols, args.timeframe, args.limit, args.output, args.style,
+                              args.fetch_workers, args.render_workers, png=args.png,
+                              closed_only=args.closed_candles)
+
+    index_path = os.path.join(args.output, 'index.html')
+    with open(index_path, 'w', encoding='utf-8') as file:
+        file.write(build_index_html(results, args.timeframe, args.style))
+
+    failed = [result for result in results if 'error' in result]
+    for result in failed:
+        print(f"❌ {result['symbol']}: {result['error']}")
+    cached = sum(1 for result in results if result.get('cached'))
+    print(f"✅ {len(results) - len(failed)}/{len(results)} charts ({cached} from the render cache) "
+          f"in {time.perf_counter() - start:.1f}s")
+    print(f"📁 Index page: {index_path}")
+
+    if args.open:
+        webbrowser.open(f"file://{os.path.abspath(index_path)}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
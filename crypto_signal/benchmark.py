@@ -0,0 +1,625 @@
+#!/usr/bin/env python3
+"""
+Benchmark Suite for the Order Block Analysis Pipeline
+Times every stage of the /api/analyze pipeline on synthetic data of increasing
+size, records wall time, peak memory and allocations, and compares the results
+against a saved baseline so regressions show up.
+
+Suites:
+    pipeline   - every analysis stage, wall time / peak memory / allocated blocks
+    transport  - encode time and payload size of the candle encodings
+    chart      - create_chart build time by number of Order Blocks
+    serialize  - legacy vs single-pass response serialization
+    trendlines - trend line engines: time, lines found, touches, agreement with pairs
+
+Usage:
+    python benchmark.py                          # run and write benchmarks/pipeline_latest.json
+    python benchmark.py --sizes 500 1000 2000    # custom series sizes
+    python benchmark.py --save-baseline          # store the run as the new baseline
+    python benchmark.py --suite transport --sizes 500 5000 50000
+    python benchmark.py --suite chart --sizes 10 100 1000
+    python benchmark.py --suite serialize --sizes 500 5000
+    python benchmark.py --suite trendlines --sizes 500 2000 10000
+    python benchmark.py --baseline benchmarks/pipeline_baseline.json --tolerance 0.25
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import plotly
+
+# Add current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import ohlcv_codec  # noqa: E402
+import serialization  # noqa: E402
+from advanced_chart_viewer import AdvancedTrendLineDetector  # noqa: E402
+from app import detector  # noqa: E402
+
+BENCHMARK_DIR = os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), 'benchmarks')
+
+
+def make_synthetic_ohlcv(size, seed=42, base_price=50000.0):
+    """Generate a deterministic OHLCV random walk with the same columns as fetch_ohlcv_data"""
+    rng = np.random.default_rng(seed)
+
+    # Random walk with occasional larger moves so BOS / OB detection has work to do
+    returns = rng.normal(0, 0.008, size)
+    shocks = rng.random(size) < 0.03
+    returns[shocks] *= 4
+    close = base_price * np.cumprod(1 + returns)
+    open_ = np.concatenate(([base_price], close[:-1]))
+    spread = np.abs(rng.normal(0, 0.004, size))
+    high = np.maximum(open_, close) * (1 + spread)
+    low = np.minimum(open_, close) * (1 - spread)
+    volume = rng.uniform(100, 1000, size)
+
+    timestamps = pd.date_range(
+        end=datetime(2024, 1, 1), periods=size, freq='h')
+
+    return pd.DataFrame({
+        'timestamp': timestamps,
+        'open': open_,
+        'high': high,
+        'low': low,
+        'close': close,
+        'volume': volume
+    })
+
+
+def serialize_chart(fig):
+    """Serialize the chart exactly like /api/analyze does"""
+    return serialization.dumps_str(fig.to_plotly_json())
+
+
+def legacy_serialize_chart(fig):
+    """Serialize the chart with Plotly's own encoder, as /api/analyze did before serialization.py"""
+    return json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
+
+
+def _detect_trend_lines_cold(ctx):
+    """Trend lines with an empty candidate cache, as on the first request for a pair"""
+    detector.trend_cache.clear()
+    ctx.update(trend_lines=detector.detect_trend_lines(ctx['df']))
+
+
+# Each stage reads its inputs from and writes its outputs to a shared context,
+# mirroring the order in which /api/analyze runs them.
+STAGES = [
+    ('find_swing_highs_lows',
+     lambda ctx: ctx.update(df=detector.find_swing_highs_lows(ctx['df']))),
+    ('detect_break_of_structure',
+     lambda ctx: ctx.update(df=detector.detect_break_of_structure(ctx['df']))),
+    ('detect_order_blocks',
+     lambda ctx: ctx.update(df=detector.detect_order_blocks(ctx['df']))),
+    ('detect_trend_lines', _detect_trend_lines_cold),
+    ('detect_trend_lines_cached',
+     lambda ctx: ctx.update(trend_lines=detector.detect_trend_lines(ctx['df']))),
+    ('generate_trading_signals',
+     lambda ctx: ctx.update(signals=detector.generate_trading_signals(ctx['df']))),
+    ('create_chart',
+     lambda ctx: ctx.update(fig=detector.create_chart(ctx['df'], 'BENCH/USDT',
+                                                       trend_lines=ctx['trend_lines']))),
+    ('json_serialize',
+     lambda ctx: ctx.update(payload=serialize_chart(ctx['fig']))),
+    ('build_chart_data',
+     lambda ctx: ctx.update(chart_data=detector.build_chart_data(ctx['df'], ctx['trend_lines']))),
+    ('json_serialize_data',
+     lambda ctx: ctx.update(data_payload=json.dumps(ctx['chart_data']))),
+]
+
+
+def _measure_memory(stage_fn, ctx):
+    """Run a stage once under tracemalloc and return (peak_kb, allocated_blocks)"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        stage_fn(ctx)
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+
+    # Blocks allocated by the stage that are still alive when it returns
+    allocated_blocks = sum(
+        max(stat.count_diff, 0) for stat in after.compare_to(before, 'filename'))
+    return peak / 1024, allocated_blocks
+
+
+def run_pipeline_benchmark(size, repeat=3, seed=42):
+    """Benchmark every stage for one series size"""
+    source_df = make_synthetic_ohlcv(size, seed=seed)
+    timings = {name: [] for name, _ in STAGES}
+
+    # Timed runs without tracemalloc, which would otherwise skew wall time
+    ctx = {}
+    for _ in range(repeat):
+        ctx = {'df': source_df.copy()}
+        for name, stage_fn in STAGES:
+            start = time.perf_counter()
+            stage_fn(ctx)
+            timings[name].append((time.perf_counter() - start) * 1000)
+
+    # One extra traced run for memory figures
+    memory = {}
+    traced_ctx = {'df': source_df.copy()}
+    for name, stage_fn in STAGES:
+        memory[name] = _measure_memory(stage_fn, traced_ctx)
+
+    results = {}
+    for name, _ in STAGES:
+        peak_kb, allocated_blocks = memory[name]
+        results[name] = {
+            'min_ms': round(min(timings[name]), 3),
+            'median_ms': round(statistics.median(timings[name]), 3),
+            'peak_kb': round(peak_kb, 1),
+            'alloc_blocks': int(allocated_blocks)
+        }
+
+    results['_counts'] = {
+        'candles': int(len(ctx['df'])),
+        'order_blocks': int(ctx['df']['bullish_ob'].sum() + ctx['df']['bearish_ob'].sum()),
+        'trend_lines': int(len(ctx['trend_lines'])),
+        'payload_bytes': int(len(ctx['payload'])),
+        'data_payload_bytes': int(len(ctx['data_payload']))
+    }
+    return results
+
+
+def _candle_columns(df):
+    """Candle columns as sent in chart_data (epoch-ms timestamps and float lists)"""
+    candles = {'timestamp': df['timestamp'].values.astype(
+        'datetime64[ms]').astype('int64').tolist()}
+    for column in ('open', 'high', 'low', 'close', 'volume'):
+        candles[column] = df[column].astype(float).tolist()
+    return candles
+
+
+def _time_call(func, repeat):
+    """Run func repeat times and return (result, list of ms timings)"""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return result, timings
+
+
+def run_transport_benchmark(size, repeat=3, seed=42):
+    """Benchmark encode/decode time and payload size of each candle encoding"""
+    candles = _candle_columns(make_synthetic_ohlcv(size, seed=seed))
+    payload = {'chart_data': {'encoding': ohlcv_codec.ENCODING_LISTS,
+                              'candles': candles}}
+
+    encodings = {
+        'json_lists': (
+            lambda: json.dumps(payload),
+            json.loads),
+        'f64_base64': (
+            lambda: json.dumps(ohlcv_codec.apply_typed_arrays(payload)),
+            lambda body: [ohlcv_codec.decode_f64(blob['bdata'])
+                          for blob in json.loads(body)['chart_data']['candles'].values()]),
+    }
+    if ohlcv_codec.arrow_available():
+        encodings['arrow_ipc'] = (
+            lambda: ohlcv_codec.encode_arrow_stream(payload),
+            ohlcv_codec.decode_arrow_stream)
+
+    results = {}
+    for name, (encode, decode) in encodings.items():
+        body, encode_times = _time_call(encode, repeat)
+        _, decode_times = _time_call(lambda: decode(body), repeat)
+        results[name] = {
+            'min_ms': round(min(encode_times), 3),
+            'median_ms': round(statistics.median(encode_times), 3),
+            'decode_ms': round(min(decode_times), 3),
+            'kb': round(len(body) / 1024, 1)
+        }
+
+    results['_counts'] = {'candles': size}
+    return results
+
+
+def make_chart_frame(n_order_blocks, seed=42, n_trend_lines=10, size=None):
+    """Synthetic analyzed frame with a fixed number of Order Blocks and trend lines"""
+    size = size or max(500, n_order_blocks * 4)
+    df = make_synthetic_ohlcv(size, seed=seed)
+    rng = np.random.default_rng(seed)
+
+    for column in ('swing_high', 'swing_low', 'bullish_bos', 'bearish_bos',
+                   'bullish_ob', 'bearish_ob'):
+        df[column] = False
+    df['ob_high'] = np.nan
+    df['ob_low'] = np.nan
+
+    ob_indices = rng.choice(size, n_order_blocks, replace=False)
+    half = n_order_blocks // 2
+    df.loc[ob_indices[:half], 'bullish_ob'] = True
+    df.loc[ob_indices[half:], 'bearish_ob'] = True
+    df.loc[ob_indices, 'ob_high'] = df.loc[ob_indices, 'high']
+    df.loc[ob_indices, 'ob_low'] = df.loc[ob_indices, 'low']
+    df.loc[rng.choice(size, size // 50, replace=False), 'bullish_bos'] = True
+    df.loc[rng.choice(size, size // 50, replace=False), 'bearish_bos'] = True
+
+    trend_lines = []
+    for i in range(n_trend_lines):
+        start_index = int(rng.integers(0, size // 2))
+        end_index = int(rng.integers(size // 2, size))
+        price = float(df['close'].iloc[start_index])
+        touch_points = sorted(int(tp) for tp in rng.choice(
+            np.arange(start_index, end_index + 1), 4, replace=False))
+        trend_lines.append({
+            'type': 'resistance' if i % 2 else 'support',
+            'slope': float(rng.normal(0, price * 1e-4)),
+            'intercept': price,
+            'start_index': start_index,
+            'end_index': end_index,
+            'touches': len(touch_points),
+            'strength': float(rng.uniform(1, 10)),
+            'touch_points': touch_points
+        })
+
+    return df, trend_lines
+
+
+def run_chart_benchmark(n_order_blocks, repeat=3, seed=42):
+    """Benchmark Plotly figure building and serialization for a number of Order Blocks"""
+    df, trend_lines = make_chart_frame(n_order_blocks, seed=seed)
+
+    fig, build_times = _time_call(
+        lambda: detector.create_chart(df, 'BENCH/USDT', trend_lines=trend_lines), repeat)
+    body, serialize_times = _time_call(lambda: serialize_chart(fig), repeat)
+    _, data_times = _time_call(
+        lambda: detector.build_chart_data(df, trend_lines), repeat)
+
+    return {
+        'create_chart': {
+            'min_ms': round(min(build_times), 3),
+            'median_ms': round(statistics.median(build_times), 3)
+        },
+        'json_serialize': {
+            'min_ms': round(min(serialize_times), 3),
+            'median_ms': round(statistics.median(serialize_times), 3)
+        },
+        'build_chart_data': {
+            'min_ms': round(min(data_times), 3),
+            'median_ms': round(statistics.median(data_times), 3)
+        },
+        '_counts': {
+            'candles': int(len(df)),
+            'shapes': len(fig.layout.shapes),
+            'traces': len(fig.data),
+            'figure_kb': round(len(body) / 1024, 1)
+        }
+    }
+
+
+def _legacy_convert(obj):
+    """The recursive numpy-to-Python conversion /api/analyze used before serialization.py"""
+    if hasattr(obj, 'item'):
+        return obj.item()
+    elif hasattr(obj, 'tolist'):
+        return obj.tolist()
+    elif isinstance(obj, dict):
+        return {k: _legacy_convert(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [_legacy_convert(item) for item in obj]
+    return obj
+
+
+def run_serialize_benchmark(size, repeat=3, seed=42):
+    """Compare the legacy three-pass serialization with the single-pass serializer"""
+    df, trend_lines = make_chart_frame(max(size // 20, 2), seed=seed, size=size)
+    # Trend line values come out of the detector as NumPy scalars
+    trend_lines = [{key: (np.float64(value) if isinstance(value, float) else value)
+                    for key, value in line.items()} for line in trend_lines]
+    fig = detector.create_chart(df, 'BENCH/USDT', trend_lines=trend_lines)
+    chart_data = detector.build_chart_data(df, trend_lines)
+    base = {
+        'stats': {'total_candles': size, 'current_price': float(df['close'].iloc[-1])},
+        'trading_signals': detector.generate_trading_signals(df),
+        'trend_lines': trend_lines,
+        'using_sample_data': False
+    }
+
+    variants = {
+        'legacy_plotly': lambda: json.dumps(dict(
+            base, trend_lines=_legacy_convert(trend_lines), chart=legacy_serialize_chart(fig))),
+        'fast_plotly': lambda: serialization.dumps(dict(
+            base, chart=serialization.dumps_str(fig.to_plotly_json()))),
+        'legacy_data': lambda: json.dumps(dict(
+            base, trend_lines=_legacy_convert(trend_lines), chart_data=chart_data)),
+        'fast_data': lambda: serialization.dumps(dict(base, chart_data=chart_data)),
+    }
+
+    results = {}
+    for name, serialize in variants.items():
+        body, timings = _time_call(serialize, repeat)
+        results[name] = {
+            'min_ms': round(min(timings), 3),
+            'median_ms': round(statistics.median(timings), 3),
+            'kb': round(len(body) / 1024, 1)
+        }
+
+    results['_counts'] = {
+        'candles': size,
+        'order_blocks': len(chart_data['order_blocks']),
+        'orjson': serialization.orjson is not None
+    }
+    return results
+
+
+# The exhaustive reference loops in Python over pairs x points; skip it beyond this
+LEGACY_TREND_LINE_POINTS = 80
+
+
+def _legacy_trend_lines(df):
+    """detect_trend_lines through the uncached reference implementation"""
+    trend_lines = []
+    for swing_col, price_col, line_type in (('swing_high', 'high', 'resistance'),
+                                            ('swing_low', 'low', 'support')):
+        swing_points = df[df[swing_col]]
+        if len(swing_points) >= 3:
+            trend_lines.extend(detector._find_trend_line_combinations(
+                swing_points, price_col, line_type, 3))
+    return trend_lines
+
+
+def _agreement(reference, trend_lines):
+    """Share of reference lines matched by a line of the same type that shares at
+    least half of their combined touch points"""
+    if not reference:
+        return 1.0
+    matched = 0
+    for line in reference:
+        touches = set(line['touch_points'])
+        if any(other['type'] == line['type'] and
+               len(touches & set(other['touch_points'])) * 2 >=
+               len(touches | set(other['touch_points']))
+               for other in trend_lines):
+            matched += 1
+    return round(matched / len(reference), 2)
+
+
+def run_trendline_benchmark(size, repeat=3, seed=42):
+    """Compare trend line engines on one series size
+
+    Quality columns: lines found, mean touches per line and agreement with the
+    exhaustive pairs engine. The advanced detector (advanced_chart_viewer.py)
+    scores its own swing points against every candle of its last 100, so only
+    its time and line count compare directly.
+    """
+    df = detector.find_swing_highs_lows(make_synthetic_ohlcv(size, seed=seed))
+    most_points = int(max(df['swing_high'].sum(), df['swing_low'].sum()))
+
+    def pairs_cold():
+        detector.trend_cache.clear()
+        return detector.detect_trend_lines(df)
+
+    engines = {
+        'pairs': pairs_cold,
+        'pairs_cached': lambda: detector.detect_trend_lines(df),
+        'hough': lambda: detector.detect_trend_lines(df, engine='hough'),
+        'advanced': lambda: AdvancedTrendLineDetector().detect_precise_trend_lines(df),
+    }
+    if most_points <= LEGACY_TREND_LINE_POINTS:
+        engines['pairs_legacy'] = lambda: _legacy_trend_lines(df)
+
+    reference = pairs_cold()
+    results = {}
+    for name, detect in engines.items():
+        trend_lines, timings = _time_call(detect, repeat)
+        results[name] = {
+            'min_ms': round(min(timings), 3),
+            'median_ms': round(statistics.median(timings), 3),
+            'lines': len(trend_lines),
+            'mean_touches': round(float(np.mean([line['touches'] for line in trend_lines]))
+                                  if trend_lines else 0.0, 2),
+            'agreement': _agreement(reference, trend_lines) if name != 'advanced' else '-'
+        }
+
+    results['_counts'] = {
+        'candles': size,
+        'swing_points': int(df['swing_high'].sum() + df['swing_low'].sum())
+    }
+    return results
+
+
+# name -> (benchmark function, default sizes, what a size counts)
+SUITES = {
+    'pipeline': (run_pipeline_benchmark, [250, 500, 1000], 'candles'),
+    'transport': (run_transport_benchmark, [500, 5000, 50000], 'candles'),
+    'chart': (run_chart_benchmark, [10, 100, 1000], 'order blocks'),
+    'serialize': (run_serialize_benchmark, [500, 5000], 'candles'),
+    'trendlines': (run_trendline_benchmark, [500, 2000, 10000], 'candles'),
+}
+
+
+def default_output(suite):
+    return os.path.join(BENCHMARK_DIR, f'{suite}_latest.json')
+
+
+def default_baseline(suite):
+    return os.path.join(BENCHMARK_DIR, f'{suite}_baseline.json')
+
+
+def run_benchmarks(sizes, repeat=3, seed=42, suite='pipeline'):
+    """Run a benchmark suite for every size and return a result document"""
+    benchmark_fn, _, unit = SUITES[suite]
+    document = {
+        'suite': suite,
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'plotly': plotly.__version__,
+            'repeat': repeat,
+            'seed': seed
+        },
+        'results': {}
+    }
+
+    for size in sizes:
+        print(f"⏱️  Benchmarking {size} {unit}...")
+        document['results'][str(size)] = benchmark_fn(
+            size, repeat=repeat, seed=seed)
+
+    return document
+
+
+def compare_to_baseline(current, baseline, tolerance=0.2, metric='min_ms'):
+    """Return a list of regressions where the metric grew by more than tolerance"""
+    regressions = []
+    for size, stages in current['results'].items():
+        base_stages = baseline.get('results', {}).get(size)
+        if not base_stages:
+            continue
+
+        for stage, values in stages.items():
+            if stage.startswith('_') or stage not in base_stages:
+                continue
+
+            base_value = base_stages[stage].get(metric)
+            value = values.get(metric)
+            if not base_value or value is None:
+                continue
+
+            ratio = value / base_value
+            if ratio > 1 + tolerance:
+                regressions.append({
+                    'size': size,
+                    'stage': stage,
+                    'metric': metric,
+                    'baseline': base_value,
+                    'current': value,
+                    'ratio': round(ratio, 2)
+                })
+
+    return regressions
+
+
+def print_report(document, baseline=None):
+    """Print a per-stage table, with the change against the baseline if available"""
+    unit = SUITES.get(document.get('suite'), (None, None, 'candles'))[2]
+    for size, stages in document['results'].items():
+        counts = stages.get('_counts', {})
+        details = ', '.join(f"{key.replace('_', ' ')}: {value}" for key, value in counts.items()
+                            if key != unit)
+        print(f"\n📊 {size} {unit}" + (f" ({details})" if details else ''))
+
+        rows = {stage: values for stage,
+                values in stages.items() if not stage.startswith('_')}
+        if not rows:
+            continue
+
+        # Columns beyond min/median differ per suite (peak KB, blocks, payload KB, ...)
+        extra_columns = [key for key in next(iter(rows.values()))
+                         if key not in ('min_ms', 'median_ms')]
+        header = f"  {'stage':<28}{'min ms':>10}{'median ms':>12}"
+        header += ''.join(f"{column.replace('_', ' '):>14}" for column in extra_columns)
+        print(header + f"{'vs base':>10}")
+
+        base_stages = (baseline or {}).get('results', {}).get(size, {})
+        for stage, values in rows.items():
+            change = ''
+            base_value = base_stages.get(stage, {}).get('min_ms')
+            if base_value:
+                change = f"{(values['min_ms'] / base_value - 1) * 100:+.0f}%"
+
+            line = f"  {stage:<28}{values['min_ms']:>10.2f}{values['median_ms']:>12.2f}"
+            line += ''.join(f"{values[column]:>14}" for column in extra_columns)
+            print(line + f"{change:>10}")
+
+
+def load_json(path):
+    """Load a JSON document, returning None if it does not exist"""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_json(document, path):
+    """Write a JSON document, creating the parent directory if needed"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(document, file, indent=2)
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(
+        description='Benchmark the order block analysis pipeline')
+    parser.add_argument('--suite', choices=sorted(SUITES), default='pipeline',
+                        help='Which benchmark suite to run')
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        help='Number of candles per synthetic series (suite default if omitted)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Timed runs per size (the minimum is reported)')
+    parser.add_argument('--seed', type=int, default=42,
+                        help='Random seed for the synthetic series')
+    parser.add_argument('--output',
+                        help='Where to write the results JSON (benchmarks/<suite>_latest.json)')
+    parser.add_argument('--baseline',
+                        help='Baseline results JSON to compare against (benchmarks/<suite>_baseline.json)')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Also store this run as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed slowdown against the baseline (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    sizes = args.sizes or SUITES[args.suite][1]
+    args.output = args.output or default_output(args.suite)
+    args.baseline = args.baseline or default_baseline(args.suite)
+
+    print("=" * 60)
+    print(f"⏱️  ORDER BLOCK {args.suite.upper()} BENCHMARK")
+    print("=" * 60)
+
+    document = run_benchmarks(
+        sizes, repeat=args.repeat, seed=args.seed, suite=args.suite)
+    baseline = load_json(args.baseline)
+
+    print_report(document, baseline)
+
+    save_json(document, args.output)
+    print(f"\n📁 Results saved: {args.output}")
+
+    if args.save_baseline:
+        save_json(document, args.baseline)
+        print(f"📁 Baseline saved: {args.baseline}")
+        return 0
+
+    if baseline is None:
+        print("ℹ️  No baseline found, run with --save-baseline to create one")
+        return 0
+
+    regressions = compare_to_baseline(
+        document, baseline, tolerance=args.tolerance)
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+        for item in regressions:
+            print(f"  • {item['stage']} @ {item['size']} candles: "
+                  f"{item['baseline']:.2f} → {item['current']:.2f} ms (x{item['ratio']})")
+        return 1
+
+    print("\n✅ No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
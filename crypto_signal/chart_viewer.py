@@ -5,10 +5,10 @@ This creates and displays candlestick charts with trend lines and order blocks.
 """
 
 from app import OrderBlockDetector
+import render_cache
 import sys
 import os
 import webbrowser
-import tempfile
 from datetime import datetime
 
 # Add current directory to Python path
@@ -16,9 +16,15 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 # Import from your app
 
+PLOTLY_CDN = "https://cdn.plot.ly/plotly-latest.min.js"
 
-def create_standalone_chart(symbol="BTC/USDT", timeframe="1h"):
-    """Create a standalone HTML chart file"""
+
+def create_standalone_chart(symbol="BTC/USDT", timeframe="1h", cache=None):
+    """Create a standalone HTML chart file
+
+    Pages live in the render cache (render_cache.py), so unchanged candles reuse
+    the page rendered last time.
+    """
 
     print(f"🔍 Creating chart for {symbol} ({timeframe})...")
 
@@ -39,6 +45,14 @@ def create_standalone_chart(symbol="BTC/USDT", timeframe="1h"):
 
     print(f"✅ Got {len(df)} candles")
 
+    cache = cache or render_cache.RenderCache()
+    key = render_cache.render_key(df, view='standard', symbol=symbol, timeframe=timeframe,
+                                  theme='dark', plotly_src=PLOTLY_CDN)
+    cached = cache.get(key, 'page.html')
+    if cached:
+        print("♻️  Data unchanged, reusing the rendered chart")
+        return cached
+
     # Add swing highs/lows
     print("🔍 Detecting swing points...")
     df = detector.find_swing_highs_lows(df)
@@ -49,15 +63,29 @@ def create_standalone_chart(symbol="BTC/USDT", timeframe="1h"):
 
     # Create the chart
     print("📈 Creating interactive chart...")
-    fig = detector.create_chart(df, symbol)
+    chart_html = build_chart_html(detector, df, symbol, timeframe)
+
+    if df.attrs.get('sample_data'):
+        # Generated candles are not market data, keep them out of the cache
+        return render_cache.write_uncached(chart_html)
+    return cache.put(key, 'page.html', chart_html)
+
 
-    # Create HTML file
-    chart_html = f"""
+def build_chart_html(detector, df, symbol, timeframe, plotly_src=PLOTLY_CDN, fig=None):
+    """Chart page for candles with swing points and order blocks already detected
+
+    plotly_src is the Plotly.js script the page loads; batch_charts.py points every
+    page at one shared local copy. fig is the chart, built here if not given.
+    """
+    if fig is None:
+        fig = detector.create_chart(df, symbol)
+
+    return f"""
 <!DOCTYPE html>
 <html>
 <head>
     <title>{symbol} - Crypto Chart Analysis</title>
-    <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
+    <script src="{plotly_src}"></script>
     <style>
         body {{
             font-family: Arial, sans-serif;
@@ -169,14 +197,6 @@ def create_standalone_chart(symbol="BTC/USDT", timeframe="1h"):
 </html>
 """
 
-    # Save to temporary file
-    temp_file = tempfile.NamedTemporaryFile(
-        mode='w', suffix='.html', delete=False, encoding='utf-8')
-    temp_file.write(chart_html)
-    temp_file.close()
-
-    return temp_file.name
-
 
 def main():
     """Main function"""
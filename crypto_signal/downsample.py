@@ -0,0 +1,93 @@
+"""
+Candle Downsampling for Zoomed-out Chart Views
+OHLC-preserving bucket aggregation for candlesticks and Largest-Triangle-
+Three-Buckets (LTTB) for line overlays, so long histories can be drawn with
+about one point per pixel.
+"""
+
+import numpy as np
+
+
+def bucket_starts(length, n_buckets):
+    """Start offsets of n_buckets contiguous, near-equal buckets over length items"""
+    n_buckets = max(1, min(int(n_buckets), length))
+    return np.linspace(0, length, n_buckets + 1).astype(np.int64)[:-1]
+
+
+def aggregate_ohlcv(timestamp, open_, high, low, close, volume, n_buckets):
+    """Aggregate candles into at most n_buckets OHLC-preserving candles
+
+    Each bucket keeps the first timestamp and open, the highest high, the lowest
+    low, the last close and the summed volume, so wicks and ranges stay exact.
+    Returns a dict of NumPy arrays with the same keys as the chart candles.
+    """
+    timestamp = np.asarray(timestamp)
+    length = len(timestamp)
+    if length == 0 or n_buckets >= length:
+        return {
+            'timestamp': timestamp,
+            'open': np.asarray(open_, dtype=float),
+            'high': np.asarray(high, dtype=float),
+            'low': np.asarray(low, dtype=float),
+            'close': np.asarray(close, dtype=float),
+            'volume': np.asarray(volume, dtype=float)
+        }
+
+    starts = bucket_starts(length, n_buckets)
+    ends = np.append(starts[1:], length) - 1
+
+    return {
+        'timestamp': timestamp[starts],
+        'open': np.asarray(open_, dtype=float)[starts],
+        'high': np.maximum.reduceat(np.asarray(high, dtype=float), starts),
+        'low': np.minimum.reduceat(np.asarray(low, dtype=float), starts),
+        'close': np.asarray(close, dtype=float)[ends],
+        'volume': np.add.reduceat(np.asarray(volume, dtype=float), starts)
+    }
+
+
+def lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets downsampling for a line series
+
+    Returns the indices of the selected points (always including the first and
+    last point), so callers can pick matching values from other columns.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    length = len(x)
+    if threshold >= length or threshold < 3:
+        return np.arange(length)
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = length - 1
+
+    # Interior points are split into threshold - 2 buckets
+    edges = np.linspace(1, length - 1, threshold - 1).astype(np.int64)
+    previous = 0
+
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+
+        # Average of the next bucket (or the last point for the final bucket)
+        if bucket + 2 < len(edges):
+            next_start, next_end = edges[bucket + 1], edges[bucket + 2]
+            avg_x = x[next_start:next_end].mean()
+            avg_y = y[next_start:next_end].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+
+        # Pick the point forming the largest triangle with the previous pick and the average
+        areas = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous]) -
+            (x[previous] - x[start:end]) * (avg_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+
+    return selected
+
+
+def downsample_line(x, y, threshold):
+    """LTTB-downsample a line and return the (x, y) arrays"""
+    indices = lttb(x, y, threshold)
+    return np.asarray(x)[indices], np.asarray(y)[indices]
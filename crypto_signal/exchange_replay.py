@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+Exchange Response Recording and Replay
+Captures the responses of real ccxt exchange requests to disk and serves them
+back from a local HTTP stand-in, so the fetch, retry and cache paths can be
+load-tested without network access and with the same data every run. The
+stand-in adds configurable latency, server errors and rate limiting (HTTP 429).
+
+Candle requests are answered from all recorded candles of a symbol and
+interval, sliced by startTime/endTime/limit like Binance does; with
+--shift-time the candles are moved so the last recorded one is the current
+candle, which keeps "latest N candles" requests meaningful on later days.
+Other requests replay the recorded response for the same path and parameters.
+
+Usage:
+    python exchange_replay.py record --symbols BTC/USDT ETH/USDT --timeframes 1h 4h --limit 1000
+    EXCHANGE_RECORD_DIR=recordings python app.py          # record while using the app
+    python exchange_replay.py serve --port 8765 --latency-ms 80 --jitter-ms 40 \\
+        --error-rate 0.02 --rate-limit 20 --shift-time
+    EXCHANGE_REPLAY_URL=http://127.0.0.1:8765 python app.py
+"""
+
+import argparse
+import asyncio
+import bisect
+import functools
+import glob
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import ccxt
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DIR = os.path.join(BASE_DIR, 'recordings')
+# Read by configure(), which app.py and asgi.py call on every exchange they create
+RECORD_DIR = os.getenv('EXCHANGE_RECORD_DIR', '')
+REPLAY_URL = os.getenv('EXCHANGE_REPLAY_URL', '')
+
+# Request parameters that differ on every call and do not select the response
+VOLATILE_PARAMS = {'timestamp', 'signature', 'recvWindow'}
+DEFAULT_KLINES_LIMIT = 500
+MAX_KLINES_LIMIT = 1000
+
+
+def split_url(url):
+    """(host, path, query dict) of a request URL"""
+    parts = urlsplit(url)
+    return parts.netloc, parts.path, dict(parse_qsl(parts.query))
+
+
+def query_key(query):
+    return tuple(sorted((name, value) for name, value in query.items()
+                        if name not in VOLATILE_PARAMS))
+
+
+class Recorder:
+    """Appends every successful exchange response to <directory>/<name>.jsonl
+
+    With replay_url set, requests sent to a replay server are recorded under the
+    exchange host they stand in for.
+    """
+
+    def __init__(self, directory, name, replay_url=None):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f'{name}.jsonl')
+        self.replay_prefix = replay_url.rstrip('/') + '/' if replay_url else None
+        self._lock = threading.Lock()
+
+    def record(self, method, url, body, response):
+        if self.replay_prefix and url.startswith(self.replay_prefix):
+            url = 'https://' + url[len(self.replay_prefix):]
+        host, path, query = split_url(url)
+        line = json.dumps({
+            'time': int(time.time() * 1000),
+            'method': method,
+            'host': host,
+            'path': path,
+            'query': {name: value for name, value in query.items()
+                      if name not in VOLATILE_PARAMS},
+            'body': body,
+            'response': response
+        })
+        with self._lock, open(self.path, 'a', encoding='utf-8') as file:
+            file.write(line + '\n')
+
+    def wrap(self, exchange):
+        """Record through the exchange's fetch (sync or async ccxt client)"""
+        original = exchange.fetch
+
+        if asyncio.iscoroutinefunction(original):
+            @functools.wraps(original)
+            async def fetch(url, method='GET', headers=None, body=None):
+                response = await original(url, method, headers, body)
+                self.record(method, url, body, response)
+                return response
+        else:
+            @functools.wraps(original)
+            def fetch(url, method='GET', headers=None, body=None):
+                response = original(url, method, headers, body)
+                self.record(method, url, body, response)
+                return response
+
+        exchange.fetch = fetch
+        return exchange
+
+
+def point_to_replay(exchange, base_url):
+    """Send every API request of the exchange to a replay server
+
+    https://api.binance.com/api/v3 becomes <base_url>/api.binance.com/api/v3, so
+    endpoints of different hosts stay apart.
+    """
+    base_url = base_url.rstrip('/')
+
+    def rewrite(urls):
+        if isinstance(urls, dict):
+            return {name: rewrite(url) for name, url in urls.items()}
+        if isinstance(urls, str) and '://' in urls:
+            return f"{base_url}/{urls.split('://', 1)[1]}"
+        return urls
+
+    exchange.urls['api'] = rewrite(exchange.urls['api'])
+    return exchange
+
+
+def configure(exchange, record_dir=None, replay_url=None):
+    """Apply EXCHANGE_REPLAY_URL / EXCHANGE_RECORD_DIR (or the given values) to an exchange"""
+    replay_url = REPLAY_URL if replay_url is None else replay_url
+    record_dir = RECORD_DIR if record_dir is None else record_dir
+    if replay_url:
+        point_to_replay(exchange, replay_url)
+        logger.info(f"Exchange requests go to the replay server at {replay_url}")
+    if record_dir:
+        Recorder(record_dir, exchange.id, replay_url).wrap(exchange)
+        logger.info(f"Recording exchange responses to {record_dir}")
+    return exchange
+
+
+class Recording:
+    """Recorded responses of one or more .jsonl files, indexed for replay"""
+
+    def __init__(self, directory):
+        self.responses = {}  # (method, host, path, query) -> response
+        self.routes = {}  # (method, host, path) -> latest response, for unmatched parameters
+        self.candles = {}  # (host, path, symbol, interval) -> rows sorted by open time
+        self.offsets = {}
+
+        series = {}
+        for filename in sorted(glob.glob(os.path.join(directory, '*.jsonl'))):
+            with open(filename, 'r', encoding='utf-8') as file:
+                for line in file:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    query = entry.get('query', {})
+                    if entry['path'].endswith('/klines') and isinstance(entry['response'], list):
+                        key = (entry['host'], entry['path'], query.get('symbol'),
+                               query.get('interval'))
+                        rows = series.setdefault(key, {})
+                        for row in entry['response']:
+                            rows[row[0]] = row
+                        continue
+                    self.responses[(entry['method'], entry['host'], entry['path'],
+                                    query_key(query))] = entry['response']
+                    self.routes[(entry['method'], entry['host'], entry['path'])] = entry['response']
+
+        for key, rows in series.items():
+            self.candles[key] = [rows[open_time] for open_time in sorted(rows)]
+
+    def shift_to(self, now_ms):
+        """Move every candle series so its last candle is the one open at now_ms"""
+        for key, rows in self.candles.items():
+            interval_ms = ccxt.Exchange.parse_timeframe(key[3]) * 1000
+            offset = now_ms // interval_ms * interval_ms - rows[-1][0]
+            self.candles[key] = [[row[0] + offset] + row[1:6] + [row[6] + offset] + row[7:]
+                                 for row in rows]
+            self.offsets[key] = offset
+
+    def klines(self, host, path, query):
+        """Candle rows for a klines request, or None for an unrecorded symbol"""
+        rows = self.candles.get((host, path, query.get('symbol'), query.get('interval')))
+        if rows is None:
+            return None
+        limit = min(int(query.get('limit', DEFAULT_KLINES_LIMIT)), MAX_KLINES_LIMIT)
+        opens = [row[0] for row in rows]
+        start, end = query.get('startTime'), query.get('endTime')
+        if start is not None:
+            low = bisect.bisect_left(opens, int(start))
+            high = bisect.bisect_right(opens, int(end)) if end is not None else len(rows)
+            return rows[low:min(high, low + limit)]
+        if end is not None:
+            high = bisect.bisect_right(opens, int(end))
+            return rows[max(0, high - limit):high]
+        return rows[-limit:]
+
+    def lookup(self, method, host, path, query):
+        response = self.responses.get((method, host, path, query_key(query)))
+        if response is None:
+            response = self.routes.get((method, host, path))
+        return response
+
+
+class TokenBucket:
+    """Allows rate requests per second on average, bursts up to burst"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """HTTP stand-in for the exchange, answering from a Recording
+
+    latency_ms +- jitter_ms is added to every response, error_rate of the
+    requests fail with 503, and past rate_limit requests per second the server
+    answers 429 with Retry-After like Binance does. seed makes the injected
+    latency and errors repeatable.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, recording, latency_ms=0, jitter_ms=0, error_rate=0.0,
+                 rate_limit=None, seed=None):
+        super().__init__(address, ReplayHandler)
+        self.recording = recording
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.bucket = TokenBucket(rate_limit) if rate_limit else None
+        self.random = random.Random(seed)
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def count(self, outcome):
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def draw(self):
+        """(delay seconds, fail?) for the next request"""
+        with self._lock:
+            delay = self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms)
+            fail = self.random.random() < self.error_rate
+        return max(0.0, delay) / 1000, fail
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self._replay('GET')
+
+    def do_POST(self):
+        self._replay('POST')
+
+    def do_DELETE(self):
+        self._replay('DELETE')
+
+    def _replay(self, method):
+        server = self.server
+        if self.path == '/__replay/stats':
+            self._send(200, dict(server.stats))
+            return
+
+        delay, fail = server.draw()
+        if delay:
+            time.sleep(delay)
+
+        if server.bucket is not None and not server.bucket.take():
+            server.count('rate_limited')
+            self._send(429, {'code': -1003, 'msg': 'Too many requests; replay rate limit.'},
+                       {'Retry-After': '1'})
+            return
+        if fail:
+            server.count('error')
+            self._send(503, {'code': -1001, 'msg': 'Internal error; injected by replay server.'})
+            return
+
+        # /<host>/<path>?<query>, see point_to_replay
+        _, host_path, query = split_url(self.path)
+        host, _, path = host_path.lstrip('/').partition('/')
+        path = '/' + path
+
+        if path.endswith('/klines'):
+            response = server.recording.klines(host, path, query)
+            if response is None:
+                server.count('unknown_symbol')
+                self._send(400, {'code': -1121, 'msg': 'Invalid symbol.'})
+                return
+        else:
+            response = server.recording.lookup(method, host, path, query)
+            if response is None:
+                server.count('not_recorded')
+                self._send(404, {'code': -1, 'msg': f'Not in recording: {method} {host}{path}'})
+                return
+
+        server.count('ok')
+        self._send(200, response)
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+def serve(directory=DEFAULT_DIR, host='127.0.0.1', port=8765, shift_time=False, **options):
+    """Start a replay server in a background thread and return it"""
+    recording = Recording(directory)
+    if shift_time:
+        recording.shift_to(int(time.time() * 1000))
+    server = ReplayServer((host, port), recording, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"Replaying {len(recording.responses)} responses and {len(recording.candles)} "
+                f"candle series from {directory} at {server.url}")
+    return server
+
+
+def record(symbols, timeframes, limit=1000, directory=DEFAULT_DIR):
+    """Record markets and the last limit candles of each symbol and timeframe"""
+    exchange = ccxt.binance({'enableRateLimit': True, 'options': {'defaultType': 'spot'}})
+    Recorder(directory, exchange.id).wrap(exchange)
+    exchange.load_markets()
+
+    for symbol in symbols:
+        for timeframe in timeframes:
+            timeframe_ms = exchange.parse_timeframe(timeframe) * 1000
+            since = exchange.milliseconds() - limit * timeframe_ms
+            candles = 0
+            while candles < limit:
+                page = exchange.fetch_ohlcv(symbol, timeframe, since=since,
+                                            limit=min(MAX_KLINES_LIMIT, limit - candles))
+                if not page:
+                    break
+                candles += len(page)
+                since = page[-1][0] + timeframe_ms
+            print(f"📼 {symbol} {timeframe}: {candles} candles")
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Record exchange responses or replay them')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = commands.add_parser('record', help='Record markets and candles from Binance')
+    record_parser.add_argument('--symbols', nargs='+', default=['BTC/USDT', 'ETH/USDT'])
+    record_parser.add_argument('--timeframes', nargs='+', default=['1h'])
+    record_parser.add_argument('--limit', type=int, default=1000, help='Candles per series')
+    record_parser.add_argument('--dir', default=DEFAULT_DIR)
+
+    serve_parser = commands.add_parser('serve', help='Serve a recording over HTTP')
+    serve_parser.add_argument('--dir', default=DEFAULT_DIR)
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8765)
+    serve_parser.add_argument('--latency-ms', type=float, default=0)
+    serve_parser.add_argument('--jitter-ms', type=float, default=0)
+    serve_parser.add_argument('--error-rate', type=float, default=0.0,
+                              help='Share of requests answered with 503')
+    serve_parser.add_argument('--rate-limit', type=float,
+                              help='Requests per second before answering 429')
+    serve_parser.add_argument('--seed', type=int, help='Seed for latency and error injection')
+    serve_parser.add_argument('--shift-time', action='store_true',
+                              help='Move candles so the last recorded one is the current candle')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == 'record':
+        record(args.symbols, args.timeframes, args.limit, args.dir)
+        return
+
+    server = serve(args.dir, args.host, args.port, args.shift_time,
+                   latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                   error_rate=args.error_rate, rate_limit=args.rate_limit, seed=args.seed)
+    print(f"🔁 Replay server at {server.url} (stats: {server.url}/__replay/stats)")
+    print(f"   EXCHANGE_REPLAY_URL={server.url} python app.py")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
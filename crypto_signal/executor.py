@@ -0,0 +1,225 @@
+"""
+Process-Pool Execution of the Detection Pipeline
+Runs OrderBlockDetector analyses in a warm pool of worker processes so CPU-bound
+detection does not hold the serving process's GIL. Candle arrays reach the
+workers through multiprocessing.shared_memory instead of pickled DataFrames, and
+a bounded number of queued analyses keeps overload from piling up: past the
+limit, submissions fail fast with Overloaded (served as HTTP 503 + Retry-After).
+"""
+
+import logging
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import pandas as pd
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# 0 runs detection in the serving process
+DETECTION_PROCESSES = int(os.getenv('DETECTION_PROCESSES', os.cpu_count() or 2))
+# Analyses allowed to wait for a free process before new ones are rejected (unused
+# inline, where the server's own threads bound concurrent analyses)
+DETECTION_QUEUE = int(os.getenv('DETECTION_QUEUE', DETECTION_PROCESSES * 4))
+
+PRICE_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+
+class Overloaded(Exception):
+    """The detection queue is full; retry after retry_after seconds"""
+
+    def __init__(self, retry_after):
+        super().__init__('Analysis queue is full, please retry shortly')
+        self.retry_after = retry_after
+
+
+def write_candles(shm, df):
+    """Copy a candle frame into a shared memory block
+
+    Layout: int64 timestamps (ns) followed by one float64 block per price column.
+    """
+    length = len(df)
+    np.ndarray((length,), dtype='<i8', buffer=shm.buf)[:] = (
+        df['timestamp'].values.astype('datetime64[ns]').astype('int64'))
+    prices = np.ndarray((len(PRICE_COLUMNS), length), dtype='<f8',
+                        buffer=shm.buf, offset=length * 8)
+    for row, column in enumerate(PRICE_COLUMNS):
+        prices[row] = df[column].values
+
+
+def read_candles(shm, length):
+    """Rebuild a candle frame (with its own copy of the data) from a shared memory block"""
+    timestamps = np.ndarray((length,), dtype='<i8', buffer=shm.buf)
+    prices = np.ndarray((len(PRICE_COLUMNS), length), dtype='<f8',
+                        buffer=shm.buf, offset=length * 8)
+    df = pd.DataFrame({'timestamp': pd.to_datetime(timestamps.copy(), unit='ns')})
+    for row, column in enumerate(PRICE_COLUMNS):
+        df[column] = prices[row].copy()
+    # Release the views so the block can be closed
+    del timestamps, prices
+    return df
+
+
+def _warm_up():
+    """Runs once per worker so processes are forked before the first real request"""
+    return os.getpid()
+
+
+def _run_in_worker(analyze, shm_name, length, sample_data, args):
+    """Worker side: attach to the candle block, run the analysis, return payload and timings"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        df = read_candles(shm, length)
+    finally:
+        shm.close()
+    if sample_data:
+        df.attrs['sample_data'] = True
+
+    with metrics.collect_stage_timings() as timings:
+        payload = analyze(df, *args)
+    return payload, timings
+
+
+class DetectionExecutor:
+    """Runs analyze(df, *args) in worker processes with a bounded queue
+
+    analyze must be a module-level function (it is pickled by reference). With
+    processes=0 it runs on the calling thread and never rejects a submission.
+    """
+
+    def __init__(self, analyze, processes=DETECTION_PROCESSES, queue_size=DETECTION_QUEUE):
+        self.analyze = analyze
+        self.processes = processes
+        self.queue_size = queue_size
+        self.pool = None
+        self._slots = (threading.BoundedSemaphore(max(1, processes + queue_size))
+                       if processes > 0 else None)
+        self._average_seconds = 1.0  # running estimate used for Retry-After
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.processes > 0
+
+    def start(self):
+        """Create the pool and fork every worker up front; returns the pool"""
+        with self._lock:
+            if self.pool is not None or not self.enabled:
+                return self.pool
+            # Forked workers inherit the already imported app; spawned ones would
+            # re-import it (and open a new exchange connection each)
+            context = multiprocessing.get_context(
+                'fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+            # Workers must share the parent's resource tracker, or each would report
+            # the blocks the parent unlinks as leaked
+            resource_tracker.ensure_running()
+            pool = self.pool = ProcessPoolExecutor(max_workers=self.processes, mp_context=context)
+        pids = {pool.submit(_warm_up).result() for _ in range(self.processes)}
+        logger.info(f"Detection pool ready with {len(pids)} worker processes")
+        return pool
+
+    def shutdown(self):
+        with self._lock:
+            pool, self.pool = self.pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _discard(self, pool):
+        """Drop a pool that lost a worker; the next submit starts a new one"""
+        with self._lock:
+            if self.pool is not pool:
+                return  # Already replaced
+            self.pool = None
+        logger.error("A detection worker died; restarting the pool")
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _observe(self, elapsed):
+        self._average_seconds = 0.8 * self._average_seconds + 0.2 * elapsed
+
+    def retry_after(self):
+        """Seconds until a queued slot is likely to free up"""
+        if not self.enabled:
+            return max(1, math.ceil(self._average_seconds))
+        return max(1, math.ceil(self._average_seconds * self.queue_size / self.processes))
+
+    def submit(self, df, *args):
+        """Queue an analysis; returns a Future of the payload or raises Overloaded"""
+        if not self.enabled:
+            future = Future()
+            started = time.perf_counter()
+            try:
+                future.set_result((self.analyze(df, *args), []))
+            except Exception as e:
+                future.set_exception(e)
+            self._observe(time.perf_counter() - started)
+            return self._unwrap(future)
+
+        if not self._slots.acquire(blocking=False):
+            metrics.detection_rejections.inc()
+            raise Overloaded(self.retry_after())
+
+        shm = None
+        try:
+            shm = shared_memory.SharedMemory(
+                create=True, size=max(1, len(df) * 8 * (1 + len(PRICE_COLUMNS))))
+            write_candles(shm, df)
+            job = (_run_in_worker, self.analyze, shm.name, len(df),
+                   bool(df.attrs.get('sample_data')), args)
+            pool = self.start()
+            try:
+                future = pool.submit(*job)
+            except BrokenProcessPool:
+                self._discard(pool)
+                pool = self.start()
+                future = pool.submit(*job)
+            started = time.perf_counter()
+        except Exception:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+            self._slots.release()
+            raise
+
+        def _done(done):
+            shm.close()
+            shm.unlink()
+            self._slots.release()
+            self._observe(time.perf_counter() - started)
+            if not done.cancelled() and isinstance(done.exception(), BrokenProcessPool):
+                self._discard(pool)
+
+        future.add_done_callback(_done)
+        return self._unwrap(future)
+
+    @staticmethod
+    def _unwrap(future):
+        """Future of the payload alone, with the worker's timings in its stage_timings attribute"""
+        result = Future()
+
+        def _copy(done):
+            if done.cancelled():
+                result.cancel()
+            elif done.exception() is not None:
+                result.set_exception(done.exception())
+            else:
+                payload, timings = done.result()
+                result.stage_timings = timings
+                result.set_result(payload)
+
+        future.add_done_callback(_copy)
+        return result
+
+    def run(self, df, *args):
+        """Run an analysis and wait for it (records the worker's stage timings here)"""
+        future = self.submit(df, *args)
+        payload = future.result()
+        metrics.record_stage_timings(getattr(future, 'stage_timings', []))
+        return payload
@@ -0,0 +1,102 @@
+"""
+Hough Accumulator Trend Line Engine
+Finds trend lines by letting every swing point vote for the (slope, level) cells
+of the lines through it, instead of trying every pair of points. Only the most
+recent MAX_POINTS swing points vote over a fixed grid of SLOPE_BINS slopes, so
+the cost is bounded however long the history is. The best cells are refined
+with a least-squares fit through the points that voted for them.
+
+Lines come back in the same form as SwingLines.candidates (trendline_cache.py),
+so both engines share the record building and filtering in app.py.
+"""
+
+import numpy as np
+
+import trendline_cache
+
+MAX_POINTS = 256
+SLOPE_BINS = 256
+MAX_PEAKS = 32
+# A line spanning a quarter of the window moves at most four times the price range
+SLOPE_RANGE = 4.0
+
+
+def _votes(x, v, slopes, tolerance):
+    """Accumulator cells as (slope row, level bin) keys and their vote counts
+
+    Levels are relative prices at the first point, in bins one tolerance wide; a
+    cell's votes are those of its bin and the next, so a point within tolerance
+    of the cell's line is counted whichever bin it fell in.
+    """
+    levels = v[None, :] - slopes[:, None] * (x - x[0])[None, :]
+    bins = np.floor(levels / tolerance).astype(np.int64)
+    bins -= bins.min()
+    width = int(bins.max()) + 2  # Keeps bin + 1 of one row out of the next row
+    keys = (np.arange(len(slopes))[:, None] * width + bins).ravel()
+    cells, counts = np.unique(keys, return_counts=True)
+
+    following = np.minimum(np.searchsorted(cells, cells + 1), len(cells) - 1)
+    votes = counts + np.where(cells[following] == cells + 1, counts[following], 0)
+    return cells, votes, bins, width
+
+
+def find_lines(positions, prices, min_touches, tolerance=0.005, max_points=MAX_POINTS,
+               slope_bins=SLOPE_BINS, max_peaks=MAX_PEAKS):
+    """Trend lines through swing points at increasing positions
+
+    Returns the candidates dict of SwingLines.candidates: endpoint indices into
+    the points (first and last touching point), endpoint positions, line prices
+    there, touch counts, and the points that voted.
+    """
+    skip = max(0, len(positions) - max_points)
+    x = np.asarray(positions[skip:], dtype=np.float64)
+    y = np.asarray(prices[skip:], dtype=np.float64)
+    found = {name: [] for name in ('first', 'second', 'x1', 'x2', 'y1', 'y2', 'touches')}
+
+    if len(x) >= max(min_touches, 2) and x[-1] > x[0]:
+        # Relative prices, so a tolerance is the same bin width at any price level
+        scale = float(np.median(y))
+        v = y / scale
+        max_slope = SLOPE_RANGE * max(float(v.max() - v.min()), tolerance) / (x[-1] - x[0])
+        slopes = np.linspace(-max_slope, max_slope, slope_bins)
+        cells, votes, bins, width = _votes(x, v, slopes, tolerance)
+
+        seen = set()
+        for cell in cells[np.argsort(-votes, kind='stable')]:
+            if len(found['touches']) >= max_peaks:
+                break
+            row, level = divmod(int(cell), width)
+            members = np.flatnonzero((bins[row] == level) | (bins[row] == level + 1))
+            if len(members) < min_touches:
+                break  # Cells are in vote order, so no later one qualifies either
+            signature = members.tobytes()
+            if signature in seen:
+                continue  # Neighbouring cells often hold the same points
+            seen.add(signature)
+
+            # Refine through the cell's points, then count touches exactly
+            slope, intercept = np.polyfit(x[members], y[members], 1)
+            line_y = slope * x + intercept
+            touching = trendline_cache.touch_matrix(
+                x[:1], line_y[:1], x[-1:], line_y[-1:], x, y, tolerance)[0]
+            touch_index = np.flatnonzero(touching)
+            if len(touch_index) < min_touches:
+                continue
+            first, second = touch_index[0], touch_index[-1]
+            found['first'].append(first + skip)
+            found['second'].append(second + skip)
+            found['x1'].append(x[first])
+            found['x2'].append(x[second])
+            found['y1'].append(line_y[first])
+            found['y2'].append(line_y[second])
+            found['touches'].append(len(touch_index))
+
+    result = {name: np.asarray(values, dtype=np.int64 if name in ('first', 'second', 'touches')
+                               else np.float64)
+              for name, values in found.items()}
+    result.update({
+        'points_x': x,
+        'points_y': y,
+        'tolerance': tolerance
+    })
+    return result
@@ -0,0 +1,150 @@
+"""
+HTTP Response Caching and Compression
+Keeps finished response bodies in an in-process LRU cache, compressed once with
+gzip (and brotli when installed) when they are stored, and answers conditional
+GETs with 304 Not Modified using strong ETags.
+"""
+
+import gzip
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional, gzip is always available
+    brotli = None
+
+# Bodies smaller than this are sent as-is; compressing them saves less than the headers cost
+COMPRESSION_THRESHOLD = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Clients may keep responses but must revalidate them with If-None-Match before reuse
+CACHE_CONTROL = 'private, no-cache'
+
+IDENTITY = 'identity'
+
+
+def make_etag(*parts):
+    """Strong ETag (quoted) derived from the values that identify a response"""
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8'))
+    return f'"{digest.hexdigest()}"'
+
+
+def coded_etag(etag, coding):
+    """ETag of one content coding of a response; each coding is its own representation"""
+    if coding == IDENTITY:
+        return etag
+    return f'{etag[:-1]}-{coding}"'
+
+
+def compress(body):
+    """Compressed variants of a body keyed by content coding, always including identity"""
+    variants = {IDENTITY: body}
+    if len(body) < COMPRESSION_THRESHOLD:
+        return variants
+    # mtime=0 keeps the gzip bytes identical for identical bodies
+    variants['gzip'] = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    if brotli is not None:
+        variants['br'] = brotli.compress(body, quality=BROTLI_QUALITY)
+    return variants
+
+
+def negotiate_coding(accept_encodings, available):
+    """Pick the content coding for a request from its Accept-Encoding header"""
+    offered = [coding for coding in ('br', 'gzip') if coding in available]
+    return accept_encodings.best_match(offered, default=IDENTITY) or IDENTITY
+
+
+def is_not_modified(request, etag):
+    """Whether the request's If-None-Match already covers any coding of this ETag"""
+    if_none_match = request.if_none_match
+    if not if_none_match:
+        return False
+    if if_none_match.star_tag:
+        return True
+    return any(if_none_match.contains(coded_etag(etag, coding).strip('"'))
+               for coding in (IDENTITY, 'gzip', 'br'))
+
+
+def not_modified_response(etag):
+    """Empty 304 response carrying the validator and caching headers"""
+    response = Response(status=304)
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+class CachedResponse:
+    """A finished response body with its precompressed variants and ETag
+
+    version optionally records what the body was built from, so callers can tell
+    when it needs rebuilding.
+    """
+
+    def __init__(self, body, mimetype, etag, expires_at=None, version=None):
+        self.mimetype = mimetype
+        self.etag = etag
+        self.expires_at = expires_at
+        self.version = version
+        self.bodies = compress(body)
+
+    def expired(self, now=None):
+        if self.expires_at is None:
+            return False
+        return (time.time() if now is None else now) >= self.expires_at
+
+    def to_response(self, request):
+        """Serve the variant the request accepts, or 304 if the client already has it"""
+        coding = negotiate_coding(request.accept_encodings, self.bodies)
+        etag = coded_etag(self.etag, coding)
+        if is_not_modified(request, self.etag):
+            return not_modified_response(etag)
+
+        response = Response(self.bodies[coding], mimetype=self.mimetype)
+        if coding != IDENTITY:
+            response.headers['Content-Encoding'] = coding
+        response.headers['ETag'] = etag
+        response.headers['Cache-Control'] = CACHE_CONTROL
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+class ResponseCache:
+    """Thread-safe LRU cache of CachedResponse entries that drops them once expired"""
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expired():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
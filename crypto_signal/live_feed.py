@@ -0,0 +1,364 @@
+"""
+Live Chart Updates over Server-Sent Events
+One background poller per symbol/timeframe pair fetches the latest candles and
+fans incremental events out to every subscribed stream: the forming candle,
+newly closed candles, new Order Blocks and BOS markers (detection re-runs only
+when a candle closes) and changes in trading signal status. Streams can be
+consumed by a WSGI thread or by an event loop (asgi.py), and the number open at
+once per process is capped.
+"""
+
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+
+import ccxt
+import pandas as pd
+
+import metrics
+from serialization import dumps_str
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = float(os.getenv('LIVE_POLL_SECONDS', '5'))
+HEARTBEAT_INTERVAL = 15  # seconds between keep-alive comments on idle streams
+RETRY_MS = 5000  # reconnect delay suggested to EventSource clients
+HISTORY = 500  # candles kept per pair for detection
+SUBSCRIBER_QUEUE_SIZE = 256
+# Open streams per process. Under Gunicorn every stream holds one of the worker's
+# threads, so this stays well below --threads (asgi.py raises it, see there)
+MAX_STREAMS = int(os.getenv('LIVE_MAX_STREAMS', '8'))
+
+CANDLE_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+
+def format_event(event, data, event_id=None):
+    """Frame one Server-Sent Event with a JSON data line"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append(f'data: {dumps_str(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+class StreamLimitReached(Exception):
+    """Too many streams are open in this process; retry after retry_after seconds"""
+
+    def __init__(self, limit, retry_after=RETRY_MS // 1000):
+        super().__init__(f'Too many live streams open ({limit}), please retry shortly')
+        self.retry_after = retry_after
+
+
+class LoopQueue(queue.Queue):
+    """Subscriber queue that wakes an event loop when a message arrives
+
+    The feed's poller thread fills it as usual; the loop waits on ready instead of
+    blocking a thread in get().
+    """
+
+    def __init__(self, loop, maxsize=SUBSCRIBER_QUEUE_SIZE):
+        super().__init__(maxsize)
+        self.loop = loop
+        self.ready = asyncio.Event()
+
+    def _put(self, item):
+        super()._put(item)
+        try:
+            self.loop.call_soon_threadsafe(self.ready.set)
+        except RuntimeError:
+            pass  # Loop closed: the stream is going away
+
+
+def _epoch_ms(timestamp):
+    return int(pd.Timestamp(timestamp).value // 1_000_000)
+
+
+def _candle_record(row):
+    return {
+        'timestamp': _epoch_ms(row['timestamp']),
+        'open': float(row['open']),
+        'high': float(row['high']),
+        'low': float(row['low']),
+        'close': float(row['close']),
+        'volume': float(row['volume'])
+    }
+
+
+class PairFeed:
+    """Polls one symbol/timeframe pair while it has subscribers"""
+
+    def __init__(self, detector, symbol, timeframe, poll_interval=POLL_INTERVAL, history=HISTORY):
+        self.detector = detector
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.timeframe_ms = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+        self.poll_interval = poll_interval
+        self.history = history
+
+        self.df = None  # Analyzed candles (detection columns included)
+        self.order_blocks = set()
+        self.bos = set()
+        self.signals = None
+        self.live = None
+
+        self._subscribers = set()
+        self._next_id = 1
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def subscribe(self, subscriber=None):
+        """Register a stream's queue; starts the poller if it is not running"""
+        if subscriber is None:
+            subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            # Late joiners get the current signal status straight away
+            if self.signals is not None:
+                subscriber.put_nowait(format_event('signal', {'signals': self.signals}))
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name=f'live-{self.symbol}-{self.timeframe}', daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        """Remove a stream; returns the number of streams left"""
+        with self._lock:
+            self._subscribers.discard(subscriber)
+            return len(self._subscribers)
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event, data):
+        """Send an event to every subscriber"""
+        metrics.live_events.inc(event=event)
+        with self._lock:
+            message = format_event(event, data, self._next_id)
+            self._next_id += 1
+            for subscriber in self._subscribers:
+                try:
+                    subscriber.put_nowait(message)
+                except queue.Full:
+                    # The client fell too far behind: drop its backlog and have it reload
+                    while not subscriber.empty():
+                        subscriber.get_nowait()
+                    subscriber.put_nowait(format_event('resync', {}))
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    # Stop, and start from a fresh snapshot next time
+                    self._thread = None
+                    self.df = None
+                    return
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Live feed poll failed for {self.symbol} {self.timeframe}: {e}")
+            time.sleep(self.poll_interval)
+
+    def _set_live(self, live):
+        if live != self.live:
+            self.live = live
+            self.publish('status', {'live': live})
+
+    def poll(self):
+        """Fetch the newest candles and publish whatever changed since the last poll"""
+        if self.df is None:
+            df = self.detector.fetch_ohlcv_data(self.symbol, self.timeframe, limit=self.history)
+            if df is None:
+                return
+            self._set_live(not df.attrs.get('sample_data', False))
+            self._analyze(df, publish=False)
+            return
+
+        last_timestamp = self.df['timestamp'].iloc[-1]
+        missed = int((time.time() * 1000 - _epoch_ms(last_timestamp)) // self.timeframe_ms)
+        recent = self.detector.fetch_ohlcv_data(
+            self.symbol, self.timeframe, limit=min(self.history, missed + 2))
+        if recent is None:
+            return
+        # Generated sample data has nothing live to stream
+        self._set_live(not recent.attrs.get('sample_data', False))
+        if not self.live:
+            return
+
+        if recent['timestamp'].iloc[0] > last_timestamp:
+            # No overlap with what the clients have: start over from a fresh snapshot
+            self.df = None
+            self.publish('resync', {})
+            return
+
+        fresh = recent[recent['timestamp'] >= last_timestamp]
+        current = self.df.iloc[-1]
+        changed = [row for _, row in fresh.iterrows()
+                   if row['timestamp'] > last_timestamp or
+                   any(row[column] != current[column] for column in CANDLE_COLUMNS[1:])]
+        if not changed:
+            return
+
+        for row in changed:
+            self.publish('candle', _candle_record(row))
+
+        if fresh['timestamp'].iloc[-1] > last_timestamp:
+            # A candle closed: re-run detection over the updated history
+            candles = pd.concat([self.df.loc[self.df['timestamp'] < last_timestamp, CANDLE_COLUMNS],
+                                 fresh[CANDLE_COLUMNS]], ignore_index=True)
+            self._analyze(candles.tail(self.history).reset_index(drop=True), publish=True)
+        else:
+            # Only the forming candle moved: detection results stand, signal status may not
+            for column in CANDLE_COLUMNS[1:]:
+                self.df.iat[-1, self.df.columns.get_loc(column)] = fresh[column].iloc[-1]
+            self._update_signals(publish=True)
+
+    def _analyze(self, df, publish):
+        """Run detection and publish the Order Blocks and BOS markers not seen before"""
+        df = self.detector.find_swing_highs_lows(df)
+        df = self.detector.detect_break_of_structure(df)
+        df = self.detector.detect_order_blocks(df)
+        self.df = df
+
+        timestamps = [_epoch_ms(value) for value in df['timestamp']]
+        last_idx = len(df) - 1
+
+        order_blocks = {}
+        for ob_type in ('bullish', 'bearish'):
+            for idx in df.index[df[f'{ob_type}_ob']]:
+                order_blocks[(ob_type, timestamps[idx])] = {
+                    'type': ob_type,
+                    'x0': timestamps[idx],
+                    'x1': timestamps[min(idx + 20, last_idx)],
+                    'low': float(df['ob_low'].iat[idx]),
+                    'high': float(df['ob_high'].iat[idx])
+                }
+
+        bos = {}
+        for bos_type, price_col in (('bullish', 'high'), ('bearish', 'low')):
+            for idx in df.index[df[f'{bos_type}_bos']]:
+                bos[(bos_type, timestamps[idx])] = {
+                    'type': bos_type,
+                    'x': timestamps[idx],
+                    'price': float(df[price_col].iat[idx])
+                }
+
+        if publish:
+            for key in sorted(order_blocks.keys() - self.order_blocks, key=lambda k: k[1]):
+                self.publish('order_block', order_blocks[key])
+            for key in sorted(bos.keys() - self.bos, key=lambda k: k[1]):
+                self.publish('bos', bos[key])
+        self.order_blocks = set(order_blocks)
+        self.bos = set(bos)
+
+        self._update_signals(publish)
+
+    def _update_signals(self, publish):
+        signals = self.detector.generate_trading_signals(self.df)
+        if signals != self.signals:
+            self.signals = signals
+            if publish:
+                self.publish('signal', {'signals': signals})
+
+
+class Subscription:
+    """One stream on a PairFeed, iterated for its SSE messages
+
+    Plain iteration blocks a thread (WSGI); messages() is the event loop version
+    for a LoopQueue. close() gives the stream's slot back and is safe to call
+    more than once, also before iteration started.
+    """
+
+    def __init__(self, hub, feed, subscriber):
+        self.hub = hub
+        self.feed = feed
+        self.subscriber = subscriber
+        self.closed = False
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.hub._release(self)
+
+    def __iter__(self):
+        try:
+            yield f'retry: {RETRY_MS}\n\n'
+            while True:
+                try:
+                    yield self.subscriber.get(timeout=HEARTBEAT_INTERVAL)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+        finally:
+            self.close()
+
+    async def messages(self):
+        try:
+            yield f'retry: {RETRY_MS}\n\n'
+            while True:
+                try:
+                    yield self.subscriber.get_nowait()
+                    continue
+                except queue.Empty:
+                    self.subscriber.ready.clear()
+                if not self.subscriber.empty():
+                    continue  # Arrived between get_nowait() and clear()
+                try:
+                    await asyncio.wait_for(self.subscriber.ready.wait(), HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+        finally:
+            self.close()
+
+
+class LiveFeedHub:
+    """Shares one PairFeed per symbol/timeframe between all streams
+
+    A feed is dropped when its last stream closes; past max_streams open streams,
+    subscribe() raises StreamLimitReached.
+    """
+
+    def __init__(self, detector, poll_interval=POLL_INTERVAL, max_streams=MAX_STREAMS):
+        self.detector = detector
+        self.poll_interval = poll_interval
+        self.max_streams = max_streams
+        self._feeds = {}
+        self._open = 0
+        self._lock = threading.Lock()
+
+    @property
+    def open_streams(self):
+        with self._lock:
+            return self._open
+
+    def subscribe(self, symbol, timeframe, subscriber=None):
+        """Open a stream (a Subscription) on the pair's feed, creating the feed if needed"""
+        with self._lock:
+            if self._open >= self.max_streams:
+                metrics.live_stream_rejections.inc()
+                raise StreamLimitReached(self.max_streams)
+            feed = self._feeds.get((symbol, timeframe))
+            if feed is None:
+                feed = PairFeed(self.detector, symbol, timeframe, self.poll_interval)
+                self._feeds[(symbol, timeframe)] = feed
+            subscription = Subscription(self, feed, feed.subscribe(subscriber))
+            self._open += 1
+            return subscription
+
+    def _release(self, subscription):
+        feed = subscription.feed
+        with self._lock:
+            self._open -= 1
+            if (feed.unsubscribe(subscription.subscriber) == 0 and
+                    self._feeds.get((feed.symbol, feed.timeframe)) is feed):
+                # Its poller stops on its own once it sees no subscribers
+                del self._feeds[(feed.symbol, feed.timeframe)]
+
+    def stream(self, symbol, timeframe):
+        """Iterable of SSE messages for one client (see Subscription)"""
+        return self.subscribe(symbol, timeframe)
@@ -0,0 +1,289 @@
+"""
+Lightweight Metrics for the Crypto Analysis App
+In-process counters and histograms rendered in the Prometheus text format,
+plus per-request stage timings exposed through the Server-Timing header.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+
+# Stage timings collected outside a request (e.g. in a detection worker process)
+_collected = threading.local()
+
+# Latency buckets in seconds, from fast in-memory stages up to slow exchange calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(labelnames, values, extra=None):
+    """Render a label set as {name="value",...}"""
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    rendered = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs)
+    return '{' + rendered + '}'
+
+
+def _format_value(value):
+    """Render a sample value the way Prometheus expects"""
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        """Increase the counter for the given label values"""
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        """Current value for the given label values"""
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def render(self):
+        """Render the counter in Prometheus text format"""
+        lines = [f'# HELP {self.name} {self.documentation}',
+                 f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(
+                    f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    """Cumulative histogram with optional labels"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        """Record one observation (in seconds for latency histograms)"""
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = {'buckets': [0] * len(self.buckets),
+                          'sum': 0.0, 'count': 0}
+                self._values[key] = series
+
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        """Render the histogram in Prometheus text format"""
+        lines = [f'# HELP {self.name} {self.documentation}',
+                 f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, series in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, series['buckets']):
+                    labels = _format_labels(
+                        self.labelnames, key, ('le', _format_value(bound)))
+                    lines.append(f'{self.name}_bucket{labels} {count}')
+                labels = _format_labels(self.labelnames, key)
+                lines.append(
+                    f'{self.name}_sum{labels} {_format_value(series["sum"])}')
+                lines.append(f'{self.name}_count{labels} {series["count"]}')
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together at /metrics"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Render every registered metric in Prometheus text format"""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics)
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+# HTTP layer
+http_requests = registry.counter(
+    'http_requests_total', 'HTTP requests handled', ('endpoint', 'method', 'status'))
+http_request_seconds = registry.histogram(
+    'http_request_duration_seconds', 'HTTP request latency', ('endpoint',))
+
+# Analysis pipeline
+stage_seconds = registry.histogram(
+    'analysis_stage_duration_seconds', 'Time spent in each analysis pipeline stage', ('stage',))
+
+# Exchange client
+exchange_requests = registry.counter(
+    'exchange_requests_total', 'Calls made to the exchange API', ('method', 'outcome'))
+exchange_request_seconds = registry.histogram(
+    'exchange_request_duration_seconds', 'Exchange API call latency', ('method',))
+sample_data_fallbacks = registry.counter(
+    'sample_data_fallbacks_total', 'Requests answered with generated sample data')
+cache_requests = registry.counter(
+    'cache_requests_total', 'Cache lookups by cache and result', ('cache', 'result'))
+
+# Background precompute
+precompute_runs = registry.counter(
+    'precompute_runs_total', 'Background refreshes of popular pairs', ('outcome',))
+precompute_seconds = registry.histogram(
+    'precompute_duration_seconds', 'Time to refresh one popular pair')
+
+# Detection process pool
+detection_rejections = registry.counter(
+    'detection_rejections_total', 'Analyses rejected because the detection queue was full')
+
+# User activity log
+activity_records = registry.counter(
+    'activity_log_records_total', 'User activity records by outcome', ('outcome',))
+
+# Live updates
+live_events = registry.counter(
+    'live_events_total', 'Events published to live chart streams', ('event',))
+live_stream_rejections = registry.counter(
+    'live_stream_rejections_total', 'Live streams refused because the per-process limit was reached')
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+@contextmanager
+def timed_stage(stage):
+    """Time a pipeline stage into the stage histogram and the current request's breakdown"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_seconds.observe(elapsed, stage=stage)
+        if has_request_context():
+            timings = g.setdefault('stage_timings', [])
+            timings.append((stage, elapsed))
+        collected = getattr(_collected, 'timings', None)
+        if collected is not None:
+            collected.append((stage, elapsed))
+
+
+@contextmanager
+def collect_stage_timings():
+    """Collect the (stage, seconds) pairs timed in this thread into the yielded list
+
+    Used in worker processes, whose own metrics are never scraped, to send the
+    timings back for record_stage_timings in the serving process.
+    """
+    timings = []
+    _collected.timings = timings
+    try:
+        yield timings
+    finally:
+        _collected.timings = None
+
+
+def record_stage_timings(timings):
+    """Record stage timings measured elsewhere as if they had been timed here"""
+    for stage, elapsed in timings:
+        stage_seconds.observe(elapsed, stage=stage)
+    if has_request_context():
+        g.setdefault('stage_timings', []).extend(timings)
+
+
+def record_cache_lookup(cache, hit):
+    """Count a cache hit or miss"""
+    cache_requests.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def _timing_requested():
+    """Server-Timing is sent when enabled globally or asked for with an X-Timing request header"""
+    if os.getenv('SERVER_TIMING', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return request.headers.get('X-Timing', '').lower() in ('1', 'true', 'yes')
+
+
+def format_server_timing(timings, total):
+    """Build a Server-Timing header value from (stage, seconds) pairs"""
+    entries = [f'{stage};dur={elapsed * 1000:.1f}' for stage,
+               elapsed in timings]
+    entries.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(entries)
+
+
+def init_app(app):
+    """Register request hooks that record HTTP metrics and the Server-Timing header"""
+
+    @app.before_request
+    def _start_timer():
+        g.request_started = time.perf_counter()
+        g.stage_timings = []
+
+    @app.after_request
+    def _record_request(response):
+        started = g.get('request_started')
+        if started is None:
+            return response
+
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint or 'unknown'
+        http_requests.inc(endpoint=endpoint, method=request.method,
+                          status=response.status_code)
+        http_request_seconds.observe(elapsed, endpoint=endpoint)
+
+        if _timing_requested():
+            response.headers['Server-Timing'] = format_server_timing(
+                g.get('stage_timings', []), elapsed)
+        return response
+
+    return app
@@ -0,0 +1,126 @@
+"""
+Binary Encodings for OHLCV Candle Arrays
+Encodes the candle columns of the /api/analyze chart data either as base64
+little-endian Float64 blobs inside the JSON response, or as an Apache Arrow
+IPC stream when pyarrow is installed.
+"""
+
+import base64
+import json
+
+import numpy as np
+
+from serialization import dumps_str
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow transport is optional
+    pa = None
+
+CANDLE_COLUMNS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+# Media types negotiated through the Accept header
+JSON_MEDIA_TYPE = 'application/json'
+TYPED_ARRAY_MEDIA_TYPE = 'application/vnd.ohlcv.f64+json'
+ARROW_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+
+# Value of chart_data['encoding'] for each representation
+ENCODING_LISTS = 'json'
+ENCODING_F64_BASE64 = 'f64-base64'
+
+
+def arrow_available():
+    """Whether the optional pyarrow dependency is installed"""
+    return pa is not None
+
+
+def negotiate_encoding(accept_mimetypes):
+    """Pick the candle transport for a request from its Accept header
+
+    Takes werkzeug's request.accept_mimetypes and returns one of the media type
+    constants above; Arrow is only offered when pyarrow is installed.
+    """
+    offered = [TYPED_ARRAY_MEDIA_TYPE, JSON_MEDIA_TYPE]
+    if arrow_available():
+        offered.insert(0, ARROW_MEDIA_TYPE)
+
+    # Only switch away from plain JSON when the client explicitly asks for it
+    best = accept_mimetypes.best_match(offered, default=JSON_MEDIA_TYPE)
+    if best != JSON_MEDIA_TYPE and accept_mimetypes[best] <= accept_mimetypes[JSON_MEDIA_TYPE]:
+        return JSON_MEDIA_TYPE
+    return best
+
+
+def encode_f64(values):
+    """Encode a sequence of numbers as base64 of little-endian float64 bytes"""
+    array = np.ascontiguousarray(values, dtype='<f8')
+    return base64.b64encode(array.tobytes()).decode('ascii')
+
+
+def decode_f64(data):
+    """Decode a base64 float64 blob back into a NumPy array"""
+    return np.frombuffer(base64.b64decode(data), dtype='<f8')
+
+
+def encode_candles_f64(candles):
+    """Replace candle column lists with {dtype, bdata} base64 Float64 blobs
+
+    The {dtype, bdata} shape is the one Plotly uses for typed arrays, and the page
+    decodes each blob straight into a Float64Array.
+    """
+    return {column: {'dtype': 'f8', 'bdata': encode_f64(values)}
+            for column, values in candles.items()}
+
+
+def apply_typed_arrays(payload):
+    """Switch the chart data of an /api/analyze payload to base64 typed arrays"""
+    chart_data = payload.get('chart_data')
+    if chart_data is None or chart_data.get('encoding') == ENCODING_F64_BASE64:
+        return payload
+
+    chart_data = dict(chart_data)
+    chart_data['candles'] = encode_candles_f64(chart_data['candles'])
+    chart_data['encoding'] = ENCODING_F64_BASE64
+    return dict(payload, chart_data=chart_data)
+
+
+def encode_arrow_stream(payload):
+    """Encode an /api/analyze payload as an Arrow IPC stream
+
+    The candles become a record batch with one float64 column each (timestamps as
+    int64 epoch milliseconds); everything else in the payload travels as JSON in
+    the schema metadata under the 'analysis' key.
+    """
+    if pa is None:
+        raise RuntimeError('pyarrow is not installed')
+
+    chart_data = dict(payload['chart_data'])
+    candles = chart_data.pop('candles')
+    rest = dict(payload, chart_data=chart_data)
+
+    arrays = [pa.array(np.asarray(candles['timestamp'], dtype='int64'))]
+    arrays += [pa.array(np.asarray(candles[column], dtype='float64'))
+               for column in CANDLE_COLUMNS[1:]]
+    schema = pa.schema(
+        [pa.field('timestamp', pa.int64())] +
+        [pa.field(column, pa.float64()) for column in CANDLE_COLUMNS[1:]],
+        metadata={'analysis': dumps_str(rest)})
+    batch = pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+def decode_arrow_stream(data):
+    """Decode an Arrow IPC stream produced by encode_arrow_stream back into a payload"""
+    if pa is None:
+        raise RuntimeError('pyarrow is not installed')
+
+    reader = pa.ipc.open_stream(data)
+    table = reader.read_all()
+    payload = json.loads(table.schema.metadata[b'analysis'])
+    payload['chart_data']['candles'] = {
+        column: table.column(column).to_pylist() for column in CANDLE_COLUMNS}
+    return payload
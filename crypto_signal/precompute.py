@@ -0,0 +1,257 @@
+"""
+Background Precompute for Popular Symbol/Timeframe Pairs
+Ranks pairs by how often users analyze them in the activity log and refreshes
+the top N right after each candle close, so /api/analyze for those pairs is a
+cache read. Refreshes run on a small thread pool and draw from a request budget
+that caps their share of the exchange rate limit.
+
+Cached analyses cover the candles that closed; FormingCandles keeps the latest
+forming candle of each pair, refreshed in the background, so responses served
+from the cache can carry the current price without a fetch on the request path.
+"""
+
+import heapq
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import ccxt
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+TOP_N = int(os.getenv('PRECOMPUTE_TOP_N', '10'))  # 0 disables precomputing
+CONCURRENCY = int(os.getenv('PRECOMPUTE_CONCURRENCY', '2'))
+# Exchange requests per minute precomputing may spend (Binance allows 1200 in total)
+REQUESTS_PER_MINUTE = float(os.getenv('PRECOMPUTE_REQUESTS_PER_MINUTE', '120'))
+
+CLOSE_DELAY = 2  # seconds after a candle closes, so the exchange has published it
+HOT_PAIRS_INTERVAL = 600  # seconds between re-ranking pairs from the activity log
+# Age after which a pair's forming candle is fetched again (in the background)
+FORMING_CANDLE_SECONDS = float(os.getenv('FORMING_CANDLE_SECONDS', '5'))
+
+
+def next_refresh(timeframe_ms, now=None):
+    """When to refresh a pair next: shortly after the current candle closes"""
+    now_ms = int((time.time() if now is None else now) * 1000)
+    close_ms = now_ms - now_ms % timeframe_ms + timeframe_ms
+    return close_ms / 1000 + CLOSE_DELAY
+
+
+class RateBudget:
+    """Token bucket that hands out exchange requests at a fixed rate per minute"""
+
+    def __init__(self, requests_per_minute):
+        self.rate = requests_per_minute / 60
+        # Allow short bursts of up to ten seconds' worth of requests
+        self.capacity = max(1.0, self.rate * 10)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def charge(self, cost):
+        """Spend requests already made; the debt delays later acquires"""
+        with self._lock:
+            self.tokens -= cost
+
+    def acquire(self, cost=1):
+        """Block until cost requests fit in the budget, then spend them"""
+        cost = min(cost, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= cost:
+                    self.tokens -= cost
+                    return
+                wait = (cost - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class PrecomputeScheduler:
+    """Keeps the most analyzed pairs fresh with a background refresh loop
+
+    refresh(symbol, timeframe) does the work (fetch, analyze, cache) and costs
+    about requests_per_refresh exchange requests; hot_pairs(top_n) returns the most
+    analyzed (symbol, timeframe) pairs from the activity log. With count_requests
+    (exchange requests made so far by the calling thread) the budget is charged the
+    requests a refresh really made, retries and pages included.
+    """
+
+    def __init__(self, refresh, hot_pairs, top_n=TOP_N, concurrency=CONCURRENCY,
+                 requests_per_minute=REQUESTS_PER_MINUTE, requests_per_refresh=1,
+                 count_requests=None):
+        self.refresh = refresh
+        self.hot_pairs = hot_pairs
+        self.top_n = top_n
+        self.concurrency = concurrency
+        self.budget = RateBudget(requests_per_minute)
+        self.requests_per_refresh = requests_per_refresh
+        self.count_requests = count_requests
+
+        self.pairs = []
+        self._running = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return self.top_n > 0 and self.concurrency > 0
+
+    def start(self):
+        """Start the refresh loop in a daemon thread (once)"""
+        with self._lock:
+            if not self.enabled or self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='precompute', daemon=True)
+            self._thread.start()
+        logger.info(f"Precomputing the top {self.top_n} pairs with {self.concurrency} workers")
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join()
+
+    def _rank_pairs(self):
+        """Re-read the activity log; returns the pairs that just became hot"""
+        try:
+            pairs = self.hot_pairs(self.top_n)
+        except Exception as e:
+            logger.error(f"Failed to rank pairs for precompute: {e}")
+            return []
+
+        valid = []
+        for symbol, timeframe in pairs:
+            try:
+                ccxt.Exchange.parse_timeframe(timeframe)
+            except Exception:
+                continue
+            valid.append((symbol, timeframe))
+
+        added = [pair for pair in valid if pair not in self.pairs]
+        self.pairs = valid
+        return added
+
+    def _run(self):
+        schedule = []  # heap of (due time, symbol, timeframe)
+        next_ranking = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency,
+                                thread_name_prefix='precompute') as executor:
+            while not self._stop.is_set():
+                now = time.time()
+                if now >= next_ranking:
+                    for pair in self._rank_pairs():
+                        heapq.heappush(schedule, (now, *pair))
+                    next_ranking = now + HOT_PAIRS_INTERVAL
+
+                while schedule and schedule[0][0] <= now:
+                    _, symbol, timeframe = heapq.heappop(schedule)
+                    if (symbol, timeframe) not in self.pairs:
+                        continue  # No longer popular
+
+                    timeframe_ms = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+                    heapq.heappush(schedule, (next_refresh(timeframe_ms, now), symbol, timeframe))
+                    with self._lock:
+                        if (symbol, timeframe) in self._running:
+                            continue  # Previous refresh still going; catch the next candle
+                        self._running.add((symbol, timeframe))
+                    executor.submit(self._refresh_pair, symbol, timeframe)
+
+                wake = min([next_ranking] + [item[0] for item in schedule[:1]])
+                self._stop.wait(max(0.0, wake - time.time()))
+
+    def _refresh_pair(self, symbol, timeframe):
+        requests_before = self.count_requests() if self.count_requests else None
+        try:
+            self.budget.acquire(self.requests_per_refresh)
+            with metrics.precompute_seconds.time():
+                self.refresh(symbol, timeframe)
+            metrics.precompute_runs.inc(outcome='ok')
+            logger.info(f"Precomputed {symbol} {timeframe}")
+        except Exception as e:
+            metrics.precompute_runs.inc(outcome='error')
+            logger.error(f"Precompute failed for {symbol} {timeframe}: {e}")
+        finally:
+            if requests_before is not None:
+                extra = self.count_requests() - requests_before - self.requests_per_refresh
+                if extra:  # Negative when the refresh had nothing to fetch
+                    self.budget.charge(extra)
+            with self._lock:
+                self._running.discard((symbol, timeframe))
+
+
+def forming_candle(df):
+    """The last (still forming) candle of a frame: (open time ms, open, high, low, close, volume)"""
+    last = df.iloc[-1]
+    return (int(last['timestamp'].value // 1_000_000),
+            *(float(last[column]) for column in ('open', 'high', 'low', 'close', 'volume')))
+
+
+class FormingCandles:
+    """Latest forming candle per (symbol, timeframe)
+
+    Every fetch records its last candle. get() never blocks on the exchange: once
+    a pair's candle is older than max_age it returns the one it has and schedules
+    a refresh on a background thread, so the next request sees a fresh price.
+    fetch(symbol, timeframe, limit) returns a frame of candles or None.
+    """
+
+    def __init__(self, fetch, max_age=FORMING_CANDLE_SECONDS, workers=2):
+        self.fetch = fetch
+        self.max_age = max_age
+        self._candles = {}  # (symbol, timeframe) -> (candle, recorded at)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='forming-candle')
+
+    def record(self, symbol, timeframe, df):
+        """Remember the last candle of a fetched frame (sample data is ignored)"""
+        if df is None or not len(df) or df.attrs.get('sample_data'):
+            return
+        candle = forming_candle(df)
+        with self._lock:
+            known = self._candles.get((symbol, timeframe))
+            if known is None or known[0][0] <= candle[0]:  # Never go back to an older candle
+                self._candles[(symbol, timeframe)] = (candle, time.time())
+
+    def get(self, symbol, timeframe):
+        """The latest known forming candle, or None; refreshes stale ones in the background"""
+        with self._lock:
+            known = self._candles.get((symbol, timeframe))
+            stale = known is None or time.time() - known[1] >= self.max_age
+            if stale and (symbol, timeframe) not in self._refreshing:
+                self._refreshing.add((symbol, timeframe))
+                self._pool.submit(self.refresh, symbol, timeframe)
+        return known[0] if known is not None else None
+
+    def refresh(self, symbol, timeframe):
+        """Fetch the pair's newest candles and record the forming one"""
+        try:
+            self.record(symbol, timeframe, self.fetch(symbol, timeframe, limit=2))
+        except Exception as e:
+            logger.error(f"Forming candle refresh failed for {symbol} {timeframe}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard((symbol, timeframe))
+
+    def clear(self):
+        with self._lock:
+            self._candles.clear()
+
+
+def init_app(app, scheduler):
+    """Start the scheduler with the first request rather than at import time"""
+
+    @app.before_request
+    def _start_precompute():
+        scheduler.start()
+
+    return app
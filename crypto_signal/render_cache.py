@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Content-Addressed Render Cache for Standalone Charts
+Chart pages and chart.png exports are stored under a hash of everything that
+determines them: the candle arrays, the render options (view, symbol,
+timeframe, theme, Plotly.js source), the plotly package version and the source
+of the detection and chart code. Rendering the same inputs again, also after a
+restart, reuses the stored files instead of running detection and building the
+figure; least recently used entries are evicted once the cache grows past its
+size budget. Pages of generated sample data are never stored.
+
+Usage:
+    python render_cache.py stats
+    python render_cache.py evict --max-bytes 100000000
+    python render_cache.py clear
+"""
+
+import argparse
+import functools
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+import plotly
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.getenv('RENDER_CACHE_DIR', os.path.join(BASE_DIR, 'render_cache'))
+MAX_BYTES = int(os.getenv('RENDER_CACHE_BYTES', 512 * 1024 * 1024))
+
+PRICE_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+# Code that shapes a rendered page; editing any of it invalidates the cache
+RENDERER_SOURCES = ('app.py', 'chart_viewer.py', 'advanced_chart_viewer.py',
+                    'trendline_cache.py', 'hough_lines.py')
+
+
+@functools.lru_cache(maxsize=1)
+def renderer_digest():
+    """Hash of the renderer source files"""
+    digest = hashlib.sha256()
+    for name in RENDERER_SOURCES:
+        path = os.path.join(BASE_DIR, name)
+        if os.path.exists(path):
+            with open(path, 'rb') as file:
+                digest.update(file.read())
+    return digest.hexdigest()
+
+
+def render_key(df, **options):
+    """Cache key of a page rendered from these candles with these options"""
+    options = dict(options, plotly_version=plotly.__version__)
+    digest = hashlib.sha256(renderer_digest().encode())
+    digest.update(json.dumps(options, sort_keys=True, default=str).encode())
+    digest.update(df['timestamp'].to_numpy(dtype='datetime64[ns]').astype('<i8').tobytes())
+    for column in PRICE_COLUMNS:
+        digest.update(np.ascontiguousarray(df[column].to_numpy(dtype='<f8')).tobytes())
+    return digest.hexdigest()
+
+
+def write_uncached(data, suffix='.html'):
+    """Write a page that must not be cached (e.g. of sample data) to a temporary file"""
+    with tempfile.NamedTemporaryFile(mode='w', suffix=suffix, delete=False,
+                                     encoding='utf-8') as file:
+        file.write(data)
+    return file.name
+
+
+class RenderCache:
+    """Files per key (page.html, summary.json, chart.png, ...) under a size budget
+
+    Entries are directories named by key; an entry's modification time is its
+    last use. Several processes may share one cache directory: files are written
+    atomically and eviction tolerates entries disappearing underneath it.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._bytes = None  # Known total, scanned on first write
+        self._lock = threading.Lock()
+
+    def _entry(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key, name):
+        """Path of a cached file, or None; a hit marks the entry as recently used"""
+        path = os.path.join(self._entry(key), name)
+        hit = os.path.exists(path)
+        metrics.record_cache_lookup('render', hit)
+        if not hit:
+            return None
+        try:
+            os.utime(self._entry(key))
+        except OSError:
+            pass
+        return path
+
+    def get_json(self, key, name='summary.json'):
+        path = self.get(key, name)
+        if path is None:
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, name, data):
+        """Store a file (str or bytes) in an entry and return its path"""
+        entry = self._entry(key)
+        os.makedirs(entry, exist_ok=True)
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+
+        path = os.path.join(entry, name)
+        fd, tmp_path = tempfile.mkstemp(dir=entry, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        os.utime(entry)
+
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = self.size()
+            else:
+                self._bytes += len(data)
+            over_budget = self._bytes > self.max_bytes
+        if over_budget:
+            self.evict(keep=key)
+        return path
+
+    def put_json(self, key, value, name='summary.json'):
+        return self.put(key, name, json.dumps(value))
+
+    def _entries(self):
+        """(last used, bytes, path) of every entry"""
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for prefix in os.listdir(self.directory):
+            prefix_dir = os.path.join(self.directory, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for key in os.listdir(prefix_dir):
+                entry = os.path.join(prefix_dir, key)
+                try:
+                    size = sum(file.stat().st_size for file in os.scandir(entry))
+                    entries.append((os.stat(entry).st_mtime, size, entry))
+                except OSError:
+                    continue  # Evicted by another process meanwhile
+        return entries
+
+    def size(self):
+        """Bytes currently stored"""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, max_bytes=None, keep=None):
+        """Remove least recently used entries until the cache fits max_bytes
+
+        Returns the number of entries removed; the entry of key keep is spared.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        kept = self._entry(keep) if keep else None
+
+        removed = 0
+        for _, size, entry in entries:
+            if total <= max_bytes:
+                break
+            if entry == kept:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            removed += 1
+
+        with self._lock:
+            self._bytes = total
+        if removed:
+            logger.info(f"Evicted {removed} render cache entries ({total} bytes left)")
+        return removed
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        with self._lock:
+            self._bytes = 0
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Inspect or trim the chart render cache')
+    parser.add_argument('command', choices=('stats', 'evict', 'clear'))
+    parser.add_argument('--dir', default=CACHE_DIR, help='Cache directory')
+    parser.add_argument('--max-bytes', type=int, default=MAX_BYTES,
+                        help='Size budget for evict')
+    args = parser.parse_args()
+
+    cache = RenderCache(args.dir, args.max_bytes)
+    if args.command == 'stats':
+        entries = cache._entries()
+        print(f"{len(entries)} entries, {sum(size for _, size, _ in entries) / 1e6:.1f} MB "
+              f"(budget {cache.max_bytes / 1e6:.1f} MB) in {cache.directory}")
+        if entries:
+            oldest = time.strftime('%Y-%m-%d %H:%M', time.localtime(min(entries)[0]))
+            print(f"Least recently used entry: {oldest}")
+    elif args.command == 'evict':
+        print(f"Removed {cache.evict()} entries")
+    else:
+        cache.clear()
+        print(f"Cleared {cache.directory}")
+
+
+if __name__ == "__main__":
+    main()
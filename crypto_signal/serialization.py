@@ -0,0 +1,92 @@
+"""
+Fast JSON Serialization for API Responses
+Serializes whole response payloads in one pass, handling NumPy arrays and
+scalars, pandas timestamps and NaN natively. Uses orjson when installed and
+falls back to the standard library otherwise.
+"""
+
+import json
+import math
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+from flask import Response
+
+try:
+    import orjson
+except ImportError:  # Fall back to the standard library encoder
+    orjson = None
+
+JSON_MIMETYPE = 'application/json'
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _datetime64_isoformat(value):
+    """ISO 8601 string of a datetime64 value as orjson writes it (microseconds), None for NaT"""
+    if np.isnat(value):
+        return None
+    return value.astype('datetime64[us]').item().isoformat()
+
+
+def _default(obj):
+    """Convert the types neither encoder handles natively"""
+    if obj is pd.NaT:  # A datetime subclass whose isoformat() is 'NaT'
+        return None
+    if isinstance(obj, pd.Timestamp):
+        return obj.isoformat()
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, np.datetime64):
+        return _datetime64_isoformat(obj)
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.kind == 'M':  # datetime64 arrays
+            return [_datetime64_isoformat(value) for value in obj]
+        return _sanitize(obj.tolist())
+    if isinstance(obj, np.generic):
+        return _sanitize(obj.item())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return _default(obj.to_numpy())
+    if hasattr(obj, 'to_plotly_json'):  # Plotly figures and graph objects
+        return obj.to_plotly_json()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def _sanitize(obj):
+    """Replace NaN/Infinity with None (standard library path only)"""
+    if isinstance(obj, float):
+        return None if math.isnan(obj) or math.isinf(obj) else obj
+    if isinstance(obj, dict):
+        return {key: _sanitize(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_sanitize(value) for value in obj]
+    return obj
+
+
+class _FallbackEncoder(json.JSONEncoder):
+    def default(self, obj):
+        return _default(obj)
+
+
+def dumps(obj):
+    """Serialize obj to JSON bytes
+
+    NaN and Infinity become null, NumPy values and arrays become numbers and
+    lists, and timestamps become ISO 8601 strings.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+    return json.dumps(_sanitize(obj), cls=_FallbackEncoder, allow_nan=False,
+                      separators=(',', ':')).encode('utf-8')
+
+
+def dumps_str(obj):
+    """Serialize obj to a JSON string"""
+    return dumps(obj).decode('utf-8')
+
+
+def json_response(payload, status=200):
+    """Build a Flask JSON response with the fast serializer"""
+    return Response(dumps(payload), status=status, mimetype=JSON_MIMETYPE)
@@ -0,0 +1,79 @@
+"""
+Shared test setup: the app is imported offline (the exchange points at a closed
+local port), with inline detection, no precompute thread and a throwaway
+activity store.
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_WORK_DIR = tempfile.mkdtemp(prefix='crypto_signal_tests_')
+os.environ.setdefault('ACTIVITY_DB', os.path.join(_WORK_DIR, 'user_activity.db'))
+os.environ.setdefault('DETECTION_PROCESSES', '0')
+os.environ.setdefault('PRECOMPUTE_TOP_N', '0')
+os.environ.setdefault('EXCHANGE_REPLAY_URL', 'http://127.0.0.1:9')
+os.environ.setdefault('RENDER_CACHE_DIR', os.path.join(_WORK_DIR, 'render_cache'))
+# UserLogger keeps its CSV log in the working directory
+os.chdir(_WORK_DIR)
+
+
+def make_candles(length=500, seed=0, freq='1h', end=None):
+    """Random-walk candles ending at end (default: the candle forming now, in UTC)"""
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.01, length)))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    spread = np.abs(rng.normal(0, 0.004, length)) * close
+    end = pd.Timestamp.now(tz='UTC').tz_localize(None).floor(freq) if end is None else pd.Timestamp(end)
+    return pd.DataFrame({
+        'timestamp': pd.date_range(end=end, periods=length, freq=freq),
+        'open': open_,
+        'high': np.maximum(open_, close) + spread,
+        'low': np.minimum(open_, close) - spread,
+        'close': close,
+        'volume': rng.uniform(10, 100, length)
+    })
+
+
+def assert_same_lines(actual, expected):
+    """Trend line records are equal, floats up to rounding"""
+    assert len(actual) == len(expected)
+    for line, reference in zip(actual, expected):
+        assert line.keys() == reference.keys()
+        for key, value in reference.items():
+            if isinstance(value, float):
+                assert line[key] == pytest.approx(value, rel=1e-9, abs=1e-12), key
+            else:
+                assert line[key] == value, key
+
+
+@pytest.fixture
+def app_module():
+    import app
+    app.response_cache.clear()
+    app.forming_candles.clear()
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def candles(app_module, monkeypatch):
+    """Serve fixed candles instead of fetching; returns the frame so tests can change it"""
+    frame = {'df': make_candles()}
+
+    def fetch(symbol, timeframe='1h', limit=500, since=None):
+        return frame['df'].tail(limit).reset_index(drop=True).copy()
+
+    monkeypatch.setattr(app_module.detector, 'fetch_ohlcv_data', fetch)
+    return frame
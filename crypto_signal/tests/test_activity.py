@@ -0,0 +1,72 @@
+import multiprocessing
+
+import pytest
+
+import activity_store
+
+
+@pytest.fixture
+def user_logger(app_module, tmp_path):
+    store = activity_store.SqliteActivityStore(str(tmp_path / 'activity.db'))
+    user_logger = app_module.UserLogger(log_file=str(tmp_path / 'missing.csv'), store=store)
+    user_logger.writer.flush_seconds = 3600  # Only explicit flushes write
+    yield user_logger
+    user_logger.writer.close()
+
+
+def test_stats_include_queued_records_without_writing(user_logger, monkeypatch):
+    user_logger.log_activity('Alice', 'LOGIN')
+    user_logger.log_activity('alice', 'ANALYZE', symbol='ETH/USDT', timeframe='4h')
+
+    def no_writes(records):
+        raise AssertionError('request path wrote to the store')
+
+    monkeypatch.setattr(user_logger.store, 'append_many', no_writes)
+    stats = user_logger.get_user_stats('ALICE')
+    assert stats['total_sessions'] == 1
+    assert stats['total_analyses'] == 1
+    assert stats['favorite_symbols'] == {'ETH/USDT': 1}
+    assert [row['action'] for row in user_logger.recent_activity('alice')] == ['ANALYZE', 'LOGIN']
+
+
+def test_stats_are_not_counted_twice_after_a_flush(user_logger):
+    user_logger.log_activity('bob', 'LOGIN')
+    user_logger.writer.flush()
+    user_logger.log_activity('bob', 'LOGIN')
+
+    assert user_logger.get_user_stats('bob')['total_sessions'] == 2
+    assert len(user_logger.recent_activity('bob')) == 2
+
+
+def test_export_includes_everything_logged(user_logger):
+    user_logger.log_activity('carol', 'ANALYZE', symbol='BTC/USDT', timeframe='1h')
+    exported = ''.join(user_logger.export_csv('carol'))
+    assert 'BTC/USDT' in exported
+    assert user_logger.writer.pending() == []
+
+
+def open_store_in_process(csv_path, db_path, start):
+    start.wait(5)
+    activity_store.open_store('sqlite', csv_path, db_path)
+
+
+def test_concurrent_workers_import_the_csv_once(tmp_path):
+    csv_path, db_path = str(tmp_path / 'log.csv'), str(tmp_path / 'activity.db')
+    activity_store.CsvActivityStore(csv_path).append_many([
+        {'timestamp': f'2024-01-01 00:{n // 60 % 60:02d}:{n % 60:02d}', 'username': f'user{n % 7}',
+         'action': 'ANALYZE', 'symbol': 'BTC/USDT', 'timeframe': '1h'}
+        for n in range(5000)])
+
+    context = multiprocessing.get_context('spawn')
+    start = context.Event()
+    workers = [context.Process(target=open_store_in_process, args=(csv_path, db_path, start))
+               for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    start.set()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+
+    store = activity_store.SqliteActivityStore(db_path)
+    assert sum(len(rows) for _, rows in store.batches_after()) == 5000
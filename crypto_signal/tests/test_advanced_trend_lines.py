@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from advanced_chart_viewer import AdvancedTrendLineDetector
+from conftest import assert_same_lines, make_candles
+
+
+class LoopTrendLineDetector(AdvancedTrendLineDetector):
+    """AdvancedTrendLineDetector as it was before it was vectorized, one line
+    and one candle at a time"""
+
+    def _detect_lines(self, df, points, line_type):
+        price_type = 'low' if line_type == 'support' else 'high'
+        lines = []
+        for i in range(len(points)):
+            for j in range(i + 1, len(points)):
+                x1, y1 = points[i]['index'], points[i]['price']
+                x2, y2 = points[j]['index'], points[j]['price']
+                if x2 == x1:
+                    continue
+                slope = (y2 - y1) / (x2 - x1)
+                intercept = y1 - slope * x1
+                if abs(np.degrees(np.arctan(slope))) > self.max_slope_angle:
+                    continue
+                touches = self._count_line_touches(df, slope, intercept, price_type)
+                if touches >= self.min_touches:
+                    lines.append({
+                        'type': line_type,
+                        'slope': slope,
+                        'intercept': intercept,
+                        'start_index': x1,
+                        'end_index': len(df) - 1,
+                        'touches': touches,
+                        'strength': self._calculate_line_strength(
+                            df, slope, intercept, line_type),
+                        'touch_points': self._get_touch_indices(
+                            df, slope, intercept, price_type)
+                    })
+        return lines
+
+    def _find_extremes(self, df, price_type, window):
+        points = []
+        for i in range(window, len(df) - window):
+            current = df.iloc[i][price_type]
+            if all((df.iloc[j][price_type] > current if price_type == 'low'
+                    else df.iloc[j][price_type] < current)
+                   for j in range(i - window, i + window + 1) if j != i):
+                points.append({'index': i, 'price': current,
+                               'timestamp': df.iloc[i]['timestamp']})
+        return points
+
+    def _get_touch_indices(self, df, slope, intercept, price_type):
+        tolerance = self.tolerance_percentage / 100
+        indices = []
+        for i in range(len(df)):
+            line_price = slope * i + intercept
+            if (line_price > 0 and
+                    abs(df.iloc[i][price_type] - line_price) / line_price <= tolerance):
+                indices.append(i)
+        return indices
+
+    def _count_line_touches(self, df, slope, intercept, price_type):
+        return len(self._get_touch_indices(df, slope, intercept, price_type))
+
+    def _calculate_line_strength(self, df, slope, intercept, line_type):
+        touches = self._count_line_touches(
+            df, slope, intercept, 'low' if line_type == 'support' else 'high')
+        strength = touches * 0.4 + (len(df) / 100) * 0.3
+        recent_data = df.tail(20)
+        for i in range(len(recent_data)):
+            line_price = slope * (len(df) - 20 + i) + intercept
+            if line_type == 'support' and recent_data.iloc[i]['low'] < line_price * 0.99:
+                return strength
+            if line_type == 'resistance' and recent_data.iloc[i]['high'] > line_price * 1.01:
+                return strength
+        return strength + 0.5
+
+
+@pytest.mark.parametrize('seed,lookback', [(0, 100), (5, 100), (1, 250), (2, 250)])
+def test_vectorized_precise_trend_lines_match_loops(seed, lookback):
+    df = make_candles(300, seed=seed)
+    vectorized = AdvancedTrendLineDetector().detect_precise_trend_lines(df, lookback)
+    loops = LoopTrendLineDetector().detect_precise_trend_lines(df, lookback)
+    assert vectorized
+    assert_same_lines(vectorized, loops)
@@ -0,0 +1,82 @@
+URL = '/api/analyze?symbol=BTC/USDT&timeframe=1h'
+
+
+def test_unchanged_candles_revalidate_with_304(client, candles):
+    first = client.get(URL)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+
+    again = client.get(URL, headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.headers['ETag'] == etag
+
+
+def no_fetch_or_detection(app_module, monkeypatch):
+    def unexpected(*args, **kwargs):
+        raise AssertionError('cached analysis was not used')
+
+    monkeypatch.setattr(app_module.detector, 'fetch_ohlcv_data', unexpected)
+    monkeypatch.setattr(app_module.detection_executor, 'run', unexpected)
+
+
+def test_forming_candle_change_is_patched_into_the_cached_analysis(app_module, client, candles,
+                                                                   monkeypatch):
+    first = client.get(URL)
+    etag = first.headers['ETag']
+
+    # A trade moves the close of the candle that is still forming; the background
+    # refresh picks it up
+    df = candles['df'].copy()
+    df.loc[df.index[-1], 'close'] *= 1.2
+    df.loc[df.index[-1], 'high'] = max(df['high'].iloc[-1], df['close'].iloc[-1])
+    candles['df'] = df
+    app_module.forming_candles.refresh('BTC/USDT', '1h')
+
+    no_fetch_or_detection(app_module, monkeypatch)
+    changed = client.get(URL, headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    payload = changed.get_json()
+    price = df['close'].iloc[-1]
+    assert payload['stats']['current_price'] == round(price, 2)
+    assert payload['stats']['price_change'] == round(
+        (price - df['open'].iloc[0]) / df['open'].iloc[0] * 100, 2)
+    for signal in payload['trading_signals']:
+        assert signal['status'] == app_module.signal_status(
+            signal['type'], signal['entry_zone_high'], signal['entry_zone_low'], price)
+    # Everything else is the analysis of the closed candles
+    assert payload['trend_lines'] == first.get_json()['trend_lines']
+
+    again = client.get(URL, headers={'If-None-Match': changed.headers['ETag']})
+    assert again.status_code == 304
+
+
+def test_requests_in_the_same_candle_period_do_not_fetch(app_module, client, candles,
+                                                         monkeypatch):
+    client.get(URL)
+    no_fetch_or_detection(app_module, monkeypatch)
+    assert client.get(URL).status_code == 200
+
+
+def test_304_after_cache_eviction(app_module, client, candles):
+    etag = client.get(URL).headers['ETag']
+    app_module.response_cache.clear()
+    assert client.get(URL, headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_real_candles_are_not_reported_as_sample_data(client, candles):
+    # 500 candles ending at the current hour used to match the sample data heuristic
+    assert client.get(URL).get_json()['using_sample_data'] is False
+
+
+def test_sample_data_is_neither_cached_nor_tagged(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module.detector, 'fetch_ohlcv_data',
+                        lambda symbol, *args, **kwargs:
+                        app_module.detector.generate_sample_data(symbol))
+
+    response = client.get(URL)
+    assert response.status_code == 200
+    assert response.get_json()['using_sample_data'] is True
+    assert 'ETag' not in response.headers
+    assert response.headers['Cache-Control'] == 'no-store'
+    assert len(app_module.response_cache) == 0
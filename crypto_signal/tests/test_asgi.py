@@ -0,0 +1,70 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+asgi = pytest.importorskip('asgi')
+
+
+class UnreachableExchange:
+    markets = {'BTC/USDT': {}}
+
+    async def fetch_ohlcv(self, *args, **kwargs):
+        raise ConnectionError('exchange unreachable')
+
+
+def call(application, path, query):
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'http_version': '1.1',
+             'query_string': query.encode(), 'headers': []}
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        await application(scope, receive, send)
+        return threading.get_ident()
+
+    return asyncio.run(run()), sent
+
+
+def test_blocking_work_runs_off_the_event_loop(app_module, monkeypatch):
+    monkeypatch.setattr(asgi, 'RETRY_DELAY', 0)
+    application = asgi.AnalysisASGI(app_module.app)
+    application.exchange = UnreachableExchange()
+
+    threads = {}
+
+    def record(name, func):
+        def wrapper(*args, **kwargs):
+            threads[name] = threading.get_ident()
+            return func(*args, **kwargs)
+        return wrapper
+
+    monkeypatch.setattr(app_module.detector, 'generate_sample_data',
+                        record('sample', app_module.detector.generate_sample_data))
+    monkeypatch.setattr(app_module.detection_executor, 'analyze',
+                        record('detect', app_module.detection_executor.analyze))
+    monkeypatch.setattr(app_module, 'store_analysis_response',
+                        record('store', app_module.store_analysis_response))
+
+    loop_thread, sent = call(application, '/api/analyze', 'symbol=BTC/USDT&timeframe=1h')
+    assert sent[0]['status'] == 200
+    assert json.loads(sent[1]['body'])['using_sample_data'] is True
+    assert set(threads) == {'sample', 'detect', 'store'}
+    assert loop_thread not in threads.values()
+
+
+def test_sample_data_fallbacks_are_not_labelled_by_symbol(app_module, monkeypatch):
+    monkeypatch.setattr(asgi, 'RETRY_DELAY', 0)
+    application = asgi.AnalysisASGI(app_module.app)
+    application.exchange = UnreachableExchange()
+    before = asgi.metrics.sample_data_fallbacks.value()
+
+    call(application, '/api/analyze', 'symbol=MADEUP123/USDT&timeframe=1h')
+    assert asgi.metrics.sample_data_fallbacks.value() == before + 1
+    assert 'MADEUP123' not in app_module.app.test_client().get('/metrics').get_data(as_text=True)
@@ -0,0 +1,33 @@
+def test_failing_item_is_reported_per_item(app_module, client, candles, monkeypatch):
+    fetch = app_module.detector.fetch_ohlcv_data
+
+    def fetch_or_fail(symbol, *args, **kwargs):
+        if symbol == 'BAD/USDT':
+            return None
+        return fetch(symbol, *args, **kwargs)
+
+    monkeypatch.setattr(app_module.detector, 'fetch_ohlcv_data', fetch_or_fail)
+    response = client.post('/api/analyze/batch', json={
+        'username': 'watcher',
+        'items': [{'symbol': 'BTC/USDT', 'timeframe': '1h'}, {'symbol': 'BAD/USDT'},
+                  {'symbol': 'ETH/USDT', 'timeframe': '4h'}]})
+    assert response.status_code == 200
+
+    body = response.get_json()
+    assert (body['succeeded'], body['failed']) == (2, 1)
+    results = body['results']
+    assert [result['symbol'] for result in results] == ['BTC/USDT', 'BAD/USDT', 'ETH/USDT']
+    assert 'error' in results[1] and 'stats' not in results[1]
+    assert 'stats' in results[0] and 'stats' in results[2]
+
+
+def test_every_item_is_logged_as_an_analysis(app_module, client, candles):
+    client.post('/api/analyze/batch', json={
+        'username': 'watchlist-user',
+        'items': [{'symbol': 'BTC/USDT', 'timeframe': '1h'}, {'symbol': 'ETH/USDT'}]})
+
+    logged = [(record['action'], record['symbol'], record['timeframe'])
+              for record in app_module.user_logger.recent_activity('watchlist-user')]
+    assert sorted(logged) == [('ANALYZE', 'BTC/USDT', '1h'), ('ANALYZE', 'ETH/USDT', '1h')]
+    stats = app_module.user_logger.get_user_stats('watchlist-user')
+    assert stats['favorite_symbols'] == {'BTC/USDT': 1, 'ETH/USDT': 1}
@@ -0,0 +1,144 @@
+import csv
+import gzip
+import io
+
+import numpy as np
+import pytest
+
+import activity_store
+
+
+def records(count, start=0, users=3):
+    return [{'timestamp': f'2024-01-{1 + n // 1440:02d} {n // 60 % 24:02d}:{n % 60:02d}:00',
+             'username': f'user{n % users}', 'action': 'ANALYZE' if n % 4 else 'LOGIN',
+             'symbol': ('BTC/USDT', 'ETH/USDT')[n % 2] if n % 4 else '',
+             'timeframe': '1h' if n % 4 else ''}
+            for n in range(start, start + count)]
+
+
+@pytest.fixture
+def store(tmp_path):
+    # Rotates by size only: the timestamps are long past
+    return activity_store.CsvActivityStore(str(tmp_path / 'log.csv'), rotate_bytes=4096,
+                                           rotate_seconds=float('inf'), compact_days=10 ** 6)
+
+
+def decoded(columns):
+    rows = {'time': columns['time']}
+    for name in activity_store.SUMMARY_COLUMNS:
+        rows[name] = columns[f'{name}_values'][columns[f'{name}_codes']]
+    return rows
+
+
+def test_appends_rotate_into_segments(store):
+    for start in range(0, 600, 50):
+        store.append_many(records(50, start))
+
+    segments = store.manifest()['segments']
+    assert len(segments) > 2
+    assert [segment['generation'] for segment in segments] == list(range(len(segments)))
+    assert [row['timestamp'] for row in store.iter_rows()] == [
+        record['timestamp'] for record in records(600)]
+
+
+def test_stats_refresh_spans_a_rotation(store, tmp_path):
+    index = activity_store.UserStatsIndex(store, str(tmp_path / 'stats.json'))
+    store.append_many(records(50))
+    index.refresh()
+    for start in range(50, 400, 50):
+        store.append_many(records(50, start))
+    assert store.manifest()['segments']
+    index.refresh()
+
+    full = activity_store.UserStatsIndex(store, str(tmp_path / 'full.json'))
+    full.refresh()
+    assert index.users == full.users
+    assert sum(stats['total_analyses'] + stats['total_sessions']
+               for stats in index.users.values()) == 400
+
+
+def test_readers_skip_segments_outside_the_query(store, monkeypatch):
+    for start in range(0, 600, 50):
+        store.append_many(records(50, start, users=1))
+    store.append_many([{'timestamp': '2024-01-01 12:00:00', 'username': 'late',
+                        'action': 'LOGIN'}])
+    segments = store.manifest()['segments']
+    assert len(segments) > 2
+
+    opened = []
+    gzip_open = gzip.open
+    monkeypatch.setattr(activity_store.gzip, 'open',
+                        lambda path, *args, **kwargs: opened.append(path) or
+                        gzip_open(path, *args, **kwargs))
+
+    last = segments[-1]
+    start = activity_store.time_bound(last['start'].replace(' ', 'T'))
+    rows = list(store.iter_rows(start=start))
+    assert opened == [store._segment_path(last)]
+    assert rows[0]['timestamp'] == last['start']
+
+    # A user who only appears in the active file needs no segment at all
+    opened.clear()
+    assert [row['username'] for row in store.iter_rows('LATE')] == ['late']
+    assert store.recent('late') and opened == []
+
+
+def test_column_batches_from_summaries_match_raw_rows(store):
+    for start in range(0, 600, 50):
+        store.append_many(records(50, start))
+    assert store.compact(older_than_days=0) > 0
+    summarized = [segment for segment in store.manifest()['segments'] if segment['summary']]
+    assert summarized
+
+    batches = [columns for _, columns in store.column_batches_after() if len(columns['time'])]
+    combined = {name: np.concatenate([decoded(columns)[name] for columns in batches])
+                for name in ('time',) + activity_store.SUMMARY_COLUMNS}
+    expected = decoded(activity_store.encode_columns(list(store.iter_rows())))
+    for name, values in expected.items():
+        assert combined[name].tolist() == values.tolist(), name
+
+    # Resuming after the summarized segments reads the rest from the raw log
+    position = [summarized[-1]['generation'] + 1, 0]
+    rest = sum(len(columns['time']) for _, columns in store.column_batches_after(position))
+    assert rest == 600 - sum(segment['rows'] for segment in summarized)
+
+
+def test_reverse_records_joins_quoted_fields_spanning_lines():
+    rows = [activity_store.FIELDS,
+            ['2024-01-01 00:00:00', 'alice', 'NOTE', 'two\nlines', '1h', '', ''],
+            ['2024-01-01 00:01:00', 'bob', 'NOTE', 'say "hi"\n\nthen "bye"', '', '', ''],
+            ['2024-01-01 00:02:00', 'carol', 'LOGIN', '', '', '', '']]
+    buffer = io.StringIO(newline='')
+    csv.writer(buffer).writerows(rows)
+    data = io.BytesIO(buffer.getvalue().encode('utf-8'))
+
+    assert list(activity_store.reverse_records(data)) == rows[::-1]
+
+
+def test_recent_reads_quoted_fields_spanning_lines(store):
+    store.append_many([{'timestamp': '2024-01-01 00:00:00', 'username': 'alice',
+                        'action': 'NOTE', 'symbol': 'first\r\nsecond "quoted"'}])
+    assert store.recent('alice')[0]['symbol'] == 'first\r\nsecond "quoted"'
+
+
+def test_recent_limit_crosses_segment_boundaries(store):
+    for start in range(0, 600, 50):
+        store.append_many(records(50, start))
+    assert len(store.manifest()['segments']) > 2
+
+    expected = [row for row in reversed(records(600)) if row['username'] == 'user1']
+    for limit in (1, 20, 150, len(expected), len(expected) + 10):
+        timestamps = [row['timestamp'] for row in store.recent('USER1', limit)]
+        assert timestamps == [row['timestamp'] for row in expected[:limit]], limit
+
+
+def test_date_upper_bound_covers_the_whole_day(store):
+    store.append_many(records(3 * 1440, users=1))
+    end = activity_store.time_bound('2024-01-02', upper=True)
+    assert end == '2024-01-03 00:00:00'
+    assert activity_store.time_bound('2024-01-02T06:30', upper=True) == '2024-01-02 06:30:00'
+
+    rows = list(store.iter_rows(start=activity_store.time_bound('2024-01-02'), end=end))
+    assert len(rows) == 1440
+    assert (rows[0]['timestamp'], rows[-1]['timestamp']) == ('2024-01-02 00:00:00',
+                                                             '2024-01-02 23:59:00')
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+import downsample
+from conftest import make_candles
+
+COLUMNS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+
+def columns(df):
+    return [df['timestamp'].values.astype('datetime64[ms]').astype('int64')] + [
+        df[column].values for column in COLUMNS[1:]]
+
+
+def assert_bucket_invariants(bucketed, timestamp, open_, high, low, close, volume):
+    """Every output candle summarizes a contiguous run of input candles, in order"""
+    starts = np.searchsorted(timestamp, bucketed['timestamp'])
+    assert starts[0] == 0 and (np.diff(starts) > 0).all()
+    ends = np.append(starts[1:], len(timestamp))
+    for index, (start, end) in enumerate(zip(starts, ends)):
+        assert bucketed['open'][index] == open_[start]
+        assert bucketed['high'][index] == high[start:end].max()
+        assert bucketed['low'][index] == low[start:end].min()
+        assert bucketed['close'][index] == close[end - 1]
+        assert bucketed['volume'][index] == pytest.approx(volume[start:end].sum())
+
+
+@pytest.mark.parametrize('length, n_buckets', [(500, 50), (500, 7), (101, 100), (10, 1)])
+def test_ohlc_buckets_keep_open_high_low_close_and_volume(length, n_buckets):
+    data = columns(make_candles(length, seed=length))
+    bucketed = downsample.aggregate_ohlcv(*data, n_buckets)
+    assert len(bucketed['timestamp']) == n_buckets
+    assert_bucket_invariants(bucketed, *data)
+
+
+def test_fewer_candles_than_buckets_are_returned_unchanged():
+    data = columns(make_candles(20))
+    bucketed = downsample.aggregate_ohlcv(*data, 50)
+    for column, values in zip(COLUMNS, data):
+        assert bucketed[column].tolist() == values.tolist()
+
+
+@pytest.mark.parametrize('length, threshold', [(1000, 100), (1000, 3), (57, 20), (10, 10)])
+def test_lttb_keeps_the_first_and_last_points(length, threshold):
+    rng = np.random.default_rng(length)
+    x = np.arange(length, dtype=float) * 60
+    y = np.cumsum(rng.normal(0, 1, length))
+    indices = downsample.lttb(x, y, threshold)
+
+    assert len(indices) == min(threshold, length)
+    assert (indices[0], indices[-1]) == (0, length - 1)
+    assert (np.diff(indices) > 0).all()
+
+
+def test_lttb_keeps_a_spike():
+    y = np.zeros(1000)
+    y[437] = 50.0
+    assert 437 in downsample.lttb(np.arange(1000), y, 20)
+
+
+def test_candles_endpoint_buckets_preserve_ohlc(client, candles):
+    df = candles['df']
+    data = columns(df)
+    response = client.get('/api/candles', query_string={
+        'symbol': 'BTC/USDT', 'timeframe': '1h', 'from': int(data[0][0]), 'to': int(data[0][-1]),
+        'width': 60})
+    body = response.get_json()
+    assert body['source_candles'] == len(df)
+    bucketed = {column: np.asarray(values) for column, values in body['candles'].items()}
+    assert len(bucketed['timestamp']) == 60
+    assert_bucket_invariants(bucketed, *data)
+
+
+def test_candles_endpoint_line_keeps_the_window_ends(app_module, client, candles, monkeypatch):
+    df = candles['df']
+    data = columns(df)
+
+    def fetch(symbol, timeframe='1h', limit=500, since=None):
+        # Like the exchange: limit candles from since on
+        return df[data[0] >= since].head(limit).reset_index(drop=True).copy()
+
+    monkeypatch.setattr(app_module.detector, 'fetch_ohlcv_data', fetch)
+    start, end = int(data[0][100]), int(data[0][400])
+    body = client.get('/api/candles', query_string={
+        'symbol': 'BTC/USDT', 'timeframe': '1h', 'from': start, 'to': end, 'width': 40,
+        'style': 'line'}).get_json()
+    line = body['candles']
+    assert body['source_candles'] == 301
+    assert len(line['timestamp']) == 40
+    assert (line['timestamp'][0], line['timestamp'][-1]) == (start, end)
+    assert (line['close'][0], line['close'][-1]) == (data[4][100], data[4][400])
@@ -0,0 +1,146 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import ccxt
+import pytest
+
+import exchange_replay
+
+HOUR_MS = 3600 * 1000
+START_MS = 1704067200000  # 2024-01-01 00:00 UTC
+
+
+def kline(open_time):
+    price = str(100 + open_time // HOUR_MS % 50)
+    return [open_time, price, price, price, price, '1.0', open_time + HOUR_MS - 1, '100.0', 5,
+            '0.5', '50.0', '0']
+
+
+KLINES = [kline(START_MS + n * HOUR_MS) for n in range(48)]
+
+
+def stub_fetch(url, method='GET', headers=None, body=None):
+    """Exchange responses for the recorder: candles from KLINES, sliced like Binance"""
+    _, path, query = exchange_replay.split_url(url)
+    if path.endswith('/klines'):
+        rows = [row for row in KLINES if row[0] >= int(query.get('startTime', 0))]
+        return rows[:int(query['limit'])]
+    if path.endswith('/ticker/price'):
+        return {'symbol': query['symbol'], 'price': '101.5'}
+    return {'serverTime': START_MS}
+
+
+@pytest.fixture
+def recording_dir(tmp_path):
+    exchange = ccxt.binance()
+    exchange.fetch = stub_fetch
+    exchange_replay.Recorder(str(tmp_path), exchange.id).wrap(exchange)
+    # Overlapping pages, as fetched while paging through history
+    exchange.publicGetKlines({'symbol': 'BTCUSDT', 'interval': '1h', 'limit': 30})
+    exchange.publicGetKlines({'symbol': 'BTCUSDT', 'interval': '1h', 'limit': 30,
+                              'startTime': KLINES[20][0]})
+    exchange.publicGetTime()
+    exchange.publicGetTickerPrice({'symbol': 'BTCUSDT'})
+    return str(tmp_path)
+
+
+@pytest.fixture
+def serve(recording_dir):
+    servers = []
+
+    def serve(**options):
+        recording = exchange_replay.Recording(recording_dir)
+        server = exchange_replay.ReplayServer(('127.0.0.1', 0), recording, **options)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield serve
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def get(server, path):
+    """(status, headers, JSON body) of a request to a replay server"""
+    try:
+        with urllib.request.urlopen(server.url + path, timeout=5) as response:
+            return response.status, response.headers, json.loads(response.read())
+    except urllib.error.HTTPError as error:
+        return error.code, error.headers, json.loads(error.read())
+
+
+def test_record_and_replay_round_trip(serve):
+    server = serve()
+    exchange = exchange_replay.point_to_replay(ccxt.binance(), server.url)
+
+    candles = exchange.publicGetKlines({'symbol': 'BTCUSDT', 'interval': '1h', 'limit': 1000})
+    assert candles == KLINES
+    assert exchange.publicGetTime() == {'serverTime': START_MS}
+    # Unrecorded parameters fall back to the latest response of the route
+    assert exchange.publicGetTickerPrice({'symbol': 'ETHUSDT'}) == {'symbol': 'BTCUSDT',
+                                                                   'price': '101.5'}
+    assert get(server, '/api.binance.com/api/v3/depth')[0] == 404
+    assert get(server, '/api.binance.com/api/v3/klines?symbol=XRPUSDT&interval=1h')[0] == 400
+    assert get(server, '/__replay/stats')[2] == {'ok': 3, 'not_recorded': 1, 'unknown_symbol': 1}
+
+
+def test_klines_are_sliced_like_binance(recording_dir):
+    recording = exchange_replay.Recording(recording_dir)
+
+    def klines(**query):
+        query = {name: str(value) for name, value in query.items()}
+        rows = recording.klines('api.binance.com', '/api/v3/klines',
+                                dict(query, symbol='BTCUSDT', interval='1h'))
+        return [KLINES.index(row) for row in rows]
+
+    assert klines() == list(range(48))
+    assert klines(limit=5) == list(range(43, 48))
+    assert klines(startTime=KLINES[10][0], limit=5) == list(range(10, 15))
+    # startTime between candles starts at the next one
+    assert klines(startTime=KLINES[10][0] + 1, limit=3) == [11, 12, 13]
+    assert klines(startTime=KLINES[10][0], endTime=KLINES[12][0]) == [10, 11, 12]
+    assert klines(endTime=KLINES[12][0], limit=4) == [9, 10, 11, 12]
+    assert klines(startTime=KLINES[-1][0] + HOUR_MS) == []
+    assert recording.klines('api.binance.com', '/api/v3/klines',
+                            {'symbol': 'XRPUSDT', 'interval': '1h'}) is None
+
+
+def test_shift_to_moves_the_last_candle_to_now(recording_dir):
+    recording = exchange_replay.Recording(recording_dir)
+    now_ms = START_MS + 1000 * HOUR_MS + 1234
+    recording.shift_to(now_ms)
+
+    rows = recording.candles[('api.binance.com', '/api/v3/klines', 'BTCUSDT', '1h')]
+    offset = START_MS + 1000 * HOUR_MS - KLINES[-1][0]
+    assert rows[-1][0] == START_MS + 1000 * HOUR_MS
+    assert [row[0] - recorded[0] for row, recorded in zip(rows, KLINES)] == [offset] * 48
+    assert [row[6] - row[0] for row in rows] == [HOUR_MS - 1] * 48
+    assert [row[1:6] + row[7:] for row in rows] == [row[1:6] + row[7:] for row in KLINES]
+    assert recording.offsets == {('api.binance.com', '/api/v3/klines', 'BTCUSDT', '1h'): offset}
+
+
+def test_seeded_errors_repeat(serve):
+    def statuses(server):
+        return [get(server, '/api.binance.com/api/v3/time')[0] for _ in range(40)]
+
+    first = statuses(serve(error_rate=0.3, seed=7))
+    assert first == statuses(serve(error_rate=0.3, seed=7))
+    assert set(first) == {200, 503}
+    server = serve(error_rate=1.0, seed=7)
+    status, _, body = get(server, '/api.binance.com/api/v3/time')
+    assert (status, body['code']) == (503, -1001)
+    assert get(server, '/__replay/stats')[2] == {'error': 1}
+
+
+def test_rate_limit_answers_429_with_retry_after(serve):
+    server = serve(rate_limit=3)
+    responses = [get(server, '/api.binance.com/api/v3/time') for _ in range(6)]
+
+    # A burst of up to rate_limit requests goes through, the rest are refused
+    assert [status for status, _, _ in responses[:3]] == [200] * 3
+    status, headers, body = responses[-1]
+    assert (status, headers['Retry-After'], body['code']) == (429, '1', -1003)
+    assert get(server, '/__replay/stats')[2]['rate_limited'] >= 1
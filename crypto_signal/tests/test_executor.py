@@ -0,0 +1,94 @@
+import os
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import executor
+from conftest import make_candles
+
+
+def slow_analysis(df, seconds):
+    time.sleep(seconds)
+    return len(df)
+
+
+def test_pool_rejects_past_queue():
+    pool = executor.DetectionExecutor(slow_analysis, processes=1, queue_size=0)
+    try:
+        running = pool.submit(make_candles(50), 0.5)
+        with pytest.raises(executor.Overloaded) as error:
+            pool.submit(make_candles(50), 0)
+        assert error.value.retry_after >= 1
+        assert running.result(timeout=10) == 50
+        # The slot is free again once the first analysis finished
+        assert pool.run(make_candles(20), 0) == 20
+    finally:
+        pool.shutdown()
+
+
+def test_inline_never_rejects():
+    inline = executor.DetectionExecutor(slow_analysis, processes=0, queue_size=0)
+    busy = threading.Thread(target=inline.run, args=(make_candles(10), 0.3))
+    busy.start()
+    time.sleep(0.05)
+    try:
+        assert inline.run(make_candles(30), 0) == 30
+    finally:
+        busy.join()
+    assert inline.retry_after() >= 1
+
+
+def test_analyze_overloaded_returns_503(app_module, client, candles, monkeypatch):
+    full = executor.DetectionExecutor(app_module.analyze_candles, processes=1, queue_size=0)
+    full._slots.acquire()  # An analysis is already running
+    monkeypatch.setattr(app_module, 'detection_executor', full)
+
+    response = client.get('/api/analyze?symbol=BTC/USDT&timeframe=1h')
+    assert response.status_code == 503
+    assert int(response.headers['Retry-After']) >= 1
+
+
+def test_analyze_inline_while_another_analysis_runs(app_module, client, candles, monkeypatch):
+    # With DETECTION_PROCESSES=0 a background analysis (e.g. precompute) must not
+    # use up the capacity of the request threads
+    pool = app_module.detection_executor
+    assert not pool.enabled
+    started, release = threading.Event(), threading.Event()
+    analyze = pool.analyze
+
+    def analyze_or_hold(df, *args):
+        if len(df) == 5:
+            started.set()
+            release.wait(5)
+            return None
+        return analyze(df, *args)
+
+    monkeypatch.setattr(pool, 'analyze', analyze_or_hold)
+    background = threading.Thread(target=pool.run, args=(make_candles(5),))
+    background.start()
+    started.wait(5)
+    try:
+        response = client.get('/api/analyze?symbol=BTC/USDT&timeframe=1h')
+        assert response.status_code == 200
+    finally:
+        release.set()
+        background.join()
+
+
+def analysis_or_crash(df, crash):
+    if crash:
+        os._exit(1)  # The worker process dies, e.g. killed by the OOM killer
+    return len(df)
+
+
+def test_pool_recovers_after_a_worker_dies():
+    pool = executor.DetectionExecutor(analysis_or_crash, processes=1, queue_size=1)
+    try:
+        with pytest.raises(BrokenProcessPool):
+            pool.run(make_candles(10), True)
+        assert pool.run(make_candles(20), False) == 20
+        assert pool.run(make_candles(30), False) == 30
+    finally:
+        pool.shutdown()
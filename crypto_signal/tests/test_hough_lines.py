@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+import hough_lines
+
+
+def touches(found, index):
+    """Points within tolerance of one returned line, counted point by point"""
+    x1, x2, y1, y2 = (found[name][index] for name in ('x1', 'x2', 'y1', 'y2'))
+    slope = (y2 - y1) / (x2 - x1)
+    count = 0
+    for px, py in zip(found['points_x'], found['points_y']):
+        expected = y1 + slope * (px - x1)
+        if abs(py - expected) / expected <= found['tolerance']:
+            count += 1
+    return count
+
+
+def planted(seed, length=60, points=8):
+    """Swing points scattered at least 5 away from y = 100 + 0.05 x, except for
+    points evenly spread along the history that lie on it"""
+    rng = np.random.default_rng(seed)
+    positions = np.sort(rng.choice(np.arange(1000), length, replace=False)).astype(float)
+    prices = 100 + 0.05 * positions + rng.uniform(5, 40, length) * rng.choice([-1, 1], length)
+    on_line = np.arange(length)[::length // points][:points]
+    prices[on_line] = 100 + 0.05 * positions[on_line]
+    return positions, prices, on_line
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2, 3])
+def test_lines_have_at_least_min_touches(seed):
+    positions, prices, _ = planted(seed)
+    found = hough_lines.find_lines(positions, prices, min_touches=4)
+    assert len(found['touches'])
+    assert (found['touches'] >= 4).all()
+    for index, count in enumerate(found['touches']):
+        assert touches(found, index) == count
+    # The endpoints are the first and last touching points
+    assert (found['x1'] == found['points_x'][found['first']]).all()
+    assert (found['x2'] == found['points_x'][found['second']]).all()
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2, 3])
+def test_finds_a_planted_line(seed):
+    positions, prices, on_line = planted(seed)
+    found = hough_lines.find_lines(positions, prices, min_touches=4)
+
+    ends = list(zip(found['first'].tolist(), found['second'].tolist()))
+    assert (on_line[0], on_line[-1]) in ends
+    best = ends.index((on_line[0], on_line[-1]))
+    assert found['touches'][best] == len(on_line)
+    for name, end in (('1', on_line[0]), ('2', on_line[-1])):
+        assert found[f'y{name}'][best] == pytest.approx(100 + 0.05 * positions[end], rel=1e-9)
+
+
+def test_only_the_latest_points_vote():
+    positions, prices, _ = planted(0)
+    found = hough_lines.find_lines(positions, prices, min_touches=3, max_points=40)
+    assert len(found['points_x']) == 40
+    # Indices still refer to the full point arrays
+    assert len(found['first']) and (found['first'] >= 20).all()
+    assert (positions[found['first']] == found['x1']).all()
@@ -0,0 +1,112 @@
+import asyncio
+import threading
+
+import pytest
+
+import live_feed
+
+
+class OfflineDetector:
+    """Every poll comes back empty, so feeds only carry what a test publishes"""
+
+    def fetch_ohlcv_data(self, symbol, timeframe, limit=500):
+        return None
+
+
+@pytest.fixture
+def hub():
+    return live_feed.LiveFeedHub(OfflineDetector(), poll_interval=0.05, max_streams=2)
+
+
+def test_streams_past_the_limit_are_refused(hub):
+    first = hub.subscribe('BTC/USDT', '1h')
+    hub.subscribe('ETH/USDT', '1h')
+    with pytest.raises(live_feed.StreamLimitReached):
+        hub.subscribe('BTC/USDT', '1h')
+
+    first.close()
+    first.close()  # Closing twice gives back one slot only
+    assert hub.open_streams == 1
+    hub.subscribe('BTC/USDT', '1h')
+    with pytest.raises(live_feed.StreamLimitReached):
+        hub.subscribe('BTC/USDT', '1h')
+
+
+def test_feed_is_dropped_with_its_last_stream(hub):
+    first = hub.subscribe('BTC/USDT', '1h')
+    second = hub.subscribe('BTC/USDT', '1h')
+    assert first.feed is second.feed
+
+    first.close()
+    assert ('BTC/USDT', '1h') in hub._feeds
+    second.close()
+    assert hub._feeds == {}
+    assert hub.open_streams == 0
+
+
+def test_closing_the_iterator_releases_the_stream(hub):
+    subscription = hub.subscribe('BTC/USDT', '1h')
+    messages = iter(subscription)
+    assert next(messages).startswith('retry:')
+    messages.close()
+    assert hub.open_streams == 0
+    assert hub._feeds == {}
+
+
+def test_async_stream_receives_events_from_the_poller_thread(hub):
+    async def consume():
+        subscription = hub.subscribe(
+            'BTC/USDT', '1h', live_feed.LoopQueue(asyncio.get_running_loop()))
+        messages = subscription.messages()
+        try:
+            assert (await messages.__anext__()).startswith('retry:')
+            threading.Timer(0.05, subscription.feed.publish, ('status', {'live': True})).start()
+            return await asyncio.wait_for(messages.__anext__(), 5)
+        finally:
+            await messages.aclose()
+
+    message = asyncio.run(consume())
+    assert message.startswith('id: 1\nevent: status\n')
+    assert hub._feeds == {}
+
+
+def test_stream_route_returns_503_past_the_limit(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module.live_feeds, 'max_streams', 0)
+    response = client.get('/api/stream?symbol=BTC/USDT&timeframe=1h')
+    assert response.status_code == 503
+    assert int(response.headers['Retry-After']) >= 1
+
+
+def test_stream_route_rejects_bad_timeframe(client):
+    assert client.get('/api/stream?symbol=BTC/USDT&timeframe=bogus').status_code == 400
+
+
+def test_asgi_stream_ends_when_the_client_disconnects(app_module):
+    asgi = pytest.importorskip('asgi')
+    hub = live_feed.LiveFeedHub(OfflineDetector(), poll_interval=0.05, max_streams=2)
+    application = asgi.AnalysisASGI(app_module.app)
+    application.live_feeds = hub
+    scope = {'type': 'http', 'method': 'GET', 'path': '/api/stream', 'http_version': '1.1',
+             'query_string': b'symbol=BTC/USDT&timeframe=1h', 'headers': []}
+
+    async def run():
+        disconnect = asyncio.Event()
+        sent = []
+
+        async def receive():
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+            if message.get('body', b'').startswith(b'retry:'):
+                disconnect.set()
+
+        await asyncio.wait_for(application(scope, receive, send), 5)
+        return sent
+
+    sent = asyncio.run(run())
+    assert sent[0]['status'] == 200
+    assert (b'content-type', b'text/event-stream; charset=utf-8') in sent[0]['headers']
+    assert hub.open_streams == 0
+    assert hub._feeds == {}
@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+import ohlcv_codec
+
+ARROW = ohlcv_codec.ARROW_MEDIA_TYPE
+TYPED = ohlcv_codec.TYPED_ARRAY_MEDIA_TYPE
+JSON = ohlcv_codec.JSON_MEDIA_TYPE
+URL = '/api/analyze?symbol=BTC/USDT&timeframe=1h&format=data'
+
+requires_arrow = pytest.mark.skipif(not ohlcv_codec.arrow_available(),
+                                    reason='pyarrow is not installed')
+
+
+def payload():
+    rng = np.random.default_rng(0)
+    return {
+        'symbol': 'BTC/USDT',
+        'stats': {'current_price': 30123.5, 'signals': 2},
+        'chart_data': {
+            'encoding': ohlcv_codec.ENCODING_LISTS,
+            'candles': {
+                'timestamp': [1704067200000 + n * 3600000 for n in range(50)],
+                **{column: (30000 + rng.normal(0, 100, 50)).tolist()
+                   for column in ohlcv_codec.CANDLE_COLUMNS[1:]}
+            },
+            'order_blocks': [{'type': 'bullish', 'high': 30100.0, 'low': 29950.0}]
+        }
+    }
+
+
+def negotiate(accept):
+    return ohlcv_codec.negotiate_encoding(parse_accept_header(accept, MIMEAccept))
+
+
+@pytest.mark.parametrize('accept, expected', [
+    (None, JSON),
+    ('*/*', JSON),
+    (JSON, JSON),
+    (TYPED, TYPED),
+    (f'{TYPED}, {JSON};q=0.5', TYPED),
+    (f'{JSON}, {TYPED}', JSON),
+    (f'{TYPED};q=0.5, {JSON}', JSON),
+    (f'{TYPED};q=0.8, */*;q=0.8', JSON),
+    (f'{TYPED};q=0', JSON),
+])
+def test_negotiation(accept, expected):
+    assert negotiate(accept) == expected
+
+
+@requires_arrow
+@pytest.mark.parametrize('accept, expected', [
+    (ARROW, ARROW),
+    (f'{ARROW}, {TYPED};q=0.9, {JSON};q=0.5', ARROW),
+    (f'{ARROW};q=0.5, {TYPED}', TYPED),
+    (f'{ARROW};q=0.9, {JSON}', JSON),
+])
+def test_negotiation_with_arrow(accept, expected):
+    assert negotiate(accept) == expected
+
+
+def test_without_pyarrow_arrow_falls_back(monkeypatch):
+    monkeypatch.setattr(ohlcv_codec, 'pa', None)
+    assert negotiate(ARROW) == JSON
+    assert negotiate(f'{ARROW}, {TYPED};q=0.9, {JSON};q=0.5') == TYPED
+    with pytest.raises(RuntimeError):
+        ohlcv_codec.encode_arrow_stream(payload())
+
+
+def test_typed_arrays_round_trip():
+    original = payload()
+    encoded = ohlcv_codec.apply_typed_arrays(original)
+    assert encoded['chart_data']['encoding'] == ohlcv_codec.ENCODING_F64_BASE64
+    assert original['chart_data']['encoding'] == ohlcv_codec.ENCODING_LISTS  # Not modified
+    for column, values in original['chart_data']['candles'].items():
+        blob = encoded['chart_data']['candles'][column]
+        assert blob['dtype'] == 'f8'
+        assert ohlcv_codec.decode_f64(blob['bdata']).tolist() == values
+    assert ohlcv_codec.apply_typed_arrays(encoded) is encoded
+
+
+@requires_arrow
+def test_arrow_stream_round_trip():
+    original = payload()
+    assert ohlcv_codec.decode_arrow_stream(ohlcv_codec.encode_arrow_stream(original)) == original
+
+
+@requires_arrow
+def test_analyze_serves_the_negotiated_encoding(client, candles):
+    data = client.get(URL).get_json()
+    assert data['chart_data']['encoding'] == ohlcv_codec.ENCODING_LISTS
+
+    response = client.get(URL, headers={'Accept': ARROW})
+    assert response.mimetype == ARROW
+    assert ohlcv_codec.decode_arrow_stream(response.data) == data
+
+    typed = client.get(URL, headers={'Accept': TYPED}).get_json()
+    for column, values in data['chart_data']['candles'].items():
+        blob = typed['chart_data']['candles'][column]
+        assert ohlcv_codec.decode_f64(blob['bdata']).tolist() == values
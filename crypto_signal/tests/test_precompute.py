@@ -0,0 +1,57 @@
+import threading
+
+import pytest
+
+import precompute
+
+PAGE_ACCEPT = 'application/vnd.ohlcv.f64+json, application/json;q=0.9'
+
+
+@pytest.mark.parametrize('width', [360, 499, 500, 1280])
+def test_page_requests_hit_precomputed_entries(app_module, client, candles, monkeypatch, width):
+    app_module.precompute_analysis('BTC/USDT', '1h')
+
+    # Trades keep moving the forming candle after the precompute
+    df = candles['df'].copy()
+    df.loc[df.index[-1], ['close', 'volume']] += (50, 3)
+    candles['df'] = df
+
+    def unexpected(*args, **kwargs):
+        raise AssertionError('precomputed response was not used')
+
+    monkeypatch.setattr(app_module.detector, 'fetch_ohlcv_data', unexpected)
+    monkeypatch.setattr(app_module.detection_executor, 'run', unexpected)
+    # What templates/index.html sends
+    response = client.get(f'/api/analyze?symbol=BTC/USDT&timeframe=1h&theme=dark&format=data'
+                          f'&max_points={width}&username=Anonymous',
+                          headers={'Accept': PAGE_ACCEPT})
+    assert response.status_code == 200
+
+
+def test_precompute_skips_a_period_already_cached(app_module, client, candles, monkeypatch):
+    client.get('/api/analyze?symbol=BTC/USDT&timeframe=1h')
+    monkeypatch.setattr(app_module.detector, 'fetch_ohlcv_data', lambda *args, **kwargs: None)
+    app_module.precompute_analysis('BTC/USDT', '1h')  # Would raise if it fetched
+
+
+def test_sample_data_is_not_precomputed(app_module, monkeypatch):
+    monkeypatch.setattr(app_module.detector, 'fetch_ohlcv_data',
+                        lambda symbol, *args, **kwargs:
+                        app_module.detector.generate_sample_data(symbol))
+    with pytest.raises(RuntimeError):
+        app_module.precompute_analysis('BTC/USDT', '1h')
+    assert len(app_module.response_cache) == 0
+
+
+def test_budget_is_charged_for_retries_and_pages():
+    calls = threading.local()
+
+    def refresh(symbol, timeframe):
+        calls.count = getattr(calls, 'count', 0) + 4  # e.g. two retries and a second page
+
+    scheduler = precompute.PrecomputeScheduler(
+        refresh, lambda top_n: [], requests_per_minute=60,
+        count_requests=lambda: getattr(calls, 'count', 0))
+    tokens = scheduler.budget.tokens
+    scheduler._refresh_pair('BTC/USDT', '1h')
+    assert scheduler.budget.tokens == pytest.approx(tokens - 4, abs=0.1)
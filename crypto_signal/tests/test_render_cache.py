@@ -0,0 +1,52 @@
+import os
+
+import batch_charts
+import render_cache
+from conftest import make_candles
+
+
+def generate(tmp_path, cache):
+    return batch_charts.generate_charts(['BTC/USDT'], limit=120, output_dir=str(tmp_path / 'out'),
+                                        render_workers=0, cache=cache)[0]
+
+
+def test_sample_data_is_rendered_but_not_cached(tmp_path, monkeypatch):
+    detector = batch_charts.detector
+    monkeypatch.setattr(detector, 'fetch_ohlcv_data',
+                        lambda symbol, *args, **kwargs: detector.generate_sample_data(symbol))
+    cache = render_cache.RenderCache(str(tmp_path / 'cache'))
+
+    result = generate(tmp_path, cache)
+    assert result['sample_data'] is True
+    assert os.path.exists(tmp_path / 'out' / result['file'])
+    assert cache.size() == 0
+
+
+def test_market_data_is_reused_from_the_cache(tmp_path, monkeypatch):
+    df = make_candles(120)
+    monkeypatch.setattr(batch_charts.detector, 'fetch_ohlcv_data',
+                        lambda *args, **kwargs: df.copy())
+    cache = render_cache.RenderCache(str(tmp_path / 'cache'))
+
+    assert 'cached' not in generate(tmp_path, cache)
+    assert generate(tmp_path, cache)['cached'] is True
+
+
+def test_key_changes_with_the_plotly_version(monkeypatch):
+    df = make_candles(50)
+    key = render_cache.render_key(df, view='standard')
+    monkeypatch.setattr(render_cache.plotly, '__version__', '0.0.0')
+    assert render_cache.render_key(df, view='standard') != key
+
+
+def test_evicted_entry_is_written_directly(tmp_path, monkeypatch):
+    df = make_candles(120)
+    monkeypatch.setattr(batch_charts.detector, 'fetch_ohlcv_data',
+                        lambda *args, **kwargs: df.copy())
+    # The entry disappears before render_chart copies it into the report
+    monkeypatch.setattr(render_cache.RenderCache, 'get', lambda self, key, name: None)
+    cache = render_cache.RenderCache(str(tmp_path / 'cache'))
+
+    result = generate(tmp_path, cache)
+    assert os.path.exists(tmp_path / 'out' / result['file'])
+    assert result['candles'] == 120
@@ -0,0 +1,81 @@
+import json
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import serialization
+
+requires_orjson = pytest.mark.skipif(serialization.orjson is None,
+                                     reason='orjson is not installed')
+
+TIMES = {
+    'datetime64_s': np.datetime64('2024-01-02T03:04:05'),
+    'datetime64_ms': np.datetime64('2024-01-02T03:04:05.250'),
+    'datetime64_ns': np.datetime64('2024-01-02T03:04:05.123456789'),
+    'datetime64_day': np.datetime64('2024-01-02'),
+    'datetime64_array': np.array(['2024-01-02T03:04:05', '2024-01-03'], dtype='datetime64[ns]'),
+    'timestamp': pd.Timestamp('2024-01-02 03:04:05'),
+    'timestamp_ns': pd.Timestamp('2024-01-02 03:04:05.123456789'),
+    'timestamp_utc': pd.Timestamp('2024-01-02 03:04:05', tz='UTC'),
+    'datetime': datetime(2024, 1, 2, 3, 4, 5),
+    'series': pd.Series(pd.to_datetime(['2024-01-02 03:04:05'])),
+    'index': pd.DatetimeIndex(['2024-01-02 03:04:05']),
+    'nat': pd.NaT,
+}
+
+
+def stdlib_dumps(obj, monkeypatch):
+    with monkeypatch.context() as patch:
+        patch.setattr(serialization, 'orjson', None)
+        return serialization.dumps(obj)
+
+
+@pytest.fixture(params=['default', 'stdlib'])
+def dumps(request, monkeypatch):
+    if request.param == 'stdlib':
+        monkeypatch.setattr(serialization, 'orjson', None)
+    return serialization.dumps
+
+
+def test_nan_and_infinity_become_null(dumps):
+    payload = {
+        'nan': float('nan'), 'inf': float('inf'), 'ninf': -np.inf,
+        'numpy': np.float64('nan'), 'float32': np.float32('inf'),
+        'array': np.array([1.5, np.nan, np.inf]),
+        'nested': [{'value': float('nan')}, (np.nan, 2.0)],
+        'finite': 1.25,
+    }
+    assert json.loads(dumps(payload)) == {
+        'nan': None, 'inf': None, 'ninf': None, 'numpy': None, 'float32': None,
+        'array': [1.5, None, None], 'nested': [{'value': None}, [None, 2.0]], 'finite': 1.25}
+
+
+def test_timestamps_become_iso_strings(dumps):
+    encoded = json.loads(dumps(TIMES))
+    assert encoded['datetime64_s'] == encoded['timestamp'] == encoded['datetime'] == \
+        '2024-01-02T03:04:05'
+    assert encoded['datetime64_ms'] == '2024-01-02T03:04:05.250000'
+    assert encoded['datetime64_day'] == '2024-01-02T00:00:00'
+    assert encoded['datetime64_array'] == ['2024-01-02T03:04:05', '2024-01-03T00:00:00']
+    assert encoded['series'] == encoded['index'] == ['2024-01-02T03:04:05']
+    assert encoded['nat'] is None
+
+
+@requires_orjson
+@pytest.mark.parametrize('name', list(TIMES))
+def test_orjson_and_stdlib_encode_timestamps_alike(name, monkeypatch):
+    value = {name: TIMES[name]}
+    assert serialization.dumps(value) == stdlib_dumps(value, monkeypatch)
+
+
+@requires_orjson
+def test_orjson_and_stdlib_encode_a_payload_alike(monkeypatch):
+    payload = {
+        'stats': {'current_price': np.float64(30123.5), 'count': np.int64(3), 'ratio': np.nan},
+        'closes': np.array([1.0, 2.5]),
+        'when': pd.Timestamp('2024-01-02 03:04:05'),
+        'labels': {1: 'one'},
+    }
+    assert serialization.dumps(payload) == stdlib_dumps(payload, monkeypatch)
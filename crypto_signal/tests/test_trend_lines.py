@@ -0,0 +1,38 @@
+import pytest
+
+from conftest import assert_same_lines, make_candles
+
+
+def reference_trend_lines(detector, df, min_touches=3):
+    lines = []
+    for swing_col, price_col, line_type in (('swing_high', 'high', 'resistance'),
+                                            ('swing_low', 'low', 'support')):
+        swing_points = df[df[swing_col]]
+        if len(swing_points) >= min_touches:
+            lines.extend(detector._find_trend_line_combinations(
+                swing_points, price_col, line_type, min_touches))
+    return lines
+
+
+@pytest.fixture
+def detector(app_module):
+    detector = app_module.OrderBlockDetector.__new__(app_module.OrderBlockDetector)
+    detector.trend_cache = app_module.trendline_cache.TrendLineCache()
+    return detector
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_cached_pairs_match_reference(detector, seed):
+    df = detector.find_swing_highs_lows(make_candles(300, seed=seed))
+    lines = detector.detect_trend_lines(df, series=('BTC/USDT', 3600))
+    assert lines
+    assert_same_lines(lines, reference_trend_lines(detector, df))
+
+
+def test_cached_pairs_match_reference_as_the_window_slides(detector):
+    candles = make_candles(330, seed=3)
+    for end in (300, 304, 315, 330):
+        # The same series analyzed again with a few new candles updates the cache
+        df = detector.find_swing_highs_lows(candles.iloc[end - 300:end].reset_index(drop=True))
+        assert_same_lines(detector.detect_trend_lines(df, series=('BTC/USDT', 3600)),
+                          reference_trend_lines(detector, df))
@@ -0,0 +1,62 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+import activity_store
+import usage
+
+
+def batch(hours, seed):
+    """Records spread over the given hours of 2024-03-01, in shuffled order"""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for hour in hours:
+        for _ in range(int(rng.integers(1, 30))):
+            action = str(rng.choice(['ANALYZE', 'ANALYZE', 'LOGIN', 'LOGOUT']))
+            analyzed = action == 'ANALYZE'
+            rows.append({
+                'timestamp': f'2024-03-01 {hour:02d}:{int(rng.integers(60)):02d}:'
+                             f'{int(rng.integers(60)):02d}',
+                'username': str(rng.choice(['alice', 'Alice', 'bob', 'carol', 'dave'])),
+                'action': action,
+                'symbol': str(rng.choice(['BTC/USDT', 'ETH/USDT', 'SOL/USDT'])) if analyzed else '',
+                'timeframe': str(rng.choice(['1h', '4h'])) if analyzed else ''})
+    rng.shuffle(rows)
+    return rows
+
+
+@pytest.mark.parametrize('kind', ['sqlite', 'csv'])
+def test_incremental_refreshes_match_a_full_recount(tmp_path, kind):
+    if kind == 'sqlite':
+        store = activity_store.SqliteActivityStore(str(tmp_path / 'activity.db'))
+    else:
+        store = activity_store.CsvActivityStore(str(tmp_path / 'log.csv'), rotate_bytes=8192,
+                                                rotate_seconds=float('inf'))
+    rollups = usage.UsageRollups(store)
+    written = []
+    # Later batches go back to hours already rolled up, and to earlier ones
+    for seed, hours in enumerate([range(10, 14), range(12, 18), range(3, 6), [11, 20, 0],
+                                  range(0, 24, 5)]):
+        rows = batch(hours, seed)
+        store.append_many(rows)
+        written.extend(rows)
+        rollups.refresh()
+
+    full = usage.UsageRollups(store)
+    full.refresh()
+    for bucket in usage.BUCKETS:
+        report = rollups.query('2024-03-01 00:00:00', '2024-03-02 00:00:00', bucket, top=3)
+        assert report == full.query('2024-03-01 00:00:00', '2024-03-02 00:00:00', bucket, top=3)
+
+    report = rollups.query('2024-03-01 00:00:00', '2024-03-02 00:00:00', 'hour', top=10)
+    hours = Counter(row['timestamp'][:13] for row in written)
+    assert {entry['time'][:13]: entry['events'] for entry in report['series']} == hours
+    totals = report['totals']
+    assert totals['by_action'] == dict(Counter(row['action'] for row in written))
+    assert totals['active_users'] == len({row['username'].lower() for row in written})
+    symbols = Counter(row['symbol'] for row in written if row['action'] == 'ANALYZE')
+    assert {entry['symbol']: entry['count'] for entry in totals['top_symbols']} == symbols
+    for entry in report['series']:
+        hour = [row for row in written if row['timestamp'][:13] == entry['time'][:13]]
+        assert entry['active_users'] == len({row['username'].lower() for row in hour})
@@ -0,0 +1,26 @@
+import pytest
+
+URL = '/api/analyze?symbol=BTC/USDT'
+
+
+@pytest.mark.parametrize('query', [
+    'limit=0', 'limit=-5', 'limit=5001', 'limit=abc',
+    'max_points=1', 'max_points=-10', 'max_points=0', 'max_points=4001',
+    'timeframe=xx', 'timeframe=-1h', 'format=svg', 'trend_engine=magic'
+])
+def test_analyze_rejects_out_of_range_fields(client, candles, query):
+    response = client.get(f'{URL}&{query}')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+@pytest.mark.parametrize('query', ['limit=1', 'limit=5000', 'max_points=2', 'max_points=4000'])
+def test_analyze_accepts_bounds(client, candles, query):
+    assert client.get(f'{URL}&{query}').status_code == 200
+
+
+@pytest.mark.parametrize('limit', [0, -5, 5001, 'abc'])
+def test_batch_rejects_out_of_range_limit(client, candles, limit):
+    response = client.post('/api/analyze/batch', json={
+        'items': [{'symbol': 'BTC/USDT', 'timeframe': '1h'}], 'limit': limit})
+    assert response.status_code == 400
@@ -0,0 +1,184 @@
+"""
+Incremental Trend Line Candidates
+Caches every candidate line (a pair of swing points) with its touch count, per
+series of swing points. When the same series is analyzed again with a few new
+candles, only lines through new swing points are evaluated and existing lines
+just have their touch counts adjusted for the points that came and went; an
+unchanged swing-point set costs nothing. Points are matched by timestamp, so a
+window that slid forward lines up with what was cached.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+MAX_SERIES = 128
+CHUNK_ELEMENTS = 1 << 20  # lines x points evaluated per step, bounds temporary memory
+
+
+def touch_matrix(x1, y1, x2, y2, px, py, tolerance):
+    """Lines x points: whether each point lies within tolerance of each line
+
+    Same arithmetic as OrderBlockDetector._count_line_touches.
+    """
+    slope = (y2 - y1) / (x2 - x1)
+    intercept = y1 - slope * x1
+    expected = slope[:, None] * px[None, :] + intercept[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        diff = np.abs(py[None, :] - expected) / expected
+    return (expected != 0) & (diff <= tolerance)
+
+
+def count_touches(x1, y1, x2, y2, px, py, tolerance):
+    """Touches per line, in chunks of lines so memory stays bounded"""
+    counts = np.zeros(len(x1), dtype=np.int64)
+    if not len(px):
+        return counts
+    step = max(1, CHUNK_ELEMENTS // len(px))
+    for start in range(0, len(x1), step):
+        end = start + step
+        counts[start:end] = touch_matrix(x1[start:end], y1[start:end], x2[start:end],
+                                         y2[start:end], px, py, tolerance).sum(axis=1)
+    return counts
+
+
+class SwingLines:
+    """Swing points of one series and every line through two of them
+
+    Positions are kept relative to the series' first analysis (offset maps the
+    current frame's positions onto them), so they stay valid as the window slides.
+    """
+
+    def __init__(self, timestamps, positions, prices, tolerance):
+        self.tolerance = tolerance
+        self.lock = threading.Lock()
+        self.offset = 0
+        self.t = timestamps
+        self.x = positions.astype(np.float64)
+        self.y = prices
+        self.t1 = self.t2 = np.empty(0, dtype=np.int64)
+        self.x1 = self.x2 = self.y1 = self.y2 = np.empty(0, dtype=np.float64)
+        self.touches = np.empty(0, dtype=np.int64)
+        self._add_lines(np.ones(len(timestamps), dtype=bool))
+
+    def _add_lines(self, is_new):
+        """Evaluate every line through at least one new point against all points"""
+        first, second = np.triu_indices(len(self.t), k=1)
+        keep = is_new[first] | is_new[second]
+        first, second = first[keep], second[keep]
+        keep = self.x[second] != self.x[first]
+        first, second = first[keep], second[keep]
+
+        x1, y1, x2, y2 = self.x[first], self.y[first], self.x[second], self.y[second]
+        self.t1 = np.concatenate([self.t1, self.t[first]])
+        self.t2 = np.concatenate([self.t2, self.t[second]])
+        self.x1 = np.concatenate([self.x1, x1])
+        self.x2 = np.concatenate([self.x2, x2])
+        self.y1 = np.concatenate([self.y1, y1])
+        self.y2 = np.concatenate([self.y2, y2])
+        self.touches = np.concatenate([
+            self.touches, count_touches(x1, y1, x2, y2, self.x, self.y, self.tolerance)])
+
+    def update(self, timestamps, positions, prices):
+        """Bring the lines in line with the current swing points; returns False
+        if the frames do not overlap and the series has to be rebuilt"""
+        same = np.isin(timestamps, self.t)
+        if not same.any():
+            return False
+        # Map current positions onto the cached ones through a shared point
+        anchor = np.flatnonzero(same)[0]
+        offset = self.x[np.searchsorted(self.t, timestamps[anchor])] - positions[anchor]
+        x = positions + offset
+
+        old = np.searchsorted(self.t, timestamps[same])
+        if not (np.array_equal(self.x[old], x[same]) and np.array_equal(self.y[old], prices[same])):
+            return False  # Same timestamps, different candles (gaps filled, prices revised)
+
+        removed = ~np.isin(self.t, timestamps)
+        if removed.any():
+            gone_t = self.t[removed]
+            alive = ~(np.isin(self.t1, gone_t) | np.isin(self.t2, gone_t))
+            for name in ('t1', 't2', 'x1', 'x2', 'y1', 'y2', 'touches'):
+                setattr(self, name, getattr(self, name)[alive])
+            self.touches = self.touches - count_touches(self.x1, self.y1, self.x2, self.y2,
+                                          self.x[removed], self.y[removed], self.tolerance)
+
+        is_new = ~same
+        self.offset = offset
+        self.t, self.x, self.y = timestamps, x, prices
+        if is_new.any():
+            self.touches = self.touches + count_touches(self.x1, self.y1, self.x2, self.y2,
+                                          x[is_new], prices[is_new], self.tolerance)
+            self._add_lines(is_new)
+        return True
+
+    def candidates(self, min_touches):
+        """Lines with at least min_touches, in pair order (first point, then second)
+
+        Returns endpoint indices into the current points, positions and prices
+        in the current frame, touch counts, and the points themselves.
+        """
+        keep = self.touches >= min_touches
+        x1, x2 = self.x1[keep], self.x2[keep]
+        order = np.lexsort((x2, x1))
+        return {
+            'first': np.searchsorted(self.t, self.t1[keep][order]),
+            'second': np.searchsorted(self.t, self.t2[keep][order]),
+            'x1': x1[order] - self.offset,
+            'x2': x2[order] - self.offset,
+            'y1': self.y1[keep][order],
+            'y2': self.y2[keep][order],
+            'touches': self.touches[keep][order],
+            'points_x': self.x - self.offset,
+            'points_y': self.y,
+            'tolerance': self.tolerance
+        }
+
+
+def touch_positions(found, line):
+    """Positions of the points touching one line returned by candidates()"""
+    x, y = found['points_x'], found['points_y']
+    touching = touch_matrix(found['x1'][[line]], found['y1'][[line]], found['x2'][[line]],
+                            found['y2'][[line]], x, y, found['tolerance'])[0]
+    return x[touching]
+
+
+class TrendLineCache:
+    """SwingLines per (series, line type), least recently used evicted first"""
+
+    def __init__(self, max_series=MAX_SERIES):
+        self.max_series = max_series
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def candidates(self, key, timestamps, positions, prices, tolerance, min_touches):
+        """SwingLines.candidates for these points, updating the cached entry
+
+        timestamps must be strictly increasing int64 values.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+        if entry is not None and entry.tolerance == tolerance:
+            with entry.lock:
+                if entry.update(timestamps, positions, prices):
+                    found = entry.candidates(min_touches)
+                    self._store(key, entry)
+                    return found
+
+        entry = SwingLines(timestamps, positions, prices, tolerance)
+        found = entry.candidates(min_touches)
+        self._store(key, entry)
+        return found
+
+    def _store(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_series:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,189 @@
+"""
+Usage Analytics over the User Activity Log
+Keeps hourly rollups of the log in dictionary-encoded numpy columns: event
+counts per (hour, action, symbol, timeframe) and per (hour, user). New records
+are folded in incrementally from the store's log position, and /api/usage
+answers from the rollups with vectorized group-bys instead of reading rows.
+"""
+
+import threading
+
+import numpy as np
+
+HOUR = 3600
+BUCKETS = {'hour': HOUR, 'day': 24 * HOUR}
+
+
+def aggregate(keys, counts):
+    """Group rows by the key columns and sum counts; returns (key columns, counts)
+    sorted by the keys, the first key being the slowest-varying"""
+    if not len(counts):
+        return keys, counts
+    order = np.lexsort(keys[::-1])
+    keys = [key[order] for key in keys]
+    counts = counts[order]
+    boundary = np.ones(len(counts), dtype=bool)
+    boundary[1:] = np.any([key[1:] != key[:-1] for key in keys], axis=0)
+    starts = np.flatnonzero(boundary)
+    return [key[starts] for key in keys], np.add.reduceat(counts, starts)
+
+
+def format_time(seconds):
+    return str(np.datetime64(int(seconds), 's')).replace('T', ' ')
+
+
+def epoch_seconds(timestamp):
+    return int(np.datetime64(timestamp, 's').astype('int64'))
+
+
+class Dictionary:
+    """Grows a value -> integer code mapping as new values are seen"""
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def encode(self, values):
+        """Global codes for a batch's local dictionary"""
+        mapping = np.empty(len(values), dtype='int32')
+        for index, value in enumerate(values):
+            code = self.codes.get(value)
+            if code is None:
+                code = self.codes[value] = len(self.values)
+                self.values.append(value)
+            mapping[index] = code
+        return mapping
+
+    def lookup(self, value):
+        return self.codes.get(value, -1)
+
+
+class UsageRollups:
+    """Hourly rollups of an activity store, updated from the log tail"""
+
+    DIMENSIONS = ('action', 'symbol', 'timeframe')
+
+    def __init__(self, store):
+        self.store = store
+        self.position = None
+        self.dictionaries = {name: Dictionary() for name in ('username',) + self.DIMENSIONS}
+        empty = np.empty(0, dtype='int64')
+        # (hour, action, symbol, timeframe) -> events
+        self.events = {'hour': empty, 'action': empty, 'symbol': empty, 'timeframe': empty,
+                       'count': empty}
+        # (hour, user) -> events; users are matched case-insensitively
+        self.users = {'hour': empty, 'username': empty, 'count': empty}
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Fold in records logged since the last refresh"""
+        with self._lock:
+            for position, columns in self.store.column_batches_after(self.position):
+                if len(columns['time']):
+                    self._add(columns)
+                self.position = position
+
+    def _add(self, columns):
+        hours = columns['time'] // HOUR * HOUR
+        codes = {}
+        for name, dictionary in self.dictionaries.items():
+            values = columns[f'{name}_values'].tolist()
+            if name == 'username':
+                values = [value.lower() for value in values]
+            codes[name] = dictionary.encode(values)[columns[f'{name}_codes']].astype('int64')
+        ones = np.ones(len(hours), dtype='int64')
+
+        self.events = self._merge(self.events, ('hour',) + self.DIMENSIONS,
+                                  [hours] + [codes[name] for name in self.DIMENSIONS], ones)
+        self.users = self._merge(self.users, ('hour', 'username'),
+                                 [hours, codes['username']], ones)
+
+    @staticmethod
+    def _merge(table, names, keys, counts):
+        """Add new rows to a rollup table sorted by hour; only the hours the new
+        rows touch are re-aggregated"""
+        split = np.searchsorted(table['hour'], keys[0].min())
+        keys = [np.concatenate([table[name][split:], key]) for name, key in zip(names, keys)]
+        keys, counts = aggregate(keys, np.concatenate([table['count'][split:], counts]))
+        merged = {name: np.concatenate([table[name][:split], key]) for name, key in zip(names, keys)}
+        merged['count'] = np.concatenate([table['count'][:split], counts])
+        return merged
+
+    def _top(self, buckets, codes, counts, name, top):
+        """Top values of one dimension per bucket: {bucket: [{name, count}, ...]}"""
+        result = {}
+        if not len(counts):
+            return result
+        (buckets, codes), counts = aggregate([buckets, codes], counts)
+        order = np.lexsort((-counts, buckets))
+        values = self.dictionaries[name].values
+        for bucket, code, count in zip(buckets[order], codes[order], counts[order]):
+            entries = result.setdefault(int(bucket), [])
+            if len(entries) < top:
+                entries.append({name: values[code], 'count': int(count)})
+        return result
+
+    def query(self, start, end, bucket='hour', top=5):
+        """Usage between two log timestamps, in hour or day buckets, as of the last refresh"""
+        with self._lock:
+            events, users = self.events, self.users
+            actions = self.dictionaries['action'].values[:]
+        width = BUCKETS[bucket]
+        start_s, end_s = epoch_seconds(start), epoch_seconds(end)
+
+        mask = (events['hour'] >= start_s) & (events['hour'] < end_s)
+        buckets = events['hour'][mask] // width * width
+        action = events['action'][mask]
+        counts = events['count'][mask]
+        analyze = self.dictionaries['action'].lookup('ANALYZE')
+        login = self.dictionaries['action'].lookup('LOGIN')
+
+        user_mask = (users['hour'] >= start_s) & (users['hour'] < end_s)
+        user_buckets = users['hour'][user_mask] // width * width
+        usernames = users['username'][user_mask]
+        (active_buckets, _), _ = aggregate([user_buckets, usernames],
+                                           np.ones(len(usernames), dtype='int64'))
+        bucket_list, active_users = np.unique(active_buckets, return_counts=True)
+        active = dict(zip(bucket_list.tolist(), active_users.tolist()))
+
+        analyzed = action == analyze
+        tops, totals = {}, {}
+        for name in ('symbol', 'timeframe'):
+            codes = events[name][mask]
+            keep = analyzed & (codes != self.dictionaries[name].lookup(''))
+            tops[name] = self._top(buckets[keep], codes[keep], counts[keep], name, top)
+            totals[name] = self._top(np.zeros(int(keep.sum()), dtype='int64'), codes[keep],
+                                     counts[keep], name, top).get(0, [])
+
+        all_buckets = np.union1d(buckets, bucket_list)
+        slot = np.searchsorted(all_buckets, buckets)
+        size = len(all_buckets)
+        events_per_bucket = np.bincount(slot, weights=counts, minlength=size)
+        analyses = np.bincount(slot[analyzed], weights=counts[analyzed], minlength=size)
+        logins = np.bincount(slot[action == login], weights=counts[action == login], minlength=size)
+        series = [{
+            'time': format_time(value),
+            'analyses': int(analyses[index]),
+            'logins': int(logins[index]),
+            'events': int(events_per_bucket[index]),
+            'active_users': active.get(value, 0),
+            'top_symbols': tops['symbol'].get(value, []),
+            'top_timeframes': tops['timeframe'].get(value, [])
+        } for index, value in enumerate(all_buckets.tolist())]
+
+        by_action = np.bincount(action, weights=counts, minlength=len(actions))
+        return {
+            'from': start,
+            'to': end,
+            'bucket': bucket,
+            'series': series,
+            'totals': {
+                'events': int(counts.sum()),
+                'analyses': int(counts[analyzed].sum()),
+                'active_users': int(np.unique(usernames).size),
+                'by_action': {actions[code]: int(total) for code, total in enumerate(by_action)
+                              if total},
+                'top_symbols': totals['symbol'],
+                'top_timeframes': totals['timeframe']
+            }
+        }